@@ -1,6 +1,8 @@
 import argparse
+import json
+import multiprocessing
 import os
-from typing import Sequence
+from typing import Dict, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -31,35 +33,145 @@ def get_configuration() -> argparse.Namespace:
     parser.add_argument("--split", default="cross_subject", type=str, choices=("cross_subject", "cross_view"),
                         help="Which split to use for training and test data.")
     parser.add_argument("--shrink", default=3, type=int,
-                        help="Shrink sequence length by this factor. "
+                        help="Shrink sequence length by this factor (only every n-th frame is processed). "
                              "E.g. skeleton/rgb are captured with 30FPS -> Reduce to 10FPS")
     parser.add_argument("-w", "--wearable_sensors", nargs="+",
                         default=("gyro_clip", "orientation_clip", "acc_phone_clip", "acc_watch_clip"),
                         help="Which wearable sensor modalities to use. "
                              "The order is important: Resample the length of all other sensor modalities "
                              "to that of the first element in this list.")
+    parser.add_argument("--num_workers", default=0, type=int,
+                        help="Number of worker processes for processing samples (0: process in main process).")
+    parser.add_argument("--cache_path", type=str,
+                        help="Directory where features of each modality are cached and reused across modes "
+                             "(default: <out_path>/.cache).")
+    parser.add_argument("--no_cache", action="store_true", help="Do not use or fill the feature cache.")
     parser.add_argument("--debug", action="store_true", help="debug mode")
     return parser.parse_args()
 
 
+def get_cache_path(cf: argparse.Namespace) -> Optional[str]:
+    if cf.no_cache:
+        return None
+    return cf.cache_path or os.path.join(cf.out_path, ".cache")
+
+
+def _read_signal_file(file_name: str) -> pd.DataFrame:
+    df = pd.read_csv(file_name, header=None)
+    # convert timestamp from string to datetime to int
+    # Rarely, the timestamp does not include microsecond decimal (separated by .)
+    # which results in crash, so add it here
+    timestamps = df[0].astype(str)
+    timestamps = timestamps.where(timestamps.str.contains(".", regex=False), timestamps + ".0")
+    df[0] = pd.to_datetime(timestamps, format="%Y%m%d_%H:%M:%S.%f").astype(np.int64)
+    # sort and filter timestamps because they may be out of order and sometimes duplicated
+    df = df.sort_values(by=0)
+    # Sometimes, two or more values are given for the same timestamp
+    # which results in division-by-zero during interpolation
+    # therefore, drop duplicates
+    return df.drop_duplicates(subset=0)
+
+
+def _merge_signal_sample(task: Tuple[str, Dict[str, str], str, str, Dict[str, Tuple[int, int]]]) \
+        -> Tuple[str, Dict[str, int]]:
+    """
+    Merge the signal files of a single sample.
+
+    :param task: relative path, file for each signal modality, output file, target modality
+                 and columns of the existing output file that can be reused for each modality
+    :return: relative path and number of columns for each signal modality
+    """
+    rel_path, modality_files, out_file, target_modality, reuse_columns = task
+    previous_content = np.load(out_file) if reuse_columns else None
+
+    # Read content of individual csv files (the target modality is always needed for its time stamps)
+    file_content = {m: _read_signal_file(f) for m, f in modality_files.items()
+                    if m not in reuse_columns or m == target_modality}
+
+    # resample to target sequence length
+    target_content = file_content[target_modality]
+    target_length = len(target_content.index)  # number of time stamps
+    target_start = target_content.iloc[0, 0]  # start time stamp
+    target_end = target_content.iloc[-1, 0]  # end time stamp
+    target_samples_x = np.linspace(target_start, target_end, target_length)
+
+    content_interpolated = []
+    for m in modality_files:
+        if m in reuse_columns:
+            start, end = reuse_columns[m]
+            content_interpolated.append(previous_content[:, start:end])
+        else:
+            # create interpolators for each modality as they all have unequal sequence lengths
+            df = file_content[m]
+            interpolator = interp1d(df.iloc[:, 0].values, df.iloc[:, 1:].values, axis=0, fill_value="extrapolate",
+                                    assume_sorted=True)
+            content_interpolated.append(interpolator(target_samples_x))
+
+    # create numpy array with shape (sequence length, num signals * 3)
+    content_merged = np.concatenate(content_interpolated, axis=1).astype(content_interpolated[0].dtype)
+
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    tmp_file = out_file + ".tmp.npy"
+    np.save(tmp_file, content_merged)
+    os.replace(tmp_file, out_file)
+
+    # Plots for each signal for debugging purposes
+    # import matplotlib.pyplot as plt
+    # fig, axes = plt.subplots(2, 4)
+    # for i, df in enumerate(file_content.values()):
+    #     axes[0, i].plot(df.iloc[:, 0].values, df.iloc[:, 1:].values)
+    # for i, c in enumerate(content_interpolated):
+    #     axes[1, i].plot(target_samples_x, c)
+    # plt.show()
+
+    return rel_path, {m: c.shape[1] for m, c in zip(modality_files, content_interpolated)}
+
+
+def _get_file_stats(file_name: str) -> dict:
+    stat = os.stat(file_name)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _save_manifest(manifest_file: str, manifest: dict):
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, manifest_file)
+
+
 def merge_signal_data(root_path: str,
                       signal_modalities: Sequence[str] = (
                               "gyro_clip", "orientation_clip", "acc_phone_clip", "acc_watch_clip"),
                       target_modality_index: int = 0,
-                      out_dir: str = "inertial_intermediate"):
+                      out_dir: str = "inertial_intermediate",
+                      num_workers: int = 0,
+                      manifest_interval: int = 500):
     """
     Produces an intermediate format for all signal modalities (gyro, orientation, 2x acc)
     Sequences for each modality are resampled and linearly interpolated to be of the length of the
     target modality.
     Writes a numpy array of shape (sequence length, num signals * 3) for each sequence.
 
+    A manifest (<root_path>/<out_dir>/manifest.json) stores modification time and size of the input files of each
+    merged sample. Samples whose input files did not change are skipped, so an interrupted run can be resumed.
+    If signal modalities are added, the already merged columns of unchanged modalities are reused.
+    Outputs of samples that became invalid are removed.
+
     :param root_path: root path for MMAct data
     :param signal_modalities: signal modalities (sub directory names)
     :param target_modality_index: Other modalities' sequence lengths are adapted to this one.
     :param out_dir: output directory as a string, results will be written to <root_path>/<out_dir>
+    :param num_workers: Number of worker processes for merging samples (0: merge in main process)
+    :param manifest_interval: Write manifest after this many merged samples
     """
-    if os.path.exists(os.path.join(root_path, out_dir)):
-        return
+    signal_modalities = list(signal_modalities)
+    target_modality = signal_modalities[target_modality_index]
+    out_root = os.path.join(root_path, out_dir)
+    manifest_file = os.path.join(out_root, "manifest.json")
+    manifest = {"samples": {}}
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
 
     # read list of invalid files for each signal modality
     invalid_files = set()
@@ -73,83 +185,90 @@ def merge_signal_data(root_path: str,
                         invalid_files.add(os.path.join(m, os.path.normpath(line)))
 
     # retrieve all file paths
-    files = {
-        m: io.get_files(os.path.join(root_path, m)) for m in signal_modalities
-    }
+    files = io.get_files(os.path.join(root_path, target_modality))
 
-    # read and merge equal sample for each signal modality
+    # find samples that have to be merged for each signal modality
     num_invalid_samples = 0
-    for idx, main_file in enumerate(
-            tqdm(files[signal_modalities[target_modality_index]],
-                 desc=f"Merging signal modalities in {os.path.join(root_path, out_dir)}")):
+    valid_samples = set()
+    tasks = []
+    for main_file in files:
         rel_path = os.path.join(f"subject{main_file.subject + 1}",
                                 f"scene{main_file.scene + 1}",
                                 f"session{main_file.session + 1}",
                                 os.path.basename(main_file.file_name))
-        invalid_merged_sample = False
         modality_files = {}
 
         for m in signal_modalities:
             if not os.path.exists(os.path.join(root_path, m, rel_path)) or os.path.join(m, rel_path) in invalid_files:
                 # Either the requested subject/scene/session/action combination does not exist for some modality
                 # or it is invalid (e.g. no measurements / empty file)
-                invalid_merged_sample = True
+                modality_files = None
                 break
             modality_files[m] = os.path.join(root_path, m, rel_path)
 
-        if invalid_merged_sample:
+        if modality_files is None:
             num_invalid_samples += 1
-        else:
-            # Create output location and read content of individual csv files
-            out_path = os.path.join(root_path, out_dir, os.path.dirname(rel_path))
-            out_file = os.path.join(out_path, os.path.basename(rel_path).replace(".csv", ".npy"))
-            os.makedirs(out_path, exist_ok=True)
-            file_content = {m: pd.read_csv(modality_files[m], header=None) for m in signal_modalities}
-
-            # convert timestamp from string to datetime to int
-            # sort and filter timestamps because they may be out of order and sometimes duplicated
-            for k in file_content:
-                df = file_content[k]
-                # Rarely, the timestamp does not include microsecond decimal (separated by .)
-                # which results in crash, so add it here
-                df[0] = df[0].apply(lambda x: f"{x}.0" if "." not in x else x)
-                df[0] = pd.to_datetime(df[0], format="%Y%m%d_%H:%M:%S.%f").astype(np.int64)
-                df = df.sort_values(by=0)
-                # Sometimes, two or more values are given for the same timestamp
-                # which results in division-by-zero during interpolation
-                # therefore, drop duplicates
-                file_content[k] = df.drop_duplicates(subset=0)
-
-            # create interpolators for each modality as they all have unequal sequence lengths
-            merge_interpolators = [
-                interp1d(df.iloc[:, 0].values, df.iloc[:, 1:].values,
-                         axis=0,
-                         fill_value="extrapolate",
-                         assume_sorted=True)
-                for df in file_content.values()]
-
-            # resample to target sequence length
-            target_length = len(file_content[signal_modalities[target_modality_index]].index)  # number of time stamps
-            target_start = file_content[signal_modalities[target_modality_index]].iloc[0, 0]  # start time stamp
-            target_end = file_content[signal_modalities[target_modality_index]].iloc[-1, 0]  # end time stamp
-            target_samples_x = np.linspace(target_start, target_end, target_length)
-            content_interpolated = [interpolator(target_samples_x) for interpolator in merge_interpolators]
-
-            # create numpy array with shape (sequence length, num signals * 3)
-            content_merged = np.array(content_interpolated, dtype=content_interpolated[0].dtype)
-            content_merged = np.transpose(content_merged, (1, 0, 2))
-            content_merged = np.reshape(content_merged, (len(content_merged), -1))
-            np.save(out_file, content_merged)
-
-            # Plots for each signal for debugging purposes
-            # import matplotlib.pyplot as plt
-            # fig, axes = plt.subplots(2, 4)
-            # for i, df in enumerate(merge_content.values()):
-            #     axes[0, i].plot(df.iloc[:, 0].values, df.iloc[:, 1:].values)
-            # for i, c in enumerate(content_interpolated):
-            #     axes[1, i].plot(target_samples_x, c)
-            # plt.show()
+            continue
+
+        valid_samples.add(rel_path)
+        out_file = os.path.join(out_root, rel_path.replace(".csv", ".npy"))
+        entry = manifest["samples"].get(rel_path, None)
+        if entry is None or not os.path.exists(out_file) or entry["target"] != target_modality:
+            tasks.append((rel_path, modality_files, out_file, target_modality, {}))
+            continue
+
+        # Find columns of the previous output that belong to unchanged modality files
+        unchanged = [m for m in entry["modalities"] if m in modality_files and
+                     {k: entry["modalities"][m][k] for k in ("mtime_ns", "size")} ==
+                     _get_file_stats(modality_files[m])]
+        if list(entry["modalities"]) == signal_modalities and len(unchanged) == len(signal_modalities):
+            continue
+
+        reuse_columns = {}
+        if target_modality in unchanged:
+            column = 0
+            for m, m_entry in entry["modalities"].items():
+                if m in unchanged:
+                    reuse_columns[m] = (column, column + m_entry["columns"])
+                column += m_entry["columns"]
+        tasks.append((rel_path, modality_files, out_file, target_modality, reuse_columns))
+
+    # remove outputs of samples that are no longer valid
+    for rel_path in [k for k in manifest["samples"] if k not in valid_samples]:
+        out_file = os.path.join(out_root, rel_path.replace(".csv", ".npy"))
+        if os.path.exists(out_file):
+            os.remove(out_file)
+        del manifest["samples"][rel_path]
+
+    os.makedirs(out_root, exist_ok=True)
+    task_files = {task[0]: task[1] for task in tasks}
+
+    def update_manifest(rel_path: str, columns: Dict[str, int]):
+        manifest["samples"][rel_path] = {
+            "target": target_modality,
+            "modalities": {m: {**_get_file_stats(f), "columns": columns[m]} for m, f in task_files[rel_path].items()}
+        }
 
+    # read and merge equal sample for each signal modality
+    desc = f"Merging signal modalities in {out_root}"
+    if num_workers > 0:
+        pool = multiprocessing.get_context("spawn").Pool(num_workers)
+        results = pool.imap_unordered(_merge_signal_sample, tasks, chunksize=8)
+    else:
+        pool = None
+        results = map(_merge_signal_sample, tasks)
+
+    try:
+        for idx, result in enumerate(tqdm(results, desc=desc, total=len(tasks))):
+            update_manifest(*result)
+            if (idx + 1) % manifest_interval == 0:
+                _save_manifest(manifest_file, manifest)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        _save_manifest(manifest_file, manifest)
+
+    print("Number of merged samples:", len(tasks))
     print("Number of invalid samples:", num_invalid_samples)
 
 
@@ -274,23 +393,12 @@ def preprocess(cf: argparse.Namespace):
     # Mode keys are equivalent to processor keys defined above to set the mode for a specific processor
     multi_modal_data_group.produce_features(splits, processors=processors, main_modality=cf.target_modality,
                                             modes=processor_modes, out_path=out_path, split_type=split_type,
-                                            **setting["kwargs"])
-
-    if cf.shrink > 1:
-        print(f"Shrinking feature sequence length by factor {cf.shrink}")
-        for file in os.scandir(out_path):
-            if "feature" not in file.name:
-                continue
-            print(f"Shrinking '{file.path}'...")
-            os.rename(file.path, file.path + ".old")
-            arr = np.load(file.path + ".old", mmap_mode="r")
-            np.save(file.path, arr[:, :, ::cf.shrink])
-            del arr
-            os.remove(file.path + ".old")
+                                            num_workers=cf.num_workers, cache_path=get_cache_path(cf),
+                                            temporal_stride=cf.shrink, **setting["kwargs"])
 
 
 if __name__ == "__main__":
     conf = get_configuration()
-    merge_signal_data(conf.in_path, conf.wearable_sensors)
+    merge_signal_data(conf.in_path, conf.wearable_sensors, num_workers=conf.num_workers)
     os.makedirs(conf.out_path, exist_ok=True)
     preprocess(conf)
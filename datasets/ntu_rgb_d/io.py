@@ -38,54 +38,55 @@ class SkeletonSample:
 
     def __init__(self, file_name: str):
         self.file_name = file_name
-        self.frames = []
 
         # stores a numpy array of filtered body data
         self._data = None
 
-    def _load_data(self):
+    @staticmethod
+    def read_file(file_name: str) -> np.ndarray:
         """
-        Load data from NTU-RBD-D .skeleton files as it comes
-        """
-        self.frames = []
-        with open(self.file_name) as skeleton_file:
-            num_frames = int(skeleton_file.readline())
-
-            # Iterate over all frames in the sample
-            for frame_idx in range(num_frames):
-                num_bodies = int(skeleton_file.readline())
-                bodies = []
-
-                # Iterate over all bodies in each frame
-                for body in range(num_bodies):
-                    body_params = {k: float(v) for k, v in
-                                   zip(SkeletonSample.body_param_keys, skeleton_file.readline().split())}
-                    num_body_joints = int(skeleton_file.readline())
-                    body_params["joints"] = []
-
-                    # Iterate over all joints for each body
-                    for joint in range(num_body_joints):
-                        joint_params = {k: float(v) for k, v in
-                                        zip(SkeletonSample.joint_param_keys, skeleton_file.readline().split())}
-                        body_params["joints"].append(joint_params)
-                    bodies.append(body_params)
-                self.frames.append(bodies)
+        Read xyz-coordinates from NTU-RBD-D .skeleton files.
+        The whole file is converted to numbers at once, other body and joint parameters are skipped.
 
-    def _filter_bodies(self):
-        """
-        Read xyz-coordinates and filter bodies. S
+        :param file_name: .skeleton file
+        :return: xyz-coordinates of shape (max_body_kinect, num_frames, num_joints, 3)
         """
-        assert len(self.frames) > 0
-        self._data = np.zeros((max_body_kinect, len(self.frames), num_joints, 3), dtype=np.float32)
+        with open(file_name) as skeleton_file:
+            values = np.fromstring(skeleton_file.read(), dtype=np.float64, sep=" ")
+
+        num_body_params = len(SkeletonSample.body_param_keys)
+        num_joint_params = len(SkeletonSample.joint_param_keys)
+        num_frames = int(values[0])
+        assert num_frames > 0
+
+        # Walk over frame / body headers to find the position of the joints of each body
+        body_indices, joint_offsets = [], []
+        pos = 1
+        for frame_idx in range(num_frames):
+            num_bodies = int(values[pos])
+            pos += 1
+            for body_idx in range(num_bodies):
+                num_body_joints = int(values[pos + num_body_params])
+                assert body_idx < max_body_kinect and num_body_joints == num_joints
+                pos += num_body_params + 1
+                body_indices.append((body_idx, frame_idx))
+                joint_offsets.append(pos)
+                pos += num_body_joints * num_joint_params
 
-        # Write xyz-coordinates for every joint, body, frame to data array
         # Body comes first because it will be iterated over in next step
-        for frame_idx, frame in enumerate(self.frames):
-            for body_idx, body in enumerate(frame):
-                for joint_idx, joint in enumerate(body["joints"]):
-                    assert body_idx < max_body_kinect and joint_idx < num_joints
-                    self._data[body_idx, frame_idx, joint_idx, :] = [joint["x"], joint["y"], joint["z"]]
+        data = np.zeros((max_body_kinect, num_frames, num_joints, 3), dtype=np.float32)
+        if body_indices:
+            # Gather x, y, z (first three joint parameters) of every joint of every body
+            value_indices = (np.array(joint_offsets)[:, None, None] +
+                             np.arange(num_joints)[None, :, None] * num_joint_params + np.arange(3))
+            body_indices = np.array(body_indices)
+            data[body_indices[:, 0], body_indices[:, 1]] = values[value_indices]
+        return data
 
+    def _filter_bodies(self):
+        """
+        Filter bodies.
+        """
         # Actions always involve either a single person or two people,
         # however, sometimes the detections of kinect sensor are inaccurate and more bodies are detected
         # -> filter only the two most likely bodies
@@ -104,7 +105,7 @@ class SkeletonSample:
         :return: Skeleton data as a numpy array (3, NumFrames, NumJoints, MaxBodies)
         """
         if self._data is None:
-            self._load_data()
+            self._data = SkeletonSample.read_file(self.file_name)
             self._filter_bodies()
 
         return self._data
@@ -1,7 +1,8 @@
 import argparse
+import multiprocessing
 import os
 import re
-from typing import List
+from typing import List, Tuple
 
 from tqdm import tqdm
 
@@ -22,8 +23,83 @@ def is_sample(skeleton: SkeletonMetaData, benchmark: str, subset: str):
     return is_training_sample if subset == "train" else not is_training_sample
 
 
+# Skeleton data memory map of a worker process
+_worker_skeleton_data = None
+
+
+def _init_worker(skeleton_data_path: str):
+    global _worker_skeleton_data
+    _worker_skeleton_data = np.load(skeleton_data_path, mmap_mode="r+")
+
+
+def _read_skeleton(sample: Tuple[int, str]):
+    sample_idx, file_name = sample
+    data = SkeletonSample(file_name).data
+    _worker_skeleton_data[sample_idx, :, 0:data.shape[1], :, :] = data
+
+
+def read_skeleton_data(samples: List[SkeletonMetaData], out_path: str, num_workers: int = 0):
+    """
+    Read skeleton joints of all samples and write them to a .npy file.
+    The array is filled as a memory map so that it does not have to be held in memory.
+
+    :param samples: Skeleton samples
+    :param out_path: Output .npy file
+    :param num_workers: Number of worker processes reading skeleton files (0: read in main process)
+    """
+    global _worker_skeleton_data
+
+    # Create array for skeleton joints xyz coordinates
+    # Shape: (Number of samples,
+    #         Maximum number of "bodies" performing an action in a single frame (= 2),
+    #         Maximum number of frames (= 300),
+    #         Number of joints (= 25),
+    #         XYZ (= 3)
+    tmp_path = out_path + ".tmp.npy"
+    skeleton_data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                              shape=(len(samples), max_body_true, max_sequence_length, num_joints, 3))
+    skeleton_data.flush()
+    del skeleton_data
+    tasks = [(sample_idx, sample.file_name) for sample_idx, sample in enumerate(samples)]
+
+    # Fill large array with data from each sample
+    if num_workers > 0:
+        with multiprocessing.get_context("spawn").Pool(num_workers, _init_worker, (tmp_path,)) as pool:
+            for _ in tqdm(pool.imap_unordered(_read_skeleton, tasks, chunksize=16), "Reading skeleton joints",
+                          total=len(tasks)):
+                pass
+    else:
+        _init_worker(tmp_path)
+        for task in tqdm(tasks, "Reading skeleton joints"):
+            _read_skeleton(task)
+        _worker_skeleton_data.flush()
+        _worker_skeleton_data = None
+
+    # Only move the file to its final location once it is complete
+    os.replace(tmp_path, out_path)
+
+
+def normalize_skeleton_file(in_path: str, out_path: str, chunk_size: int = 1024):
+    """
+    Normalize skeleton data chunk by chunk and write it to a .npy file with shape (N, XYZ, T, V, M).
+
+    :param in_path: Unnormalized skeleton data (.npy file)
+    :param out_path: Output .npy file
+    :param chunk_size: Number of samples loaded at once
+    """
+    skeleton_data = np.load(in_path, mmap_mode="r")
+    validate_skeleton_data(skeleton_data)
+    n, m, t, v, c = skeleton_data.shape
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype=skeleton_data.dtype, shape=(n, c, t, v, m))
+    for start in tqdm(range(0, n, chunk_size), "Normalizing skeleton data"):
+        chunk = np.array(skeleton_data[start:start + chunk_size])
+        normalize_skeleton_data(chunk, 1, (0, 1), (4, 8))
+        out[start:start + chunk_size] = chunk.transpose((0, 4, 2, 3, 1))
+    out.flush()
+
+
 def process_skeletons(skeletons: List[SkeletonMetaData], processed_data_path: str, benchmarks: List[str],
-                      subsets: List[str], overwrite: bool = False):
+                      subsets: List[str], overwrite: bool = False, num_workers: int = 0):
     for benchmark in benchmarks:
         out_path = os.path.join(processed_data_path, benchmark)
         if os.path.exists(out_path):
@@ -41,32 +117,15 @@ def process_skeletons(skeletons: List[SkeletonMetaData], processed_data_path: st
             # Write action labels for each sample
             np.save(os.path.join(out_path, f"{subset}_labels.npy"), subset_labels)
 
-            if not os.path.exists(os.path.join(out_path, f"{subset}_features.unnormalized.npy")):
+            unnormalized_path = os.path.join(out_path, f"{subset}_features.unnormalized.npy")
+            if not os.path.exists(unnormalized_path):
                 print("Loading skeleton data...")
-                # Create array for skeleton joints xyz coordinates
-                # Shape: (Number of samples,
-                #         Maximum number of "bodies" performing an action in a single frame (= 2),
-                #         Maximum number of frames (= 300),
-                #         Number of joints (= 25),
-                #         XYZ (= 3)
-                skeleton_data = np.zeros((len(subset_samples), max_body_true, max_sequence_length, num_joints, 3),
-                                         dtype=np.float32)
-
-                # Fill large array with data from each sample
-                for sample_idx, sample in enumerate(tqdm(subset_samples, "Reading skeleton joints")):
-                    skeleton_sample = SkeletonSample(sample.file_name)
-                    skeleton_data[sample_idx, :, 0:skeleton_sample.data.shape[1], :, :] = skeleton_sample.data
-
-                np.save(os.path.join(out_path, f"{subset}_features.unnormalized.npy"), skeleton_data)
+                read_skeleton_data(subset_samples, unnormalized_path, num_workers)
             else:
                 print("Loading previously created unnormalized skeleton data...")
-                skeleton_data = np.load(os.path.join(out_path, f"{subset}_features.unnormalized.npy"))
 
             print("Normalizing skeleton data...")
-            validate_skeleton_data(skeleton_data)
-            normalize_skeleton_data(skeleton_data, 1, (0, 1), (4, 8))
-            skeleton_data = skeleton_data.transpose((0, 4, 2, 3, 1))
-            np.save(os.path.join(out_path, f"{subset}_features.npy"), skeleton_data)
+            normalize_skeleton_file(unnormalized_path, os.path.join(out_path, f"{subset}_features.npy"))
 
 
 def parse_skeleton_file_name(base_path: str, file_name: str, matcher: re.Pattern):
@@ -97,6 +156,8 @@ if __name__ == "__main__":
                         help="Destination directory for processed data.")
     parser.add_argument("-f", "--force_overwrite", action="store_true",
                         help="Force preprocessing of data even if it already exists.")
+    parser.add_argument("--num_workers", default=0, type=int,
+                        help="Number of worker processes for reading skeleton files (0: read in main process).")
     config = parser.parse_args()
 
     print("--- NTU-RGB-D data conversion ---")
@@ -105,4 +166,5 @@ if __name__ == "__main__":
                                         [line.rstrip() + ".skeleton" for line in config.missing_skeletons])
 
     print("Step 2: Preprocessing")
-    process_skeletons(skeleton_files, config.out_path, ["xsub", "xview"], ["train", "val"], config.force_overwrite)
+    process_skeletons(skeleton_files, config.out_path, ["xsub", "xview"], ["train", "val"], config.force_overwrite,
+                      config.num_workers)
@@ -51,7 +51,7 @@ settings = {
 
     # Extract RGB patches using Openpose keypoints.
     # Mode should only be used for iterating over processed samples, not for output.
-    # Output is zip-compressed
+    # Output is compressed (see 'rgb_compression_codec')
     "rgb_patches_op": {
         "processors": {
             "rgb": "rgb.RGBVideoProcessor"
@@ -75,6 +75,8 @@ settings = {
 
             # Writing to an uncompressed file requires ~150GB for UTD-MHAD for a patch size of 128x128
             "rgb_compress_patches": True,
+            # One of 'raw', 'zlib', 'lz4' or 'zstd' (the latter two require packages lz4 / zstandard)
+            "rgb_compression_codec": "zlib",
         }
     },
 
@@ -148,6 +150,23 @@ settings = {
         }
     },
 
+    # Same as rgb_default but frames are stored in the channels last layout of R(2+1)D input (time, height, width, rgb)
+    # Use with model arguments rgb_input_layout: thwc and rgb_channels_last: true
+    "rgb_thwc": {
+        "processors": {
+            "rgb": "rgb.RGBVideoProcessor"
+        },
+        "kwargs": {
+            "rgb_crop_square": (100, 480, 100, 480),
+            "rgb_output_size": (96, 96),
+            "rgb_output_fps": 15,
+            "rgb_resize_interpolation": None,
+            "rgb_normalize_image": True,
+            "rgb_output_numpy": True,
+            "rgb_output_layout": "thwc",
+        }
+    },
+
     "imu_default": {
         "processors": {
             "inertial": "inertial.InertialProcessor"
@@ -1,5 +1,6 @@
 import argparse
 import os
+from typing import Optional
 
 import datasets.utd_mhad.io as io
 from datasets.utd_mhad.config import get_preprocessing_setting
@@ -22,10 +23,22 @@ def get_configuration() -> argparse.Namespace:
                         help="Name of a modality. "
                              "All sequences are resampled to be of the "
                              "maximum sequence length of the specified modality.")
+    parser.add_argument("--num_workers", default=0, type=int,
+                        help="Number of worker processes for processing samples (0: process in main process).")
+    parser.add_argument("--cache_path", type=str,
+                        help="Directory where features of each modality are cached and reused across modes "
+                             "(default: <out_path>/.cache).")
+    parser.add_argument("--no_cache", action="store_true", help="Do not use or fill the feature cache.")
     parser.add_argument("--debug", action="store_true", help="debug mode")
     return parser.parse_args()
 
 
+def get_cache_path(cf: argparse.Namespace) -> Optional[str]:
+    if cf.no_cache:
+        return None
+    return cf.cache_path or os.path.join(cf.out_path, ".cache")
+
+
 def create_grouped_data(cf: argparse.Namespace) -> DataGroup:
     skeleton_data_files = io.get_files(os.path.join(cf.in_path, skeleton_data_path))
     inertial_data_files = io.get_files(os.path.join(cf.in_path, inertial_data_path))
@@ -106,7 +119,8 @@ def preprocess(cf: argparse.Namespace):
     # Create features for each modality and write them to files
     # Mode keys are equivalent to processor keys defined above to set the mode for a specific processor
     multi_modal_data_group.produce_features(splits, processors=processors, main_modality=cf.target_modality,
-                                            modes=processor_modes, out_path=out_path, **setting["kwargs"])
+                                            modes=processor_modes, out_path=out_path, num_workers=cf.num_workers,
+                                            cache_path=get_cache_path(cf), **setting["kwargs"])
 
 
 if __name__ == "__main__":
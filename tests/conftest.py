@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Same import roots as the scripts: project root (util, datasets) and torch_src (models, session, ...)
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (_root, os.path.join(_root, "torch_src")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
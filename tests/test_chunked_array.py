@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from util.chunked_array import ChunkedArrayReader, ChunkedArrayWriter
+
+
+@pytest.mark.parametrize("codec", ["raw", "zlib"])
+def test_read_write(tmp_path, codec):
+    path = str(tmp_path / "data.npc")
+    samples = [np.random.default_rng(i).normal(size=(i + 1, 3)).astype(np.float32) for i in range(4)]
+    with ChunkedArrayWriter(path, len(samples), codec) as writer:
+        # Samples of size 0 are valid samples as well
+        writer.write(np.zeros((0, 3), dtype=np.float32), 3)
+        for i, sample in enumerate(samples[:3]):
+            writer.write(sample, i)
+
+    reader = ChunkedArrayReader(path)
+    for i, sample in enumerate(samples[:3]):
+        np.testing.assert_array_equal(reader.read(i), sample)
+    assert reader.read(3).shape == (0, 3)
+
+
+@pytest.mark.parametrize("codec", ["raw", "zlib"])
+def test_read_unwritten_sample(tmp_path, codec):
+    path = str(tmp_path / "data.npc")
+    # The file is closed (and valid) even if writing is aborted
+    with pytest.raises(RuntimeError):
+        with ChunkedArrayWriter(path, 3, codec) as writer:
+            writer.write(np.ones((2, 3), dtype=np.float32), 0)
+            raise RuntimeError("aborted")
+
+    reader = ChunkedArrayReader(path)
+    np.testing.assert_array_equal(reader.read(0), np.ones((2, 3), dtype=np.float32))
+    for i in (1, 2):
+        with pytest.raises(IndexError):
+            reader.read(i)
@@ -0,0 +1,48 @@
+"""
+segment_softmax must compute the softmax of each segment like torch.softmax, also if the scores of different
+segments are far apart (the shift must be the maximum of each segment, not of all entries).
+"""
+
+import numpy as np
+import pytest
+import torch
+
+from models.mmargcn.graph_convolution import get_segment_index, segment_softmax
+
+
+def softmax_per_segment(x: torch.Tensor, segments: torch.Tensor, num_segments: int) -> torch.Tensor:
+    y = torch.zeros_like(x)
+    for s in range(num_segments):
+        mask = segments == s
+        y[..., mask] = torch.softmax(x[..., mask], -1)
+    return y
+
+
+def softmax_scatter_reduce(x: torch.Tensor, segments: torch.Tensor, num_segments: int) -> torch.Tensor:
+    shape = list(x.shape[:-1]) + [num_segments]
+    x_max = x.new_full(shape, float("-inf")).scatter_reduce(-1, segments.expand_as(x), x, "amax")
+    x = torch.exp(x - x_max[..., segments])
+    return x / x.new_zeros(shape).index_add_(x.dim() - 1, segments, x)[..., segments]
+
+
+def test_segment_softmax_separated_scores():
+    x = torch.tensor([[0., 1., 200., 201.]])
+    segments = torch.tensor([0, 0, 1, 1])
+    y = segment_softmax(x, segments, get_segment_index(segments.numpy(), 2))
+    assert torch.isfinite(y).all()
+    torch.testing.assert_close(y, torch.tensor([[0.2689, 0.7311, 0.2689, 0.7311]]), atol=1e-4, rtol=0)
+
+
+@pytest.mark.parametrize("num_segments", [1, 5, 20])
+def test_segment_softmax(num_segments):
+    rng = np.random.default_rng(0)
+    # Unsorted segments of different sizes (segment 0 is empty), scores of each segment around a different offset
+    segments = torch.from_numpy(rng.integers(min(1, num_segments - 1), num_segments, size=60))
+    offsets = torch.linspace(-500, 500, num_segments)[segments]
+    x = torch.randn(3, 4, 60, dtype=torch.float64) + offsets
+
+    y = segment_softmax(x, segments, get_segment_index(segments.numpy(), num_segments))
+    assert torch.isfinite(y).all()
+    torch.testing.assert_close(y, softmax_per_segment(x, segments, num_segments))
+    if hasattr(torch.Tensor, "scatter_reduce"):
+        torch.testing.assert_close(y, softmax_scatter_reduce(x, segments, num_segments))
@@ -0,0 +1,105 @@
+"""
+The vectorized skeleton normalization (normalize_skeleton_data) must be bit-for-bit equivalent
+to the per-sample functions (normalize_skeleton, pad_null_frames, ...).
+"""
+
+import numpy as np
+import pytest
+
+import util.preprocessing.skeleton as skeleton_util
+
+num_bodies = 2
+num_frames = 12
+num_joints = 25
+origin_joint = 1
+z_axis_joints = (0, 1)
+x_axis_joints = (8, 4)
+
+
+def make_skeleton_data(num_samples: int, dtype: type, seed: int = 0) -> np.ndarray:
+    """
+    Random skeletons with all kinds of special cases: leading, interior and trailing null frames,
+    empty (second) bodies, missing joints and degenerate bones (rotation can't be computed).
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(num_samples, num_bodies, num_frames, num_joints, 3)).astype(dtype)
+    for i, sample in enumerate(data):
+        case = i % 8
+        if case == 1:
+            # leading null frames
+            sample[:, :3] = 0
+        elif case == 2:
+            # interior null frames
+            sample[:, 4:6] = 0
+        elif case == 3:
+            # trailing null frames
+            sample[:, num_frames - 5:] = 0
+        elif case == 4:
+            # leading, interior and trailing null frames, empty second body
+            sample[:, :2] = 0
+            sample[:, 5] = 0
+            sample[:, num_frames - 3:] = 0
+            sample[1] = 0
+        elif case == 5:
+            # degenerate bones in the first frame: zero length and parallel to the target axis
+            sample[0, 0, z_axis_joints[1]] = sample[0, 0, z_axis_joints[0]]
+            sample[0, 0, x_axis_joints[1]] = sample[0, 0, x_axis_joints[0]] + np.array([1, 0, 0], dtype=dtype)
+        elif case == 6:
+            # missing joints and a body that only appears in a few frames
+            sample[:, :, 10:14] = 0
+            sample[1, :num_frames - 2] = 0
+        elif case == 7:
+            # no skeleton at all
+            sample[:] = 0
+    return data
+
+
+def normalize_per_sample(skeleton_data: np.ndarray) -> np.ndarray:
+    skeleton_data = skeleton_data.copy()
+    for i, skeleton in enumerate(skeleton_data):
+        skeleton_data[i] = skeleton_util.normalize_skeleton(skeleton, origin_joint, z_axis_joints, x_axis_joints)
+    return skeleton_data
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("num_samples,chunk_size", [(16, 256), (19, 4), (5, 1)])
+def test_normalize_skeleton_data(dtype, num_samples, chunk_size):
+    data = make_skeleton_data(num_samples, dtype)
+    expected = normalize_per_sample(data)
+
+    skeleton_util.normalize_skeleton_data(data, origin_joint, z_axis_joints, x_axis_joints, chunk_size)
+    assert data.dtype == dtype
+    np.testing.assert_array_equal(data, expected)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_pad_null_frames_chunk(dtype):
+    data = make_skeleton_data(16, dtype)
+    expected = np.stack([skeleton_util.pad_null_frames(s) for s in data.copy()])
+
+    skeleton_util._pad_null_frames_chunk(data)
+    np.testing.assert_array_equal(data, expected)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_move_skeleton_origin_chunk(dtype):
+    data = make_skeleton_data(16, dtype)
+    expected = np.stack([skeleton_util.move_skeleton_origin(s, origin_joint) for s in data.copy()])
+
+    skeleton_util._move_skeleton_origin_chunk(data, origin_joint)
+    np.testing.assert_array_equal(data, expected)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("joint_axis_indices,axis", [(z_axis_joints, (0, 0, 1)), (x_axis_joints, (1, 0, 0))])
+def test_parallelize_joints_to_axis_chunk(dtype, joint_axis_indices, axis):
+    data = make_skeleton_data(16, dtype)
+    expected = data.copy()
+    for i, skeleton in enumerate(expected):
+        try:
+            expected[i] = skeleton_util.parallelize_joints_to_axis(skeleton, joint_axis_indices, axis)
+        except skeleton_util.InvalidSkeletonException:
+            pass
+
+    skeleton_util._parallelize_joints_to_axis_chunk(data, joint_axis_indices, axis)
+    np.testing.assert_array_equal(data, expected)
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of IMU graph construction (graph, adjacency matrices and edge queries)
+for the inertial shapes of UTD-MHAD and MMAct.
+The previous implementation (nested Python loops) is measured for comparison if the graph is small enough.
+
+Run from the repository root: PYTHONPATH=.:torch_src python tools/benchmark_graph.py
+"""
+
+import time
+
+import numpy as np
+
+import datasets.mmact.constants as mmact_constants
+import datasets.utd_mhad.constants as utd_mhad_constants
+from models.mmargcn.imu_feature_models import build_imu_graph, build_imu_graph_adjacency
+from util import adjacency_cache
+from util.graph import Graph
+
+# (name, data shape, number of graph signals per time step)
+shapes = [
+    ("UTD-MHAD node_per_value", utd_mhad_constants.inertial_shape, 0),
+    ("UTD-MHAD node_per_sensor", utd_mhad_constants.inertial_shape, 2),
+    ("MMAct node_per_value", (mmact_constants.inertial_max_sequence_length, 12), 0),
+    ("MMAct node_per_sensor", (mmact_constants.inertial_max_sequence_length, 12), 4),
+]
+# Skip the loop implementation and dense adjacency matrices for larger graphs
+max_vertices_loop = 5000
+max_vertices_dense = 10000
+
+
+def build_imu_graph_loop(data_shape: tuple, num_signals: int = 0, temporal_back_connections: int = 1,
+                         inter_signal_back_connections=False) -> Graph:
+    sequence_length, num_signals_0 = data_shape
+    if num_signals == 0:
+        num_signals = num_signals_0
+
+    num_vertices = sequence_length * num_signals
+    graph_edges = []
+    for i in range(0, num_vertices, num_signals):
+        for j in range(num_signals):
+            for k in range(j + 1, num_signals):
+                graph_edges.append((i + j, i + k))
+                graph_edges.append((i + k, i + j))
+
+        for j in range(min(i // num_signals, temporal_back_connections)):
+            for k in range(num_signals):
+                for m in range(num_signals):
+                    if k == m or inter_signal_back_connections:
+                        graph_edges.append((i - num_signals * (j + 1) + k, i + m))
+
+    return Graph(graph_edges, num_vertices)
+
+
+def measure(fn, num_iterations: int = 3) -> float:
+    """
+    :return: Minimum time of a call in milliseconds
+    """
+    times = []
+    for _ in range(num_iterations):
+        adjacency_cache.clear_memory_cache()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main():
+    for name, data_shape, num_signals in shapes:
+        for inter_signal_back_connections in (False, True):
+            graph = build_imu_graph(data_shape, num_signals, 1, inter_signal_back_connections)
+            print(f"{name} (inter-signal back connections: {inter_signal_back_connections}): {graph}")
+            results = {"build_imu_graph": measure(
+                lambda: build_imu_graph(data_shape, num_signals, 1, inter_signal_back_connections))}
+
+            if graph.num_vertices <= max_vertices_loop:
+                loop_graph = build_imu_graph_loop(data_shape, num_signals, 1, inter_signal_back_connections)
+                assert np.array_equal(loop_graph.edges, graph.edges)
+                results["build_imu_graph (loop)"] = measure(
+                    lambda: build_imu_graph_loop(data_shape, num_signals, 1, inter_signal_back_connections))
+
+            query = graph.edges[::2]
+            assert np.all(graph.has_edges(query))
+            results["has_edges (E / 2 edges)"] = measure(lambda: graph.has_edges(query))
+            results["with_removed_edges (E / 2 edges)"] = measure(lambda: graph.with_removed_edges(query))
+
+            formats = ["sparse", "block_banded"]
+            if graph.num_vertices <= max_vertices_dense:
+                formats.append("dense")
+            for adjacency_format in formats:
+                results[f"adjacency ({adjacency_format})"] = measure(lambda: build_imu_graph_adjacency(
+                    data_shape, num_signals, "stgcn", adjacency_format, "column", 1, inter_signal_back_connections))
+
+            for k, v in results.items():
+                print(f"  {k:40s}{v:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
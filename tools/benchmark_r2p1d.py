@@ -0,0 +1,95 @@
+"""
+Throughput benchmark of the R(2+1)D RGB model (mode rgb_r2p1d) for inputs of the size used by rgb_r2p1d.yaml
+(UTD-MHAD preprocessing config rgb_default: 96 frames of 96x96 pixels, batch size 8).
+Input layouts (see RGBVideoProcessor), channels last memory format and mixed precision
+(float16 on CUDA, bfloat16 on CPU) are compared for inference and training steps on random data.
+
+Run from the repository root: PYTHONPATH=.:torch_src python tools/benchmark_r2p1d.py [--device cuda]
+"""
+
+import argparse
+import itertools
+
+import torch
+
+import benchmark
+import datasets.utd_mhad.constants as utd_mhad_constants
+import torch_util
+from models.mmargcn.rgb_feature_models import RgbR2p1DModel
+from util.preprocessing.processor.rgb import get_frames_shape
+
+num_classes = 27
+frame_size = (96, 96)
+
+
+def get_autocast(device: torch.device):
+    # Same as MixedPrecisionStep (session/procedures/step.py)
+    if device.type == "cuda":
+        return torch.cuda.amp.autocast()
+    return torch.autocast("cpu", dtype=torch.bfloat16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="R(2+1)D throughput benchmark")
+    parser.add_argument("--device", type=str, help="Device, e.g. 'cuda' or 'cpu' (default: 'cuda' if available)")
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--model_depth", type=int, default=18)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup_iterations", type=int, default=3)
+    parser.add_argument("--layouts", nargs="+", default=["tchw", "cthw", "thwc"])
+    args = parser.parse_args()
+
+    device = torch_util.get_device(args.device)
+    if device.type == "cuda":
+        torch.backends.cudnn.benchmark = True
+    frames_shape = get_frames_shape("tchw", utd_mhad_constants.rgb_max_sequence_length, *frame_size)
+    data = torch.randn(args.batch_size, *frames_shape)
+    label = torch.randint(num_classes, (args.batch_size,), device=device)
+    loss_function = torch.nn.CrossEntropyLoss()
+    print(f"Device {device} | batch size {args.batch_size} | input {tuple(data.shape)} (tchw)")
+
+    results = {}
+    for layout, channels_last, mixed_precision in itertools.product(args.layouts, (False, True), (False, True)):
+        if layout == "cthw":
+            features = data.permute(0, 2, 1, 3, 4).contiguous()
+        elif layout == "thwc":
+            features = data.permute(0, 1, 3, 4, 2).contiguous()
+        else:
+            features = data
+        features = features.to(device)
+
+        model = RgbR2p1DModel(None, num_classes, None, model_depth=args.model_depth, rgb_input_layout=layout,
+                              rgb_channels_last=channels_last).to(device)
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.001)
+        loss_scale = torch.cuda.amp.GradScaler(enabled=mixed_precision and device.type == "cuda")
+
+        def forward():
+            if mixed_precision:
+                with get_autocast(device):
+                    return loss_function(model(features), label)
+            return loss_function(model(features), label)
+
+        def inference():
+            with torch.no_grad():
+                forward()
+
+        def training_step():
+            optimizer.zero_grad()
+            loss_scale.scale(forward()).backward()
+            loss_scale.step(optimizer)
+            loss_scale.update()
+
+        name = f"{layout}{' channels last' if channels_last else ''}{' mixed precision' if mixed_precision else ''}"
+        for mode, fn, train in (("inference", inference, False), ("training step", training_step, True)):
+            model.train(train)
+            results[f"{mode}: {name}"] = benchmark.summarize_latency(
+                benchmark.measure_latency(fn, device, args.iterations, args.warmup_iterations))
+
+    print(benchmark.format_latency_table(results))
+    print()
+    for name, latency in results.items():
+        print(f"{name:60s}{args.batch_size / latency['mean'] * 1000:10.2f} clips/s")
+
+
+if __name__ == "__main__":
+    main()
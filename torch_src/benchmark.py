@@ -0,0 +1,93 @@
+import time
+from typing import Callable, Dict, Iterable, Sequence
+
+import numpy as np
+import torch
+
+default_iterations = 50
+default_warmup_iterations = 10
+
+
+def synchronize(device: torch.device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def measure_latency(fn: Callable[[], None], device: torch.device, num_iterations: int = default_iterations,
+                    num_warmup_iterations: int = default_warmup_iterations) -> np.ndarray:
+    """
+    Measure the latency of a function. The device is synchronized after each call.
+
+    :param fn: Function to measure
+    :param device: Device the function runs on
+    :param num_iterations: Number of measured calls
+    :param num_warmup_iterations: Number of calls before measuring (e.g. cudnn autotuning, memory allocations)
+    :return: Latency of each call in milliseconds
+    """
+    for _ in range(num_warmup_iterations):
+        fn()
+    synchronize(device)
+
+    latencies = np.zeros(num_iterations)
+    for i in range(num_iterations):
+        start = time.perf_counter()
+        fn()
+        synchronize(device)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def summarize_latency(latencies: Sequence[float]) -> Dict[str, float]:
+    """
+    :param latencies: Latencies in milliseconds
+    :return: Dictionary with mean, standard deviation, min, median, 90th and 99th percentile
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    if len(latencies) == 0:
+        return {k: float("nan") for k in ("mean", "std", "min", "p50", "p90", "p99")}
+    return {
+        "mean": float(np.mean(latencies)),
+        "std": float(np.std(latencies)),
+        "min": float(np.min(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p90": float(np.percentile(latencies, 90)),
+        "p99": float(np.percentile(latencies, 99))
+    }
+
+
+def format_latency_table(results: Dict[str, Dict[str, float]]) -> str:
+    """
+    Format summarized latencies (see summarize_latency) as a table with one row per entry.
+
+    :param results: Dictionary of row name and summarized latency
+    :return: Table
+    """
+    columns = ("mean", "std", "min", "p50", "p90", "p99")
+    name_width = max([len("Latency (ms)")] + [len(name) for name in results])
+    lines = ["Latency (ms)".ljust(name_width) + "".join(c.rjust(10) for c in columns)]
+    for name, summary in results.items():
+        lines.append(name.ljust(name_width) + "".join(f"{summary[c]:10.2f}" for c in columns))
+    return "\n".join(lines)
+
+
+def get_tensor_memory(tensors: Iterable[torch.Tensor]) -> int:
+    """
+    Memory of tensors in bytes. Tensors sharing memory (e.g. the same adjacency matrix registered in each layer)
+    are counted once. Sparse tensors count their indices and values.
+
+    :param tensors: Tensors
+    :return: Memory in bytes
+    """
+    memory = 0
+    data_pointers = set()
+    for tensor in tensors:
+        parts = (tensor._indices(), tensor._values()) if tensor.is_sparse else (tensor,)
+        for part in parts:
+            if part.data_ptr() not in data_pointers:
+                data_pointers.add(part.data_ptr())
+                memory += part.numel() * part.element_size()
+    return memory
+
+
+def format_memory(num_bytes: float) -> str:
+    return f"{num_bytes / 2 ** 20:.2f} MiB"
@@ -100,9 +100,43 @@ def get_configuration(session_types: tuple, optimizer_choices: tuple,
     parser.add_argument("--epochs", type=int, help="Number of epochs")
     parser.add_argument("--optimizer", type=str, choices=optimizer_choices, help="Optimizer to use")
     parser.add_argument("--lr_scheduler", type=str, choices=lr_scheduler_choices, help="Learning rate scheduler to use")
-    parser.add_argument("--mixed_precision", action="store_true",
-                        help="Use mixed precision instead of only float32.")
+    parser.add_argument("--device", type=str,
+                        help="Device to run the model on, e.g. 'cuda', 'cuda:1' or 'cpu' "
+                             "(default: 'cuda' if available else 'cpu').")
+    parser.add_argument("--num_threads", type=int, help="Number of CPU threads used for intra-op parallelism.")
+    parser.add_argument("--num_interop_threads", type=int,
+                        help="Number of CPU threads used for inter-op parallelism.")
+    parser.add_argument("--cpu_affinity", type=int, nargs="+",
+                        help="Pin the process to these CPU cores (also sets num_threads if unspecified).")
+    parser.add_argument("--adjacency_cache_path", type=str,
+                        help="Directory to store adjacency matrices of graphs across runs "
+                             "(e.g. for hyperparameter tuning). Matrices are always cached in memory.")
+    parser.add_argument("--mixed_precision", action="store_true", default=None,
+                        help="Use mixed precision instead of only float32 (bfloat16 if running on CPU).")
     parser.add_argument("--profiling_batches", default=50, type=int, help="Number of batches for profiling")
+    parser.add_argument("--benchmark_iterations", type=int,
+                        help="Number of measured iterations for benchmarking (default: 50).")
+    parser.add_argument("--benchmark_warmup_iterations", type=int,
+                        help="Number of iterations before measuring for benchmarking (default: 10).")
+    parser.add_argument("--disable_compile", action="store_true", default=None,
+                        help="For export only: Don't compare with a model compiled by torch.compile.")
+    parser.add_argument("--compile_mode", type=str,
+                        help="For export only: torch.compile mode, e.g. 'reduce-overhead' or 'max-autotune'.")
+    parser.add_argument("--preprocessing_modes", type=str,
+                        help="For inference only: Comma-separated preprocessing modes used to produce the input data "
+                             "(default: name of the input data directory).")
+    parser.add_argument("--target_modality", type=str,
+                        help="For inference only: Target modality used to produce the input data.")
+    parser.add_argument("--temporal_stride", type=int,
+                        help="For inference only: Temporal stride used to produce the input data, "
+                             "e.g. '--shrink' of MMAct preprocessing (default: 1).")
+    parser.add_argument("--inference_port", type=int,
+                        help="For inference only: Accept requests on this local TCP port instead of stdin.")
+    parser.add_argument("--max_batch_size", type=int,
+                        help="For inference only: Maximum number of requests per batch (default: test_batch_size).")
+    parser.add_argument("--max_latency_ms", type=float,
+                        help="For inference only: Maximum time a request waits for other requests "
+                             "before its batch is started (default: 10).")
     parser.add_argument("--disable_shuffle", action="store_true", help="Disables shuffling of data before training")
     parser.add_argument("--disable_logging", action="store_true", help="Disable printing status to console.")
     parser.add_argument("--disable_checkpointing", action="store_true",
@@ -110,7 +144,19 @@ def get_configuration(session_types: tuple, optimizer_choices: tuple,
     parser.add_argument("--fixed_seed", type=int, help="Set a fixed seed for all random functions.")
     parser.add_argument("--in_memory", action="store_true",
                         help="Load all datasets into main memory instead of mapping them.")
-    parser.add_argument("--eval_session_id", type=str, help="For evaluation only: "
+    parser.add_argument("--batched_loading", action="store_true", default=None,
+                        help="Read whole batches with a single read per modality instead of sample by sample.")
+    parser.add_argument("--num_workers", type=int, help="Number of DataLoader worker processes.")
+    parser.add_argument("--prefetch_factor", type=int,
+                        help="Number of batches loaded in advance by each DataLoader worker.")
+    parser.add_argument("--persistent_workers", action="store_true", default=None,
+                        help="Keep DataLoader worker processes alive between epochs.")
+    parser.add_argument("--pin_memory", action="store_true", default=None,
+                        help="Let the DataLoader copy batches into pinned memory.")
+    parser.add_argument("--prefetch_batches", type=int,
+                        help="Number of batches copied to the GPU in advance while the model processes "
+                             "the current batch (default: 2, 0: copy synchronously).")
+    parser.add_argument("--eval_session_id", type=str, help="For evaluation, export and inference only: "
                                                             "evaluate specified session using its model weights.")
     config = parser.parse_args()
 
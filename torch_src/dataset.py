@@ -2,7 +2,8 @@ import os
 from typing import Sequence, Tuple
 
 import numpy as np
-from torch.utils.data import Dataset
+import torch
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler, get_worker_info
 
 from loader import DatasetLoader
 
@@ -12,10 +13,13 @@ class MultiModalDataset(Dataset):
     Load data from multiple paths each using their own loader.
     """
 
-    def __init__(self, input_data: Sequence[Tuple[str, DatasetLoader]], split: str, debug=False):
+    def __init__(self, input_data: Sequence[Tuple[str, DatasetLoader]], split: str, debug=False,
+                 batched: bool = False):
         """
         :param input_data: List of paths and loaders
         :param split: Split (training or validation)
+        :param batched: If true, __getitem__ receives a list of indices (see create_data_loader)
+            and returns a whole collated batch.
         """
 
         assert len(input_data) > 0, "Must at least specify one data path"
@@ -33,6 +37,8 @@ class MultiModalDataset(Dataset):
         if debug:
             self.labels_data = self.labels_data[:100]
 
+        self.batched = batched
+
     def __len__(self):
         return len(self.labels_data)
 
@@ -40,6 +46,9 @@ class MultiModalDataset(Dataset):
         return self
 
     def __getitem__(self, index: int):
+        if self.batched:
+            return self.get_batch(index)
+
         if len(self.features_data) == 1:
             loader, data = next(iter(self.features_data.values()))
             features = loader.index_data_sample(data, index)
@@ -48,6 +57,36 @@ class MultiModalDataset(Dataset):
         label = self.labels_data[index]
         return features, label, index
 
+    def get_batch(self, indices: Sequence[int]):
+        """
+        Fetch a whole batch with a single read per modality.
+        Indices are sorted so that reads of memory mapped data are as sequential as possible.
+        The samples of the returned batch are therefore in sorted order as well.
+        (Not named __getitems__ because the DataLoader calls that with auto-collation enabled.)
+
+        :param indices: Sample indices of the batch
+        :return: Tuple of collated tensors (features, labels, indices)
+        """
+        indices = np.sort(np.asarray(indices, dtype=np.int64))
+        # Pinned memory allows asynchronous copies to the gpu.
+        # Only pin in the main process, pinning in worker processes is done by the DataLoader if requested.
+        pin = torch.cuda.is_available() and get_worker_info() is None
+
+        features = {}
+        for k, (loader, data) in self.features_data.items():
+            shape = (len(indices), *loader.get_sample_shape(data))
+            dtype = torch.from_numpy(np.empty(0, dtype=loader.get_sample_dtype(data))).dtype
+            # Pinned allocations are served from pytorch's caching host allocator,
+            # so buffers are reused across batches instead of being allocated each time.
+            buffer = torch.empty(shape, dtype=dtype, pin_memory=pin)
+            loader.index_data_batch(data, indices, buffer.numpy())
+            features[k] = buffer
+
+        if len(features) == 1:
+            features = next(iter(features.values()))
+        labels = torch.from_numpy(self.labels_data[indices])
+        return features, labels, torch.from_numpy(indices)
+
     def get_input_shape(self) -> dict:
         return {
             k: loader.get_sample_shape(data)
@@ -56,3 +95,25 @@ class MultiModalDataset(Dataset):
 
     def get_num_classes(self) -> int:
         return len(np.unique(self.labels_data))
+
+
+def create_data_loader(dataset: MultiModalDataset, batch_size: int, shuffle: bool, drop_last: bool,
+                       **kwargs) -> DataLoader:
+    """
+    Create a DataLoader for the given dataset.
+    If the dataset is batched, a batch sampler is used as sampler so that the dataset receives all indices of a batch
+    at once and automatic collation is disabled.
+
+    :param dataset: Dataset
+    :param batch_size: Batch size
+    :param shuffle: Shuffle samples
+    :param drop_last: Drop last incomplete batch
+    :param kwargs: Additional DataLoader arguments
+    :return: DataLoader
+    """
+    if dataset.batched:
+        sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        batch_sampler = BatchSampler(sampler, batch_size, drop_last)
+        return DataLoader(dataset, batch_size=None, sampler=batch_sampler, **kwargs)
+
+    return DataLoader(dataset, batch_size, shuffle=shuffle, drop_last=drop_last, **kwargs)
@@ -1,9 +1,15 @@
 import abc
+import atexit
+import hashlib
+import os
+import shutil
 import zipfile
 from typing import Sequence
 
 import numpy as np
 
+from util.chunked_array import ChunkedArrayReader
+
 
 class DatasetLoader:
     @abc.abstractmethod
@@ -18,6 +24,22 @@ class DatasetLoader:
     def get_sample_shape(self, data) -> Sequence[int]:
         pass
 
+    def get_sample_dtype(self, data) -> np.dtype:
+        return self.index_data_sample(data, 0).dtype
+
+    def index_data_batch(self, data, indices: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Read multiple samples at once and write them to the given output array.
+
+        :param data: data returned by load_data
+        :param indices: sorted sample indices
+        :param out: output array of shape (len(indices), *sample_shape)
+        :return: out
+        """
+        for i, index in enumerate(indices):
+            out[i] = self.index_data_sample(data, index)
+        return out
+
 
 class NumpyDatasetLoader(DatasetLoader):
     def __init__(self, **kwargs):
@@ -32,6 +54,135 @@ class NumpyDatasetLoader(DatasetLoader):
     def get_sample_shape(self, data: np.ndarray) -> Sequence[int]:
         return data.shape[1:]
 
+    def get_sample_dtype(self, data: np.ndarray) -> np.dtype:
+        return data.dtype
+
+    def index_data_batch(self, data: np.ndarray, indices: np.ndarray, out: np.ndarray) -> np.ndarray:
+        # single fancy-index read for the whole batch;
+        # mode 'clip' lets numpy write directly into out instead of buffering (indices come from a sampler)
+        return np.take(data, indices, axis=0, out=out, mode="clip")
+
+
+class SharedMemoryDatasetLoader(NumpyDatasetLoader):
+    """
+    Copy each feature file once to shared memory (default: /dev/shm) and map it read-only from there.
+    All DataLoader worker processes attach to the same pages instead of holding their own in-memory copy.
+    Copies are reused by later sessions as long as the source file is unchanged.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._mmap_mode = "r"
+        self._shm_path = kwargs.get("shm_path", "/dev/shm/mmargcn")
+        self._keep_shared_memory = kwargs.get("keep_shared_memory", True)
+
+    def _get_shared_file(self, path: str) -> str:
+        path = os.path.abspath(path)
+        path_hash = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self._shm_path, f"{path_hash}_{os.path.basename(path)}")
+
+    def load_data(self, path: str):
+        shm_file = self._get_shared_file(path)
+        stat = os.stat(path)
+
+        if os.path.exists(shm_file):
+            shm_stat = os.stat(shm_file)
+            is_current = shm_stat.st_size == stat.st_size and shm_stat.st_mtime_ns == stat.st_mtime_ns
+        else:
+            is_current = False
+
+        if not is_current:
+            os.makedirs(self._shm_path, exist_ok=True)
+            # copy to temporary file first so that concurrent sessions never map a partially written file
+            tmp_file = f"{shm_file}.{os.getpid()}.tmp"
+            shutil.copy2(path, tmp_file)
+            os.replace(tmp_file, shm_file)
+
+            if not self._keep_shared_memory:
+                atexit.register(SharedMemoryDatasetLoader._remove_shared_file, shm_file, os.getpid())
+
+        return np.load(shm_file, self._mmap_mode)
+
+    @staticmethod
+    def _remove_shared_file(shm_file: str, owner_pid: int):
+        # worker processes inherit the exit handler but must not remove the file
+        if os.getpid() == owner_pid and os.path.exists(shm_file):
+            os.remove(shm_file)
+
+
+class CnnFeatureCacheDatasetLoader(NumpyDatasetLoader):
+    """
+    Replace RGB frames (num_samples, num_frames, C, H, W) by the output of a frozen pretrained CNN for each frame
+    (num_samples, num_frames, feature_size), see model argument 'rgb_frozen_backbone' of RgbCnnEncoder.
+    Features are computed once and stored in a cache file which is memory mapped like in NumpyDatasetLoader.
+    Row i of the cache file contains the features of sample i. The file name contains a hash of the data file
+    (path, size, modification time) and of the backbone weights, so stale features are never used.
+    Other feature files of the input path (e.g. skeleton) are loaded unchanged.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Feature files to encode (prefix of the file name)
+        self._feature_ids = tuple(kwargs.get("feature_ids", ("rgb",)))
+        # CNN model of util/preprocessing/cnn_features.py (default: resnet18)
+        self._backbone = kwargs.get("backbone", None)
+        # Directory of cache files (default: 'feature_cache' next to the data file)
+        self._cache_path = kwargs.get("cache_path", None)
+        self._device = kwargs.get("device", None)
+        self._batch_size = kwargs.get("batch_size", 256)
+
+    def _get_cache_file(self, path: str) -> str:
+        from util.preprocessing import cnn_features
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        h = hashlib.sha1()
+        h.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode("utf-8"))
+        h.update(cnn_features.get_backbone_hash(self._backbone).encode("utf-8"))
+
+        cache_path = self._cache_path or os.path.join(os.path.dirname(path), "feature_cache")
+        name = os.path.splitext(os.path.basename(path))[0]
+        backbone = self._backbone or cnn_features.default_model
+        return os.path.join(cache_path, f"{name}_{backbone}_{h.hexdigest()[:16]}.npy")
+
+    def _compute_features(self, path: str, cache_file: str):
+        import torch
+        from util.preprocessing import cnn_features
+
+        frames = np.load(path, "r")
+        num_samples, num_frames = frames.shape[:2]
+        frames = frames.reshape(num_samples * num_frames, *frames.shape[2:])
+        model = cnn_features.get_backbone(self._backbone, self._device)
+        device = next(model.parameters()).device
+        print(f"Computing CNN features of {path} ({num_samples} samples)...")
+
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Write to a temporary file first so that concurrent sessions never map a partially written file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        out = None
+        for start in range(0, len(frames), self._batch_size):
+            batch = torch.from_numpy(np.array(frames[start:start + self._batch_size]))
+            with torch.no_grad():
+                features = torch.flatten(model(batch.to(device=device, dtype=torch.float32)), 1).cpu().numpy()
+            if out is None:
+                out = np.lib.format.open_memmap(tmp_file, "w+", np.float32,
+                                                (num_samples, num_frames, features.shape[1]))
+            out.reshape(num_samples * num_frames, -1)[start:start + len(features)] = features
+
+        out.flush()
+        del out
+        os.replace(tmp_file, cache_file)
+
+    def load_data(self, path: str):
+        feature_id = os.path.basename(path)[:os.path.basename(path).index("_")]
+        if feature_id not in self._feature_ids:
+            return super().load_data(path)
+
+        cache_file = self._get_cache_file(path)
+        if not os.path.exists(cache_file):
+            self._compute_features(path, cache_file)
+        return np.load(cache_file, self._mmap_mode)
+
 
 class ZipNumpyDatasetLoader(DatasetLoader):
     @staticmethod
@@ -47,5 +198,30 @@ class ZipNumpyDatasetLoader(DatasetLoader):
         return ZipNumpyDatasetLoader._load_sample(data, f"s{index}")
 
     def get_sample_shape(self, data: zipfile.ZipFile) -> Sequence[int]:
-        first = next(data.namelist())
+        first = data.namelist()[0]
         return ZipNumpyDatasetLoader._load_sample(data, first).shape
+
+
+class ChunkedNumpyDatasetLoader(DatasetLoader):
+    """
+    Load data written by ChunkedNumpyWriter. Samples are read with pread (or from a memory map if uncompressed),
+    so worker processes don't share a file handle. Batches are decompressed in a thread pool.
+    """
+
+    def __init__(self, **kwargs):
+        self._num_threads = kwargs.get("num_threads", 4)
+
+    def load_data(self, path: str):
+        return ChunkedArrayReader(path, self._num_threads)
+
+    def index_data_sample(self, data: ChunkedArrayReader, index: int) -> np.ndarray:
+        return np.array(data.read(index))
+
+    def get_sample_shape(self, data: ChunkedArrayReader) -> Sequence[int]:
+        return data.get_sample_shape()
+
+    def get_sample_dtype(self, data: ChunkedArrayReader) -> np.dtype:
+        return data.dtype
+
+    def index_data_batch(self, data: ChunkedArrayReader, indices: np.ndarray, out: np.ndarray) -> np.ndarray:
+        return data.read_into(indices, out)
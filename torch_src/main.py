@@ -5,6 +5,7 @@ locale.setlocale(locale.LC_ALL, "")
 import torch_util
 import session_helper
 from config import get_configuration
+from util import adjacency_cache
 
 if __name__ == "__main__":
     cf = get_configuration(tuple(session_helper.session_types.keys()),
@@ -12,6 +13,8 @@ if __name__ == "__main__":
                            tuple(session_helper.available_lr_schedulers.keys()))
     if cf.fixed_seed is not None:
         torch_util.set_seed(cf.fixed_seed)
+    torch_util.configure_threads(cf.num_threads, cf.num_interop_threads, cf.cpu_affinity)
+    adjacency_cache.set_cache_path(cf.adjacency_cache_path)
 
     session_type = session_helper.create_session(cf)
     session = session_type.instantiate(cf)
@@ -363,10 +363,9 @@ class DataDependentAdjacency(Metric):
         self.indices.extend(kwargs["indices"])
         for name, module in model.named_modules():
             if self.module_name in name and hasattr(module, "adj_c"):
-                # name must start like l1.gcn1.
+                # name must contain layers.1.gcn1
                 end = name.rindex(self.module_name) - 1
-                start = name.rfind(".l", 0, end) + 2
-                layer = int(name[start:end])
+                layer = int(name[name.rfind(".", 0, end) + 1:end])
                 if layer not in self.matrices:
                     self.matrices[layer] = []
                 self.matrices[layer].append(torch.transpose(torch.stack(module.adj_c).cpu().detach(), 0, 1))
@@ -7,6 +7,7 @@ In CVPR.
 """
 
 import math
+from typing import Optional
 
 import numpy as np
 import torch
@@ -35,6 +36,12 @@ def bn_init(bn, scale):
     nn.init.constant_(bn.bias, 0)
 
 
+class Zero(nn.Module):
+    # Disabled residual connection (module instead of lambda so that the model can be scripted)
+    def forward(self, x):
+        return torch.zeros((), dtype=x.dtype, device=x.device)
+
+
 class unit_tcn(nn.Module):
     def __init__(self, in_channels, out_channels, kernel_size=9, stride=1):
         super(unit_tcn, self).__init__()
@@ -77,7 +84,7 @@ class unit_gcn(nn.Module):
                 nn.BatchNorm2d(out_channels)
             )
         else:
-            self.down = lambda x: x
+            self.down = nn.Identity()
 
         self.bn = nn.BatchNorm2d(out_channels)
         self.soft = nn.Softmax(-2)
@@ -94,19 +101,21 @@ class unit_gcn(nn.Module):
 
     def forward(self, x):
         N, C, T, V = x.size()
-        A = self.A.cuda(x.get_device())
+        A = self.A.to(x.device)
         A = A + self.PA
 
-        y = None
-        for i in range(self.num_subset):
-            A1 = self.conv_a[i](x).permute(0, 3, 1, 2).contiguous().view(N, V, self.inter_c * T)
-            A2 = self.conv_b[i](x).view(N, self.inter_c * T, V)
+        y: Optional[torch.Tensor] = None
+        for i, (conv_a, conv_b, conv_d) in enumerate(zip(self.conv_a, self.conv_b, self.conv_d)):
+            A1 = conv_a(x).permute(0, 3, 1, 2).contiguous().view(N, V, self.inter_c * T)
+            A2 = conv_b(x).view(N, self.inter_c * T, V)
             A1 = self.soft(torch.matmul(A1, A2) / A1.size(-1))  # N V V
-            self.adj_c[i] = A1
+            if not torch.jit.is_scripting():
+                self.adj_c[i] = A1
             A1 = A1 + A[i]
             A2 = x.view(N, C * T, V)
-            z = self.conv_d[i](torch.matmul(A2, A1).view(N, C, T, V))
+            z = conv_d(torch.matmul(A2, A1).view(N, C, T, V))
             y = z + y if y is not None else z
+        assert y is not None
 
         y = self.bn(y)
         y += self.down(x)
@@ -120,10 +129,10 @@ class TCN_GCN_unit(nn.Module):
         self.tcn1 = unit_tcn(out_channels, out_channels, stride=stride)
         self.relu = nn.ReLU()
         if not residual:
-            self.residual = lambda x: 0
+            self.residual = Zero()
 
         elif (in_channels == out_channels) and (stride == 1):
-            self.residual = lambda x: x
+            self.residual = nn.Identity()
 
         else:
             self.residual = unit_tcn(in_channels, out_channels, kernel_size=1, stride=stride)
@@ -7,11 +7,14 @@ In CVPR.
 """
 
 import math
+import re
+from typing import Optional
 
 import numpy as np
 import torch
 import torch.nn as nn
 
+from models.mmargcn.checkpoint import run_segments, split_segments
 from util.partition_strategy import GraphPartitionStrategy
 
 
@@ -34,6 +37,33 @@ def bn_init(bn, scale):
     nn.init.constant_(bn.bias, 0)
 
 
+def rename_legacy_layer_keys(state_dict: dict, prefix: str, legacy_name: str, first_index: int = 0):
+    """
+    Rename state dict keys of checkpoints in which each layer was a separate attribute (e.g. 'l0.' or 'gc1.')
+    to the keys of the layer list ('layers.0.').
+
+    :param state_dict: State dict (modified in place)
+    :param prefix: Prefix of the module
+    :param legacy_name: Attribute name of each layer without index
+    :param first_index: Index of the first layer in legacy attribute names
+    """
+    pattern = re.compile(re.escape(prefix + legacy_name) + r"(\d+)\.")
+    for key in list(state_dict.keys()):
+        match = pattern.match(key)
+        if match:
+            layer_idx = int(match.group(1)) - first_index
+            state_dict[f"{prefix}layers.{layer_idx}.{key[match.end():]}"] = state_dict.pop(key)
+
+
+class Zero(nn.Module):
+    """
+    Residual connection that is disabled (module instead of lambda so that models can be scripted and pickled).
+    """
+
+    def forward(self, x):
+        return torch.zeros((), dtype=x.dtype, device=x.device)
+
+
 class TemporalConv(nn.Module):
     def __init__(self, in_channels: int, out_channels: int, kernel_size: int = 9, stride: int = 1):
         super().__init__()
@@ -78,7 +108,7 @@ class SpatialGraphConv(nn.Module):
                 nn.BatchNorm2d(out_channels)
             )
         else:
-            self.down = lambda x: x
+            self.down = nn.Identity()
 
         self.bn = nn.BatchNorm2d(out_channels)
         self.soft = nn.Softmax(-2)
@@ -93,40 +123,163 @@ class SpatialGraphConv(nn.Module):
         for i in range(self.num_subsets):
             conv_branch_init(self.conv_d[i], self.num_subsets)
 
-    def forward(self, x):
+    def attention_scores(self, x):
+        """
+        :return: Unnormalized attention scores N S V V (summed over inter channels and frames)
+        """
+        N, C, T, V = x.size()
+        scores = []
+        for conv_a, conv_b in zip(self.conv_a, self.conv_b):
+            A1 = conv_a(x).permute(0, 3, 1, 2).contiguous().view(N, V, self.inter_channels * T)
+            A2 = conv_b(x).view(N, self.inter_channels * T, V)
+            scores.append(torch.matmul(A1, A2))  # N V V
+        return torch.stack(scores, 1)
+
+    def aggregate(self, x, attention):
+        """
+        :param x: Input N C T V
+        :param attention: Attention maps N S V V
+        """
         N, C, T, V = x.size()
         # adj = self.adj_a.cuda(x.get_device())
         # adj = adj + self.adj_b
         adj = self.adj_a + self.adj_b
 
-        y = None
-        for i in range(self.num_subsets):
-            A1 = self.conv_a[i](x).permute(0, 3, 1, 2).contiguous().view(N, V, self.inter_channels * T)
-            A2 = self.conv_b[i](x).view(N, self.inter_channels * T, V)
-            A1 = self.soft(torch.matmul(A1, A2) / A1.size(-1))  # N V V
-            self.adj_c[i] = A1
+        y: Optional[torch.Tensor] = None
+        for i, conv_d in enumerate(self.conv_d):
+            A1 = attention[:, i]
+            if not torch.jit.is_scripting():
+                # Attention maps for visualization (see metrics.DynamicAdjacency)
+                self.adj_c[i] = A1
             A1 = A1 + adj[i]
             A2 = x.view(N, C * T, V)
-            z = self.conv_d[i](torch.matmul(A2, A1).view(N, C, T, V))
-            y = z + y if y is not None else z
+            z = conv_d(torch.matmul(A2, A1).view(N, C, T, V))
+            y = z if y is None else z + y
+        assert y is not None
 
         y = self.bn(y)
         y += self.down(x)
         return self.relu(y)
 
+    def forward(self, x):
+        T = x.size(2)
+        attention = self.soft(self.attention_scores(x) / (self.inter_channels * T))
+        return self.aggregate(x, attention)
+
+
+class FusedSpatialGraphConv(nn.Module):
+    """
+    Same computation as SpatialGraphConv but for all subsets at once:
+    conv_a and conv_b are single convolutions with num_subsets * inter_channels outputs,
+    attention maps are computed by a single batched einsum and conv_d is applied once to the concatenation
+    of all aggregated subsets (which equals the sum of the per-subset convolutions).
+    Checkpoints of SpatialGraphConv can be loaded (weights are remapped).
+    """
+
+    def __init__(self, in_channels: int, out_channels: int, adj: np.ndarray, coff_embedding: int = 4,
+                 num_subsets: int = 3):
+        super().__init__()
+        inter_channels = out_channels // coff_embedding
+        self.inter_channels = inter_channels
+        self.num_subsets = num_subsets
+
+        self.adj_b = nn.Parameter(torch.from_numpy(adj.astype(np.float32)))
+        nn.init.constant_(self.adj_b, 1e-6)
+        self.register_buffer("adj_a", torch.from_numpy(adj.astype(np.float32)))
+        self.adj_c = [None] * self.num_subsets
+
+        self.conv_a = nn.Conv2d(in_channels, inter_channels * num_subsets, 1)
+        self.conv_b = nn.Conv2d(in_channels, inter_channels * num_subsets, 1)
+        self.conv_d = nn.Conv2d(in_channels * num_subsets, out_channels, 1)
+
+        if in_channels != out_channels:
+            self.down = nn.Sequential(
+                nn.Conv2d(in_channels, out_channels, 1),
+                nn.BatchNorm2d(out_channels)
+            )
+        else:
+            self.down = nn.Identity()
+
+        self.bn = nn.BatchNorm2d(out_channels)
+        self.relu = nn.ReLU()
+
+        for m in self.modules():
+            if isinstance(m, nn.Conv2d):
+                conv_init(m)
+            elif isinstance(m, nn.BatchNorm2d):
+                bn_init(m, 1)
+        bn_init(self.bn, 1e-6)
+
+        # Initialize each subset like the separate convolutions of SpatialGraphConv
+        for conv in (self.conv_a, self.conv_b):
+            for weight in conv.weight.data.chunk(num_subsets, 0):
+                nn.init.kaiming_normal_(weight, mode="fan_out")
+        nn.init.normal_(self.conv_d.weight, 0, math.sqrt(2. / (out_channels * in_channels * num_subsets)))
+
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        # Remap weights of SpatialGraphConv (one convolution per subset)
+        if f"{prefix}conv_a.0.weight" in state_dict:
+            for name, dim in (("conv_a", 0), ("conv_b", 0), ("conv_d", 1)):
+                weights = [state_dict.pop(f"{prefix}{name}.{i}.weight") for i in range(self.num_subsets)]
+                biases = [state_dict.pop(f"{prefix}{name}.{i}.bias") for i in range(self.num_subsets)]
+                state_dict[f"{prefix}{name}.weight"] = torch.cat(weights, dim)
+                if name == "conv_d":
+                    state_dict[f"{prefix}{name}.bias"] = torch.stack(biases).sum(0)
+                else:
+                    state_dict[f"{prefix}{name}.bias"] = torch.cat(biases)
+
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                                      error_msgs)
+
+    def attention_scores(self, x):
+        """
+        :return: Unnormalized attention scores N S V V (summed over inter channels and frames)
+        """
+        N, C, T, V = x.size()
+        S = self.num_subsets
+        A1 = self.conv_a(x).view(N, S, self.inter_channels * T, V)
+        A2 = self.conv_b(x).view(N, S, self.inter_channels * T, V)
+        return torch.einsum("nskv,nskw->nsvw", A1, A2)
+
+    def aggregate(self, x, attention):
+        """
+        :param x: Input N C T V
+        :param attention: Attention maps N S V V
+        """
+        N, C, T, V = x.size()
+        S = self.num_subsets
+        adj = self.adj_a + self.adj_b
+
+        if not torch.jit.is_scripting():
+            self.adj_c = list(attention.unbind(1))
+        A1 = attention + adj
+
+        # Aggregate all subsets: N S C T V -> N S*C T V
+        y = torch.einsum("nctv,nsvw->nsctw", x, A1).reshape(N, S * C, T, V)
+        y = self.bn(self.conv_d(y))
+        y += self.down(x)
+        return self.relu(y)
+
+    def forward(self, x):
+        T = x.size(2)
+        attention = torch.softmax(self.attention_scores(x) / (self.inter_channels * T), -2)
+        return self.aggregate(x, attention)
+
 
 class SpatialTemporalConv(nn.Module):
-    def __init__(self, in_channels, out_channels, adj, stride=1, residual=True):
+    def __init__(self, in_channels, out_channels, adj, stride=1, residual=True, fused_graph_conv: bool = False):
         super().__init__()
-        self.gcn1 = SpatialGraphConv(in_channels, out_channels, adj)
+        graph_conv = FusedSpatialGraphConv if fused_graph_conv else SpatialGraphConv
+        self.gcn1 = graph_conv(in_channels, out_channels, adj)
         self.tcn1 = TemporalConv(out_channels, out_channels, stride=stride)
         self.relu = nn.ReLU()
         self.out_channels = out_channels
         if not residual:
-            self.residual = lambda x: 0
+            self.residual = Zero()
 
         elif (in_channels == out_channels) and (stride == 1):
-            self.residual = lambda x: x
+            self.residual = nn.Identity()
 
         else:
             self.residual = TemporalConv(in_channels, out_channels, kernel_size=1, stride=stride)
@@ -138,7 +291,8 @@ class SpatialTemporalConv(nn.Module):
 
 class Model(nn.Module):
     def __init__(self, data_shape: tuple, num_classes: int, graph, num_layers: int = 10, start_feature_size: int = 64,
-                 without_fc=False, dropout: float = 0.):
+                 without_fc=False, dropout: float = 0., fused_graph_conv: bool = False,
+                 checkpoint_segments: int = 0):
         super().__init__()
 
         # data_shape = (num_persons, num_frames, num_joints, num_channels)
@@ -149,27 +303,33 @@ class Model(nn.Module):
 
         self.data_bn = nn.BatchNorm1d(num_persons * num_channels * num_joints)
 
-        self.layers = [
-            SpatialTemporalConv(num_channels, start_feature_size, adj, residual=False),
-            SpatialTemporalConv(start_feature_size, start_feature_size, adj),
-            SpatialTemporalConv(start_feature_size, start_feature_size, adj),
-            SpatialTemporalConv(start_feature_size, start_feature_size, adj),
-            SpatialTemporalConv(start_feature_size, start_feature_size * 2, adj, stride=2),
-            SpatialTemporalConv(start_feature_size * 2, start_feature_size * 2, adj),
-            SpatialTemporalConv(start_feature_size * 2, start_feature_size * 2, adj),
-            SpatialTemporalConv(start_feature_size * 2, start_feature_size * 4, adj, stride=2),
-            SpatialTemporalConv(start_feature_size * 4, start_feature_size * 4, adj),
-            SpatialTemporalConv(start_feature_size * 4, start_feature_size * 4, adj)
+        layer_kwargs = {"fused_graph_conv": fused_graph_conv}
+
+        layers = [
+            SpatialTemporalConv(num_channels, start_feature_size, adj, residual=False, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size, start_feature_size, adj, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size, start_feature_size, adj, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size, start_feature_size, adj, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size, start_feature_size * 2, adj, stride=2, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size * 2, start_feature_size * 2, adj, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size * 2, start_feature_size * 2, adj, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size * 2, start_feature_size * 4, adj, stride=2, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size * 4, start_feature_size * 4, adj, **layer_kwargs),
+            SpatialTemporalConv(start_feature_size * 4, start_feature_size * 4, adj, **layer_kwargs)
         ]
-        self.layers = self.layers[:min(len(self.layers), num_layers)]
+        layers = layers[:min(len(layers), num_layers)]
 
         # add dropout after each layer
         if dropout > 0:
-            for i in range(1, len(self.layers) * 2 - 1, 2):
-                self.layers.insert(i, nn.Dropout(dropout, inplace=True))
+            for i in range(1, len(layers) * 2 - 1, 2):
+                layers.insert(i, nn.Dropout(dropout, inplace=True))
+
+        # ModuleList (instead of attributes l0, l1, ...) so that the model can be scripted
+        self.layers = nn.ModuleList(layers)
 
-        for layer_idx, layer in enumerate(self.layers):
-            setattr(self, f"l{layer_idx}", layer)
+        # Activation checkpointing of groups of layers while training (0: disabled)
+        self.checkpoint_segments = checkpoint_segments
+        self.segments = split_segments(self.layers, checkpoint_segments)
 
         if without_fc:
             self.fc = None
@@ -180,6 +340,16 @@ class Model(nn.Module):
             self.out_channels = num_classes
         bn_init(self.data_bn, 1)
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        rename_legacy_layer_keys(state_dict, prefix, "l")
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                                      error_msgs)
+
+    @torch.jit.unused
+    def _forward_checkpointed(self, x):
+        return run_segments(self.segments, x)
+
     def forward(self, x):
         N, M, T, V, C = x.size()
 
@@ -187,14 +357,17 @@ class Model(nn.Module):
         x = self.data_bn(x)
         x = x.view(N, M, V, C, T).permute(0, 1, 3, 4, 2).contiguous().view(N * M, C, T, V)
 
-        for layer in self.layers:
-            x = layer(x)
+        if self.training and self.checkpoint_segments > 1:
+            x = self._forward_checkpointed(x)
+        else:
+            for layer in self.layers:
+                x = layer(x)
 
         # N*M,C,T,V
         num_channels_output = x.size(1)
         x = x.view(N, M, num_channels_output, -1)
         x = x.mean(3).mean(1)
 
-        if self.fc:
+        if self.fc is not None:
             x = self.fc(x)
         return x
@@ -0,0 +1,94 @@
+import contextlib
+import inspect
+from typing import List, Sequence
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.utils.checkpoint
+
+# PyTorch >= 1.11: Non-reentrant checkpointing also computes parameter gradients if no input requires gradients
+_supports_use_reentrant = "use_reentrant" in inspect.signature(torch.utils.checkpoint.checkpoint).parameters
+
+
+@contextlib.contextmanager
+def _frozen_batch_norm_statistics(layers: Sequence[nn.Module]):
+    """
+    Batch normalization layers don't update their running statistics within this context.
+    """
+    states = []
+    for layer in layers:
+        for m in layer.modules():
+            if isinstance(m, nn.modules.batchnorm._BatchNorm) and m.track_running_stats:
+                states.append((m, m.momentum, m.num_batches_tracked.clone()))
+                m.momentum = 0.
+    try:
+        yield
+    finally:
+        for m, momentum, num_batches_tracked in states:
+            m.momentum = momentum
+            m.num_batches_tracked.copy_(num_batches_tracked)
+
+
+def split_segments(layers: Sequence[nn.Module], num_segments: int) -> List[List[nn.Module]]:
+    """
+    Split a sequence of layers into (at most) the given number of segments of consecutive layers.
+    Dropout layers stay in the segment of the previous layer because in-place dropout must not modify
+    the input of a segment that is stored for recomputation.
+
+    :param layers: Layers
+    :param num_segments: Number of segments
+    :return: Layers of each segment
+    """
+    units = []
+    for layer in layers:
+        if isinstance(layer, nn.Dropout) and units:
+            units[-1].append(layer)
+        else:
+            units.append([layer])
+
+    num_segments = max(1, min(num_segments, len(units)))
+    segments = []
+    for unit_indices in np.array_split(np.arange(len(units)), num_segments):
+        segments.append([layer for i in unit_indices for layer in units[i]])
+    return segments
+
+
+def run_segments(segments: Sequence[Sequence[nn.Module]], x: torch.Tensor, enabled: bool = True) -> torch.Tensor:
+    """
+    Run layers of each segment sequentially. While training, only the input of each segment is kept in memory
+    and intermediate activations are recomputed during the backward pass (activation checkpointing).
+    The last segment is not checkpointed because its activations are needed first in the backward pass.
+    Batch normalization statistics are not updated again while recomputing.
+
+    :param segments: Layers of each segment (see split_segments)
+    :param x: Input of the first layer
+    :param enabled: Use checkpointing (e.g. only while training)
+    :return: Output of the last layer
+    """
+    enabled = enabled and torch.is_grad_enabled()
+    for segment_idx, segment in enumerate(segments):
+        # Reentrant checkpointing only computes gradients if the input requires gradients
+        if enabled and segment_idx < len(segments) - 1 and (_supports_use_reentrant or x.requires_grad):
+            x = _checkpoint_segment(segment, x)
+        else:
+            for layer in segment:
+                x = layer(x)
+    return x
+
+
+def _checkpoint_segment(segment: Sequence[nn.Module], x: torch.Tensor) -> torch.Tensor:
+    recompute = False
+
+    def run(y):
+        nonlocal recompute
+        context = _frozen_batch_norm_statistics(segment) if recompute else contextlib.nullcontext()
+        recompute = True
+        with context:
+            for layer in segment:
+                y = layer(y)
+        return y
+
+    if _supports_use_reentrant:
+        return torch.utils.checkpoint.checkpoint(run, x, use_reentrant=False)
+    return torch.utils.checkpoint.checkpoint(run, x)
@@ -1,3 +1,5 @@
+from typing import Dict
+
 import torch
 import torch.nn as nn
 
@@ -16,7 +18,9 @@ class SkeletonImuSpatialFusionModel(nn.Module):
         num_layers = kwargs.get("num_layers", 10)
         skeleton_imu_graph = get_skeleton_imu_fusion_graph(graph, **kwargs)
         self.agcn = agcn.Model(data_shape["skeleton"], num_classes, skeleton_imu_graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
     def forward(self, x):
         return self.agcn(x)
@@ -34,14 +38,16 @@ class SkeletonImuChannelFusionModel(nn.Module):
         shape[-1] += data_shape["inertial"][-1]  # add imu channels to shape
         self.fusion = get_fusion("concatenate", concatenate_dim=-1)
         self.agcn = agcn.Model(tuple(shape), num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         imu_data = x["inertial"]
         imu_data = imu_data.unsqueeze(1).unsqueeze(3)  # add dimension for num_bodies and num_nodes
         imu_data = imu_data.expand(-1, skeleton_data.shape[1], -1, skeleton_data.shape[3], -1)  # repeat values
-        x = self.fusion.combine(skeleton_data, imu_data)
+        x = self.fusion([skeleton_data, imu_data])
         return self.agcn(x)
 
 
@@ -59,7 +65,7 @@ class SkeletonRgbPatchFeaturesEarlyFusion(nn.Module):
         else:
             num_channels = data_shape["skeleton"][-1]
 
-        self.patch_feature_dim_reducer = lambda x: x
+        self.patch_feature_dim_reducer = nn.Identity()
         if patch_feature_input_dim != patch_feature_output_dim:
             self.patch_feature_dim_reducer = nn.Sequential(
                 nn.Linear(patch_feature_input_dim, patch_feature_hidden_dim),
@@ -69,10 +75,12 @@ class SkeletonRgbPatchFeaturesEarlyFusion(nn.Module):
         agcn_input_shape = (data_shape["skeleton"][0], data_shape["skeleton"][1], graph.num_vertices,
                             num_channels)
         self.agcn = agcn.Model(agcn_input_shape, num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
         self.fusion = get_fusion(fusion_type, concatenate_dim=-1)
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         rgb_data = x["rgb"]
 
@@ -80,10 +88,10 @@ class SkeletonRgbPatchFeaturesEarlyFusion(nn.Module):
         rgb_shape = rgb_data.shape[:-1]
         rgb_data_temp = rgb_data.view(-1, rgb_data.shape[-1])
         rgb_data = self.patch_feature_dim_reducer(rgb_data_temp)
-        rgb_data = rgb_data.view(*rgb_shape, -1)
+        rgb_data = rgb_data.view(list(rgb_shape) + [-1])
 
         # Early fusion of skeleton and rgb
-        fused_data = self.fusion.combine(skeleton_data, rgb_data)
+        fused_data = self.fusion([skeleton_data, rgb_data])
 
         # Run graph convolutional neural network
         y = self.agcn(fused_data)
@@ -96,7 +104,7 @@ class SkeletonRgbEarlyFusion(nn.Module):
         num_layers = kwargs.get("num_layers", 10)
         fusion_type = kwargs.get("fusion", "concatenate")
 
-        self.rgb_encoder = RgbCnnEncoder(rgb_num_vertices=graph.num_vertices, **kwargs)
+        self.rgb_encoder = RgbCnnEncoder(data_shape["rgb"], rgb_num_vertices=graph.num_vertices, **kwargs)
 
         if fusion_type == "concatenate":
             num_channels = data_shape["skeleton"][-1] + self.rgb_encoder.num_encoded_channels
@@ -106,10 +114,12 @@ class SkeletonRgbEarlyFusion(nn.Module):
         agcn_input_shape = (self.rgb_encoder.num_bodies, data_shape["rgb"][0], graph.num_vertices,
                             num_channels)
         self.agcn = agcn.Model(agcn_input_shape, num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
         self.fusion = get_fusion(fusion_type, concatenate_dim=-1)
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         rgb_data = x["rgb"]
 
@@ -117,7 +127,7 @@ class SkeletonRgbEarlyFusion(nn.Module):
         rgb_data = self.rgb_encoder(rgb_data)
 
         # Early fusion of skeleton and rgb
-        fused_data = self.fusion.combine(skeleton_data, rgb_data)
+        fused_data = self.fusion([skeleton_data, rgb_data])
 
         # Run graph convolutional neural network
         y = self.agcn(fused_data)
@@ -131,7 +141,7 @@ class SkeletonImuRgbCnnEncoderEarlyFusion(nn.Module):
         skeleton_imu_graph = get_skeleton_imu_fusion_graph(graph, **kwargs)
         fusion_type = kwargs.get("fusion", "concatenate")
 
-        self.rgb_encoder = RgbCnnEncoder(rgb_num_vertices=skeleton_imu_graph.num_vertices,
+        self.rgb_encoder = RgbCnnEncoder(data_shape["rgb"], rgb_num_vertices=skeleton_imu_graph.num_vertices,
                                          rgb_num_bodies=data_shape["skeleton"][0], **kwargs)
 
         if fusion_type == "concatenate":
@@ -142,10 +152,12 @@ class SkeletonImuRgbCnnEncoderEarlyFusion(nn.Module):
         agcn_input_shape = (self.rgb_encoder.num_bodies, data_shape["rgb"][0], skeleton_imu_graph.num_vertices,
                             num_channels)
         self.agcn = agcn.Model(agcn_input_shape, num_classes, skeleton_imu_graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
         self.fusion = get_fusion(fusion_type, concatenate_dim=-1)
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         rgb_data = x["rgb"]
 
@@ -153,7 +165,7 @@ class SkeletonImuRgbCnnEncoderEarlyFusion(nn.Module):
         rgb_data = self.rgb_encoder(rgb_data)
 
         # Early fusion of skeleton and rgb
-        fused_data = self.fusion.combine(skeleton_data, rgb_data)
+        fused_data = self.fusion([skeleton_data, rgb_data])
 
         # Run graph convolutional neural network
         y = self.agcn(fused_data)
@@ -175,7 +187,7 @@ class SkeletonImuRgbPatchFeaturesEarlyFusion(nn.Module):
         else:
             num_channels = data_shape["skeleton"][-1]
 
-        self.patch_feature_dim_reducer = lambda x: x
+        self.patch_feature_dim_reducer = nn.Identity()
         if patch_feature_input_dim != patch_feature_output_dim:
             self.patch_feature_dim_reducer = nn.Sequential(
                 nn.Linear(patch_feature_input_dim, patch_feature_hidden_dim),
@@ -185,10 +197,12 @@ class SkeletonImuRgbPatchFeaturesEarlyFusion(nn.Module):
         agcn_input_shape = (data_shape["skeleton"][0], data_shape["skeleton"][1], skeleton_imu_graph.num_vertices,
                             num_channels)
         self.agcn = agcn.Model(agcn_input_shape, num_classes, skeleton_imu_graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
         self.fusion = get_fusion(fusion_type, concatenate_dim=-1)
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         rgb_data = x["rgb"]
 
@@ -196,14 +210,14 @@ class SkeletonImuRgbPatchFeaturesEarlyFusion(nn.Module):
         rgb_shape = rgb_data.shape[:-1]
         rgb_data_temp = rgb_data.view(-1, rgb_data.shape[-1])
         rgb_data = self.patch_feature_dim_reducer(rgb_data_temp)
-        rgb_data = rgb_data.view(*rgb_shape, -1)
+        rgb_data = rgb_data.view(list(rgb_shape) + [-1])
         rgb_shape_pad = list(rgb_data.shape)
         rgb_shape_pad[-2] = skeleton_data.shape[-2]
-        rgb_data_pad = torch.zeros(*rgb_shape_pad, dtype=rgb_data.dtype, device=rgb_data.device)
+        rgb_data_pad = torch.zeros(rgb_shape_pad, dtype=rgb_data.dtype, device=rgb_data.device)
         rgb_data_pad[:, :, :, :rgb_data.shape[-2]] = rgb_data
 
         # Early fusion of skeleton and rgb
-        fused_data = self.fusion.combine(skeleton_data, rgb_data_pad)
+        fused_data = self.fusion([skeleton_data, rgb_data_pad])
 
         # Run graph convolutional neural network
         y = self.agcn(fused_data)
@@ -226,15 +240,17 @@ class SkeletonRgbR2P1DEarlyFusion(nn.Module):
         agcn_input_shape = list(data_shape["skeleton"])
         agcn_input_shape[2] = graph.num_vertices
         self.agcn = agcn.Model(tuple(agcn_input_shape), num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         rgb_data = x["rgb"]
 
         # Encode RGB images
         rgb_data = self.rgb_encoder(rgb_data)
-        rgb_data = rgb_data.view(*rgb_data.shape[:3], skeleton_data.shape[1], -1)
+        rgb_data = rgb_data.view(list(rgb_data.shape[:3]) + [skeleton_data.shape[1], -1])
         rgb_data = rgb_data.permute(0, 3, 2, 4, 1)
 
         # Append additional RGB nodes to graph
@@ -263,15 +279,17 @@ class SkeletonImuRgbR2P1DEarlyFusion(nn.Module):
         agcn_input_shape = list(data_shape["skeleton"])
         agcn_input_shape[2] = skeleton_imu_graph.num_vertices
         self.agcn = agcn.Model(tuple(agcn_input_shape), num_classes, skeleton_imu_graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
-    def forward(self, x):
+    def forward(self, x: Dict[str, torch.Tensor]):
         skeleton_data = x["skeleton"]
         rgb_data = x["rgb"]
 
         # Encode RGB images
         rgb_data = self.rgb_encoder(rgb_data)
-        rgb_data = rgb_data.view(*rgb_data.shape[:3], skeleton_data.shape[1], -1)
+        rgb_data = rgb_data.view(list(rgb_data.shape[:3]) + [skeleton_data.shape[1], -1])
         rgb_data = rgb_data.permute(0, 3, 2, 4, 1)
 
         # Append additional RGB nodes to graph
@@ -1,46 +1,59 @@
 import abc
-import functools
 import inspect
+from typing import List
 
 import torch
+import torch.nn as nn
 
 from util.graph import Graph
 
 
-class Fusion:
+class Fusion(nn.Module):
+    """
+    Combines tensors of multiple modalities (a module without parameters so that models can be scripted).
+    """
+
     @abc.abstractmethod
-    def combine(self, *tensors: torch.Tensor) -> torch.Tensor:
+    def forward(self, tensors: List[torch.Tensor]) -> torch.Tensor:
         pass
 
 
 class SumFusion(Fusion):
-    def combine(self, *tensors: torch.Tensor) -> torch.Tensor:
-        return functools.reduce(torch.add, tensors)
+    def forward(self, tensors: List[torch.Tensor]) -> torch.Tensor:
+        y = tensors[0]
+        for x in tensors[1:]:
+            y = y + x
+        return y
 
 
 class ProductFusion(Fusion):
-    def combine(self, *tensors: torch.Tensor) -> torch.Tensor:
-        return functools.reduce(torch.mul, tensors)
+    def forward(self, tensors: List[torch.Tensor]) -> torch.Tensor:
+        y = tensors[0]
+        for x in tensors[1:]:
+            y = y * x
+        return y
 
 
 class AverageFusion(Fusion):
-    def combine(self, *tensors: torch.Tensor) -> torch.Tensor:
+    def forward(self, tensors: List[torch.Tensor]) -> torch.Tensor:
         return torch.mean(torch.stack(tensors, dim=-1), dim=-1)
 
 
 class WeightedAverageFusion(Fusion):
     def __init__(self, weights: torch.Tensor):
+        super().__init__()
         self.weights = weights
 
-    def combine(self, *tensors: torch.Tensor) -> torch.Tensor:
+    def forward(self, tensors: List[torch.Tensor]) -> torch.Tensor:
         return torch.sum(torch.stack(tensors, dim=-1) * self.weights, dim=-1)
 
 
 class ConcatenateFusion(Fusion):
     def __init__(self, concatenate_dim: int):
+        super().__init__()
         self._dim = concatenate_dim
 
-    def combine(self, *tensors: torch.Tensor) -> torch.Tensor:
+    def forward(self, tensors: List[torch.Tensor]) -> torch.Tensor:
         return torch.cat(tensors, dim=self._dim)
 
 
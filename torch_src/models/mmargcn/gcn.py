@@ -12,6 +12,7 @@ from typing import Union
 import torch
 import torch.nn as nn
 
+from models.mmargcn.agcn import rename_legacy_layer_keys
 from models.mmargcn.graph_convolution import STGCNGraphConvolution, AGCNGraphConvolution
 
 
@@ -21,12 +22,14 @@ class GCN(nn.Module):
     ST-GCN expects input of shape: batch_size, num_channels, num_frames, num_graph_nodes.
     This module expects input of shape: batch_size, num_channels, num_graph_nodes.
     Therefore, most inner working modules are changed from 2D to 1D.
+    The adjacency matrix 'adj' is stored in 'adjacency_format' (dense, sparse or block_banded (ST-GCN only)).
+    AGCN with sparse adjacency restricts attention to vertices within 'attention_hops' edges.
     """
 
     def __init__(self, adj: Union[torch.Tensor, torch.sparse.Tensor], data_shape: tuple,
-                 num_classes: int, dropout: float = 0., sparse: bool = False, gc_model: str = "stgcn",
+                 num_classes: int, dropout: float = 0., adjacency_format: str = "dense", gc_model: str = "stgcn",
                  num_layers: int = 10, inner_feature_dim: int = 64, include_additional_top_layer: bool = False,
-                 without_fc: bool = False):
+                 without_fc: bool = False, attention_hops: int = 1):
         super().__init__()
 
         assert num_layers >= 2
@@ -39,36 +42,43 @@ class GCN(nn.Module):
             raise ValueError(f"Model {gc_model} not supported.")
 
         feature_dim, num_nodes = data_shape
+        gc_kwargs = {"adjacency_format": adjacency_format, "attention_hops": attention_hops}
 
-        self.layers = [
-            gc(feature_dim, inner_feature_dim, adj, sparse=sparse, residual=False)
+        layers = [
+            gc(feature_dim, inner_feature_dim, adj, residual=False, **gc_kwargs)
         ]
 
         if include_additional_top_layer:
-            self.layers.append(gc(inner_feature_dim, inner_feature_dim, adj, sparse=sparse, dropout=dropout))
+            layers.append(gc(inner_feature_dim, inner_feature_dim, adj, dropout=dropout, **gc_kwargs))
 
         k = 0
-        for i in range(len(self.layers), num_layers):
+        for i in range(len(layers), num_layers):
             k += 1
             in_feature_dim = inner_feature_dim
             if k == 3:
                 inner_feature_dim *= 2
                 k = 0
             out_feature_dim = inner_feature_dim
-            layer = gc(in_feature_dim, out_feature_dim, adj, sparse=sparse, dropout=dropout)
-            self.layers.append(layer)
+            layer = gc(in_feature_dim, out_feature_dim, adj, dropout=dropout, **gc_kwargs)
+            layers.append(layer)
 
         self.bn = nn.BatchNorm1d(feature_dim * num_nodes)
 
-        for layer_idx, layer in enumerate(self.layers):
-            setattr(self, f"gc{layer_idx + 1}", layer)
+        # ModuleList (instead of attributes gc1, gc2, ...) so that the model can be scripted
+        self.layers = nn.ModuleList(layers)
 
         if without_fc:
-            self.fc = lambda x: x
+            self.fc = nn.Identity()
         else:
             self.fc = nn.Linear(inner_feature_dim, num_classes)
             nn.init.normal_(self.fc.weight, 0, math.sqrt(2. / num_classes))
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        rename_legacy_layer_keys(state_dict, prefix, "gc", first_index=1)
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                                      error_msgs)
+
     def forward(self, x):
         batch_size, feature_dim, num_nodes = x.size()
         x = torch.flatten(x, start_dim=1)
@@ -1,12 +1,115 @@
+from typing import List, Optional, Sequence, Tuple
+
 import numpy as np
+import scipy.sparse as sp
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+
+from models.mmargcn.agcn import conv_init, conv_branch_init, bn_init, Zero
+
+
+def sparse_matmul(x: torch.Tensor, sparse_mat: torch.sparse.Tensor) -> torch.Tensor:
+    """
+    Aggregate the features of all vertices of a batch of graphs with a single sparse matrix multiplication.
+    Equals torch.matmul(x, sparse_mat.t()) with a dense matrix.
+
+    :param x: Features N C V
+    :param sparse_mat: Sparse adjacency matrix V V
+    :return: Aggregated features N C V
+    """
+    N, C, V = x.size()
+    # All columns of the batch are multiplied at once: V x (N * C)
+    y = torch.sparse.mm(sparse_mat, x.permute(2, 0, 1).reshape(V, N * C))
+    return y.view(V, N, C).permute(1, 2, 0)
+
+
+def block_banded_matmul(x: torch.Tensor, blocks: torch.Tensor) -> torch.Tensor:
+    """
+    Aggregate the features of all vertices of a batch of graphs with a block banded adjacency matrix
+    (see util.sparse.scipy_to_block_banded). Only the blocks of the band are stored and multiplied.
+    Equals torch.matmul(x, adj.t()) with the dense matrix.
+
+    :param x: Features N C V with V = T * S
+    :param blocks: Blocks of the adjacency matrix (2K + 1, T, S, S)
+    :return: Aggregated features N C V
+    """
+    N, C, V = x.size()
+    num_diagonals, T, S, _ = blocks.size()
+    bandwidth = num_diagonals // 2
+    x = F.pad(x.view(N, C, T, S), [0, 0, bandwidth, bandwidth])
+    y: Optional[torch.Tensor] = None
+    for d in range(num_diagonals):
+        # Block column t + d - K of each block row t
+        z = torch.einsum("ncts,tis->ncti", x[:, :, d:d + T], blocks[d])
+        y = z if y is None else z + y
+    assert y is not None
+    return y.reshape(N, C, V)
 
-from models.mmargcn.agcn import conv_init, conv_branch_init, bn_init
 
+def get_attention_edges(adj: Sequence[sp.spmatrix], num_hops: int = 1) \
+        -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Edges that data-dependent attention is restricted to: All vertex pairs within 'num_hops' edges of
+    any subset of the adjacency matrix.
 
-def sparse_matmul(sparse_mat: torch.sparse.Tensor, batched_mat: torch.Tensor) -> torch.Tensor:
-    return torch.stack([torch.sparse.mm(sparse_mat, mat) for mat in batched_mat])
+    :param adj: Adjacency matrix of each subset (V, V)
+    :param num_hops: Size of the neighborhood
+    :return: tuple (edge indices (2, E) as rows and columns, values of each subset at the edges (S, E),
+     incoming edges of each vertex (see get_segment_index))
+    """
+    num_vertices = adj[0].shape[0]
+    pattern = sp.eye(num_vertices, format="csr", dtype=np.float32)
+    for a in adj:
+        pattern = pattern + (sp.csr_matrix(a) != 0).astype(np.float32)
+    neighborhood = pattern
+    for _ in range(num_hops - 1):
+        neighborhood = ((neighborhood @ pattern) != 0).astype(np.float32)
+
+    neighborhood = neighborhood.tocoo()
+    rows, cols = neighborhood.row, neighborhood.col
+    values = np.stack([np.asarray(sp.csr_matrix(a)[rows, cols]).reshape(-1) for a in adj])
+    edge_index = torch.from_numpy(np.stack((rows, cols)).astype(np.int64))
+    return edge_index, torch.from_numpy(values.astype(np.float32)), get_segment_index(cols, num_vertices)
+
+
+def get_segment_index(segments: np.ndarray, num_segments: int) -> torch.Tensor:
+    """
+    Indices of the entries of each segment, padded with the index E (one past the last entry).
+
+    :param segments: Segment of each entry (E)
+    :param num_segments: Number of segments
+    :return: Indices (num_segments, maximum number of entries of a segment)
+    """
+    segments = np.asarray(segments, dtype=np.int64)
+    order = np.argsort(segments, kind="stable")
+    counts = np.bincount(segments, minlength=num_segments)
+    starts = np.cumsum(counts) - counts
+    # Position of each (sorted) entry within its segment
+    positions = np.arange(len(segments)) - starts[segments[order]]
+    index = np.full((num_segments, max(counts.max(initial=0), 1)), len(segments), dtype=np.int64)
+    index[segments[order], positions] = order
+    return torch.from_numpy(index)
+
+
+def segment_softmax(x: torch.Tensor, segments: torch.Tensor, segment_index: torch.Tensor) -> torch.Tensor:
+    """
+    Softmax over all entries of the last dimension that belong to the same segment.
+
+    :param x: Input (..., E)
+    :param segments: Segment of each entry (E)
+    :param segment_index: Entries of each segment (see get_segment_index)
+    :return: Output (..., E)
+    """
+    num_segments = segment_index.size(0)
+    shape: List[int] = list(x.shape[:-1])
+    with torch.no_grad():
+        # Maximum of each segment (padding entries are -inf)
+        x_pad = torch.cat((x, x.new_full(shape + [1], float("-inf"))), -1)
+        x_max = x_pad.index_select(-1, segment_index.view(-1)).view(shape + [num_segments, -1]).max(-1)[0]
+        x_max = x_max.index_select(-1, segments)
+    x = torch.exp(x - x_max)
+    return x / x.new_zeros(shape + [num_segments]).index_add_(x.dim() - 1, segments, x).index_select(-1, segments)
 
 
 class STGCNGraphConvolution(nn.Module):
@@ -14,33 +117,41 @@ class STGCNGraphConvolution(nn.Module):
                  residual: bool = True, **kwargs):
         super().__init__()
         dropout = kwargs.get("dropout", 0.)
-        self.sparse = kwargs.get("sparse", False)
+        # dense, sparse (torch.sparse adjacency) or block_banded (see util.sparse.scipy_to_block_banded)
+        self.adjacency_format = kwargs.get("adjacency_format", "sparse" if kwargs.get("sparse", False) else "dense")
         self.conv = nn.Conv1d(in_features, out_features, 1, bias=bias)
         self.register_buffer("adj", adj)
         self.relu = nn.ReLU()
         self.dropout = nn.Dropout(dropout) if dropout > 0 else None
 
         if not residual:
-            self.residual = lambda x: 0
+            self.residual = Zero()
         elif in_features == out_features:
-            self.residual = lambda x: x
+            self.residual = nn.Identity()
         else:
             self.residual = nn.Sequential(
                 nn.Conv1d(in_features, out_features, 1),
                 nn.BatchNorm1d(out_features),
             )
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        # The adjacency matrix is built from the model configuration: Checkpoints of the same model with a different
+        # adjacency format can be loaded
+        adj = state_dict.get(f"{prefix}adj", None)
+        if adj is not None and (adj.is_sparse != self.adj.is_sparse or adj.shape != self.adj.shape):
+            state_dict[f"{prefix}adj"] = self.adj
+
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                                      error_msgs)
+
     def forward(self, x):
         support = self.conv(x)
 
-        if self.sparse:
-            # very slow ...
-            support = support.permute(0, 2, 1).contiguous()
-            sp = []
-            for mat in support:
-                t = torch.sparse.mm(self.adj, mat)
-                sp.append(t)
-            output = torch.stack(sp).permute(0, 2, 1).contiguous()
+        if self.adjacency_format == "sparse":
+            output = sparse_matmul(support, self.adj)
+        elif self.adjacency_format == "block_banded":
+            output = block_banded_matmul(support, self.adj)
         else:
             output = torch.matmul(support, self.adj.t())
 
@@ -60,9 +171,19 @@ class AGCNGraphConvolution(nn.Module):
         num_subset = kwargs.get("num_subset", 3)
         inter_channels = out_features // coff_embedding
         self.inter_c = inter_channels
-        self.adj_b = nn.Parameter(torch.from_numpy(adj.astype(np.float32)))
+        # sparse: 'adj' is a list of sparse matrices, adjacency and attention are only computed for the edges of
+        # the graph (or the neighborhood within 'attention_hops' edges), so memory is linear in the number of edges
+        self.sparse = kwargs.get("adjacency_format", "dense") == "sparse"
+        if self.sparse:
+            edge_index, adj, segment_index = get_attention_edges(adj, kwargs.get("attention_hops", 1))
+            self.register_buffer("edge_index", edge_index)
+            # Derived from edge_index, not part of checkpoints
+            self.register_buffer("segment_index", segment_index, persistent=False)
+        else:
+            adj = torch.from_numpy(adj.astype(np.float32))
+        self.adj_b = nn.Parameter(adj.clone())
         nn.init.constant_(self.adj_b, 1e-6)
-        self.register_buffer("adj_a", torch.from_numpy(adj.astype(np.float32)))
+        self.register_buffer("adj_a", adj)
         self.num_subset = num_subset
 
         self.conv_a = nn.ModuleList()
@@ -79,7 +200,7 @@ class AGCNGraphConvolution(nn.Module):
                 nn.BatchNorm1d(out_features)
             )
         else:
-            self.down = lambda x: x
+            self.down = nn.Identity()
 
         self.bn = nn.BatchNorm1d(out_features)
         self.soft = nn.Softmax(-2)
@@ -94,19 +215,59 @@ class AGCNGraphConvolution(nn.Module):
         for i in range(self.num_subset):
             conv_branch_init(self.conv_d[i], self.num_subset)
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        # Load checkpoints of dense models into sparse models: Keep the values of the edges
+        adj_b = state_dict.get(f"{prefix}adj_b", None)
+        if self.sparse and adj_b is not None and adj_b.dim() == 3:
+            rows, cols = self.edge_index.to(adj_b.device)
+            state_dict[f"{prefix}adj_b"] = adj_b[:, rows, cols]
+            state_dict[f"{prefix}adj_a"] = self.adj_a
+            state_dict[f"{prefix}edge_index"] = self.edge_index
+
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                                      error_msgs)
+
+    def _forward_sparse(self, x):
+        batch_size, feature_dim, num_nodes = x.size()
+        rows, cols = self.edge_index[0], self.edge_index[1]
+        adj = self.adj_a + self.adj_b  # S E
+
+        y: Optional[torch.Tensor] = None
+        for i, (conv_a, conv_b, conv_d) in enumerate(zip(self.conv_a, self.conv_b, self.conv_d)):
+            # Attention scores and softmax only for the edges (softmax over incoming edges of each node)
+            adj_1 = conv_a(x)[:, :, rows]
+            adj_2 = conv_b(x)[:, :, cols]
+            adj_1 = segment_softmax((adj_1 * adj_2).sum(1) / self.inter_c, cols, self.segment_index)  # N E
+            adj_1 = adj_1 + adj[i]
+            # Scatter messages x[rows] * weight to cols
+            messages = x[:, :, rows] * adj_1.unsqueeze(1)
+            z = conv_d(x.new_zeros(x.size()).index_add_(2, cols, messages))
+            y = z if y is None else z + y
+        assert y is not None
+
+        y = self.bn(y)
+        y += self.down(x)
+        return self.relu(y)
+
     def forward(self, x):
+        # Same as self.sparse, but evaluated statically when scripted (edge_index only exists for sparse adjacency)
+        if hasattr(self, "edge_index"):
+            return self._forward_sparse(x)
+
         batch_size, feature_dim, num_nodes = x.size()
         adj = self.adj_a + self.adj_b
 
-        y = None
-        for i in range(self.num_subset):
-            adj_1 = self.conv_a[i](x)
+        y: Optional[torch.Tensor] = None
+        for i, (conv_a, conv_b, conv_d) in enumerate(zip(self.conv_a, self.conv_b, self.conv_d)):
+            adj_1 = conv_a(x)
             adj_1 = adj_1.permute(0, 2, 1).contiguous()
-            adj_2 = self.conv_b[i](x).view(batch_size, self.inter_c, num_nodes)
+            adj_2 = conv_b(x).view(batch_size, self.inter_c, num_nodes)
             adj_1 = self.soft(torch.matmul(adj_1, adj_2) / adj_1.size(-1))  # N V V
             adj_1 = adj_1 + adj[i]
-            z = self.conv_d[i](torch.matmul(x, adj_1).view(batch_size, feature_dim, num_nodes))
-            y = z + y if y is not None else z
+            z = conv_d(torch.matmul(x, adj_1).view(batch_size, feature_dim, num_nodes))
+            y = z if y is None else z + y
+        assert y is not None
 
         y = self.bn(y)
         y += self.down(x)
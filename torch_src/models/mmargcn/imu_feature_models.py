@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 import torch.nn as nn
 
@@ -17,31 +18,30 @@ def build_imu_graph(data_shape: tuple, num_signals: int = 0, temporal_back_conne
         num_signals = num_signals_0
 
     num_vertices = sequence_length * num_signals
-    graph_edges = []
-    for i in range(0, num_vertices, num_signals):
+    # IMU data is in form (sequence_length = [N + 1], num_signals = [M + 1]) with samples TnSm and 0<=n<=N; 0<=m<=M
+    # memory layout for vertices will therefore be: T0S0, T0S1, T0S2, ... T0SM, T1S0, T1S1, ... T1Sm, ..., TNSM
+    time_step_offsets = np.arange(sequence_length)[:, np.newaxis] * num_signals
 
-        # spatial connections (connections between all values at a single time step)
-        # IMU data is in form (sequence_length = [N + 1], num_signals = [M + 1]) with samples TnSm and 0<=n<=N; 0<=m<=M
-        # memory layout for vertices will therefore be: T0S0, T0S1, T0S2, ... T0SM, T1S0, T1S1, ... T1Sm, ..., TNSM
-        for j in range(num_signals):
-            for k in range(j + 1, num_signals):
-                graph_edges.append((i + j, i + k))
-                graph_edges.append((i + k, i + j))
+    # spatial connections (connections between all values at a single time step)
+    j, k = np.nonzero(~np.eye(num_signals, dtype=bool))
+    graph_edges = [np.stack((time_step_offsets + j, time_step_offsets + k), axis=-1).reshape(-1, 2)]
 
-        # temporal back connections
-        for j in range(min(i // num_signals, temporal_back_connections)):
-            for k in range(num_signals):
-                for m in range(num_signals):
-                    if k == m or inter_signal_back_connections:
-                        graph_edges.append((i - num_signals * (j + 1) + k, i + m))
+    # temporal back connections (from signal k at time step n - d to signal m at time step n)
+    if inter_signal_back_connections:
+        k, m = np.divmod(np.arange(num_signals * num_signals), num_signals)
+    else:
+        k = m = np.arange(num_signals)
+    for d in range(1, min(temporal_back_connections, sequence_length - 1) + 1):
+        offsets = time_step_offsets[d:]
+        graph_edges.append(np.stack((offsets - d * num_signals + k, offsets + m), axis=-1).reshape(-1, 2))
 
-    return Graph(graph_edges, num_vertices)
+    return Graph(np.concatenate(graph_edges), num_vertices)
 
 
 def build_imu_graph_adjacency(data_shape: tuple,
                               num_signals: int = 0,
                               gc_model: str = "stgcn",
-                              sparse=False,
+                              adjacency_format: str = "dense",
                               normalization="row",
                               temporal_back_connections: int = 1,
                               inter_signal_back_connections: bool = False,
@@ -50,11 +50,21 @@ def build_imu_graph_adjacency(data_shape: tuple,
 
     if gc_model == "agcn":
         strategy = GraphPartitionStrategy()
+        if adjacency_format == "sparse":
+            return strategy.get_sparse_adjacency_matrices(graph)
+        elif adjacency_format != "dense":
+            raise ValueError(f"Unsupported adjacency format for AGCN: {adjacency_format}")
         return strategy.get_adjacency_matrix_array(graph)
 
-    if sparse:
+    if adjacency_format == "sparse":
         adj = graph.get_normalized_sparse_adjacency_matrix(normalization, True)
-        return sparse_util.scipy_to_torch(adj)
+        return sparse_util.scipy_to_torch(adj).coalesce()
+    elif adjacency_format == "block_banded":
+        # Vertices of a time step form a block, edges only connect nearby time steps
+        adj = graph.get_normalized_sparse_adjacency_matrix(normalization, True)
+        return sparse_util.scipy_to_block_banded(adj, num_signals or data_shape[1])
+    elif adjacency_format != "dense":
+        raise ValueError(f"Unsupported adjacency format: {adjacency_format}")
 
     adj = graph.get_normalized_adjacency_matrix(normalization, True)
     return torch.from_numpy(adj).to(torch.float32)
@@ -65,7 +75,10 @@ class ImuGCN(nn.Module):
         super().__init__()
         data_shape = data_shape["inertial"]
         dropout = kwargs.get("dropout", 0.)
-        sparse = kwargs.get("sparse", False)
+        # dense, sparse or block_banded (ST-GCN only)
+        adjacency_format = kwargs.get("adjacency_format", "sparse" if kwargs.get("sparse", False) else "dense")
+        # AGCN with sparse adjacency: attention is computed for vertices within this number of edges
+        attention_hops = kwargs.get("attention_hops", 1)
         num_layers = kwargs.get("num_layers", 10)
         inner_feature_dim = kwargs.get("inner_feature_dim", 64)
         include_additional_top_layer = kwargs.get("include_additional_top_layer", False)
@@ -85,10 +98,11 @@ class ImuGCN(nn.Module):
             raise ValueError(f"Unknown graph_node_format {self.graph_node_format}")
 
         num_nodes = data_shape[0] * num_signals
-        adj = build_imu_graph_adjacency(data_shape, num_signals, gc_model, sparse, adjacency_normalization,
+        adj = build_imu_graph_adjacency(data_shape, num_signals, gc_model, adjacency_format, adjacency_normalization,
                                         num_temporal_back_connections, inter_signal_back_connections)
-        self.gcn = GCN(adj, (self.num_features, num_nodes), num_classes, dropout, sparse, gc_model, num_layers,
-                       inner_feature_dim, include_additional_top_layer, without_fc=kwargs.get("without_fc", False))
+        self.gcn = GCN(adj, (self.num_features, num_nodes), num_classes, dropout, adjacency_format, gc_model,
+                       num_layers, inner_feature_dim, include_additional_top_layer,
+                       without_fc=kwargs.get("without_fc", False), attention_hops=attention_hops)
 
     def forward(self, x):
         if self.graph_node_format == "node_per_value":
@@ -139,7 +153,7 @@ class ImuSignalImageModel(nn.Module):
             self.conv1 = nn.Conv2d(self.num_channels, 5, kernel_size=5)
             self.pool1 = nn.AvgPool2d(kernel_size=4, stride=4)
             self.conv2 = nn.Conv2d(5, 10, kernel_size=5)
-            self.pool2 = lambda x: x
+            self.pool2 = nn.Identity()
             self.fc1 = nn.Linear(760, 120)
             self.fc2 = nn.Linear(120, num_classes)
 
@@ -147,7 +161,7 @@ class ImuSignalImageModel(nn.Module):
             raise ValueError("Unsupported method of processing IMU signal images: " + variant)
 
         if kwargs.get("without_fc", False):
-            self.fc2 = lambda x: x
+            self.fc2 = nn.Identity()
 
     def forward(self, x):
         if self.num_channels == 1 and len(x.shape) == 3:
@@ -1,3 +1,5 @@
+from typing import Dict
+
 import torch
 import torch.nn as nn
 
@@ -6,6 +8,7 @@ import models.mmargcn.imu_feature_models as imu_models
 import models.mmargcn.rgb_feature_models as rgb_models
 import models.mmargcn.early_fusion_models as early_fusion_models
 from models.mmargcn.fusion import get_fusion, get_skeleton_imu_fusion_graph
+from models.mmargcn.parallel import BranchExecutor
 
 
 class SkeletonRgbR2P1D(nn.Module):
@@ -17,7 +20,8 @@ class SkeletonRgbR2P1D(nn.Module):
         self.r2p1d = rgb_models.RgbR2p1DModel(data_shape["rgb"], num_classes, graph, without_fc=True, model_depth=18,
                                               **kwargs)
         self.agcn = agcn.Model(data_shape["skeleton"], num_classes, graph, num_layers=num_layers, without_fc=True,
-                               dropout=dropout)
+                               dropout=dropout, fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
         self.fusion = get_fusion(fusion_type, concatenate_dim=-1)
         self.fc1 = nn.Linear(self.r2p1d.r2p1d.out_dim, self.agcn.out_channels)
 
@@ -27,16 +31,19 @@ class SkeletonRgbR2P1D(nn.Module):
             out_dim = self.agcn.out_channels
 
         self.fc2 = nn.Linear(out_dim, num_classes)
+        self.branches = BranchExecutor(("skeleton", "rgb"), parallel=kwargs.get("parallel_branches", False))
 
-    def forward(self, x):
-        skeleton_data = x["skeleton"]
-        rgb_data = x["rgb"]
+    def _rgb_branch(self, x):
+        return self.fc1(self.r2p1d(x))
 
-        skeleton_data = self.agcn(skeleton_data)
-        rgb_data = self.r2p1d(rgb_data)
-        rgb_data = self.fc1(rgb_data)
+    def forward(self, x: Dict[str, torch.Tensor]):
+        if torch.jit.is_scripting():
+            # Branches always run sequentially in TorchScript
+            skeleton_data, rgb_data = self.agcn(x["skeleton"]), self._rgb_branch(x["rgb"])
+        else:
+            skeleton_data, rgb_data = self.branches((self.agcn, x["skeleton"]), (self._rgb_branch, x["rgb"]))
 
-        fused_data = self.fusion.combine(skeleton_data, rgb_data)
+        fused_data = self.fusion([skeleton_data, rgb_data])
 
         y = self.fc2(fused_data)
         return y
@@ -53,7 +60,8 @@ class SkeletonImuGCN(nn.Module):
         self.imu_gcn = imu_models.ImuGCN(data_shape, num_classes, inter_signal_back_connections=True,
                                          include_additional_top_layer=True, without_fc=True, **kwargs)
         self.agcn = agcn.Model(data_shape["skeleton"], num_classes, graph, num_layers=num_layers, without_fc=True,
-                               dropout=dropout)
+                               dropout=dropout, fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
         self.fusion = get_fusion(fusion_type, concatenate_dim=-1)
 
         if fusion_type == "concatenate":
@@ -62,15 +70,17 @@ class SkeletonImuGCN(nn.Module):
             out_dim = self.agcn.out_channels
 
         self.fc = nn.Linear(out_dim, num_classes)
+        self.branches = BranchExecutor(("skeleton", "inertial"), parallel=kwargs.get("parallel_branches", False))
 
-    def forward(self, x):
-        skeleton_data = x["skeleton"]
-        inertial_data = x["inertial"]
-
-        skeleton_data = self.agcn(skeleton_data)
-        inertial_data = self.imu_gcn(inertial_data)
+    def forward(self, x: Dict[str, torch.Tensor]):
+        if torch.jit.is_scripting():
+            # Branches always run sequentially in TorchScript
+            skeleton_data, inertial_data = self.agcn(x["skeleton"]), self.imu_gcn(x["inertial"])
+        else:
+            skeleton_data, inertial_data = self.branches((self.agcn, x["skeleton"]),
+                                                         (self.imu_gcn, x["inertial"]))
 
-        fused_data = self.fusion.combine(skeleton_data, inertial_data)
+        fused_data = self.fusion([skeleton_data, inertial_data])
         y = self.fc(fused_data)
         return y
 
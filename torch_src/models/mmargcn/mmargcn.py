@@ -53,5 +53,10 @@ class Model(nn.Module):
 
         self._model = modes[mode](data_shape, num_classes, graph=graph, **kwargs)
 
+    def __prepare_scriptable__(self):
+        # Called by torch.jit.script: Script the model of the mode directly because
+        # the input type (tensor or dictionary of tensors) depends on the mode
+        return self._model
+
     def forward(self, x):
         return self._model(x)
@@ -0,0 +1,150 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+
+def _get_cpu_autocast_dtype() -> Optional[torch.dtype]:
+    """
+    Return the data type of CPU autocast if it is enabled in the current thread, otherwise None.
+    """
+    try:
+        if torch.is_autocast_enabled("cpu"):
+            return torch.get_autocast_dtype("cpu")
+    except (TypeError, AttributeError):
+        # PyTorch < 2.4
+        if hasattr(torch, "is_autocast_cpu_enabled") and torch.is_autocast_cpu_enabled():
+            return torch.get_autocast_cpu_dtype()
+    return None
+
+
+class BranchExecutor:
+    """
+    Runs independent branches of a model (e.g. the backbone of each modality in late fusion models)
+    either sequentially or concurrently so that the slowest branch, not the sum of all branches, bounds the step time.\n
+    CUDA: Each branch is launched on its own stream.\n
+    CPU: Branches run on a thread pool (inter-op parallelism, pytorch operations release the GIL).
+    torch.jit.fork is not used because it runs synchronously if the model is not scripted.
+    """
+
+    def __init__(self, names: Sequence[str], parallel: bool = False):
+        """
+        :param names: Name of each branch
+        :param parallel: Run branches concurrently
+        """
+        self.names = tuple(names)
+        self.parallel = parallel
+        self.record_timings = False
+        self._pending_timings = []
+        self._timings = {name: [] for name in self.names}
+        self._streams = {}
+        self._executor = None
+
+    def __getstate__(self):
+        # Streams and threads can't be copied
+        state = self.__dict__.copy()
+        state["_streams"] = {}
+        state["_executor"] = None
+        state["_pending_timings"] = []
+        return state
+
+    def __call__(self, *branches: Tuple[Callable, Any]) -> List[Any]:
+        """
+        Run all branches.
+
+        :param branches: Tuple (function, input) for each branch
+        :return: Output of each branch
+        """
+        assert len(branches) == len(self.names), f"Expected {len(self.names)} branches"
+        inputs = [x for _, x in branches]
+        device = inputs[0].device if torch.is_tensor(inputs[0]) else torch.device("cpu")
+
+        if not self.parallel or len(branches) == 1:
+            return [self._run_timed(name, fn, x, device) for name, (fn, x) in zip(self.names, branches)]
+        if device.type == "cuda":
+            return self._run_streams(branches, device)
+        return self._run_threads(branches, device)
+
+    def _run_timed(self, name: str, fn: Callable, x, device: torch.device):
+        if not self.record_timings:
+            return fn(x)
+
+        if device.type == "cuda":
+            start, end = torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)
+            start.record()
+            y = fn(x)
+            end.record()
+            self._pending_timings.append((name, start, end))
+        else:
+            start = time.perf_counter()
+            y = fn(x)
+            self._timings[name].append((time.perf_counter() - start) * 1000)
+        return y
+
+    def _run_streams(self, branches: Sequence[Tuple[Callable, Any]], device: torch.device) -> List[Any]:
+        current_stream = torch.cuda.current_stream(device)
+        outputs = []
+        for name, (fn, x) in zip(self.names, branches):
+            if name not in self._streams:
+                self._streams[name] = torch.cuda.Stream(device)
+            stream = self._streams[name]
+            # Inputs are produced on the current stream
+            stream.wait_stream(current_stream)
+            with torch.cuda.stream(stream):
+                outputs.append(self._run_timed(name, fn, x, device))
+
+        for name, y in zip(self.names, outputs):
+            current_stream.wait_stream(self._streams[name])
+            # Memory allocated on a branch stream must not be reused before the current stream is done with it
+            if torch.is_tensor(y):
+                y.record_stream(current_stream)
+        return outputs
+
+    def _run_threads(self, branches: Sequence[Tuple[Callable, Any]], device: torch.device) -> List[Any]:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(len(branches))
+
+        # Gradient and autocast mode are thread local
+        grad_enabled = torch.is_grad_enabled()
+        autocast_dtype = _get_cpu_autocast_dtype()
+
+        def _run(name: str, fn: Callable, x):
+            with torch.set_grad_enabled(grad_enabled):
+                if autocast_dtype is not None:
+                    with torch.autocast("cpu", dtype=autocast_dtype):
+                        return self._run_timed(name, fn, x, device)
+                return self._run_timed(name, fn, x, device)
+
+        futures = [self._executor.submit(_run, name, fn, x) for name, (fn, x) in zip(self.names, branches)]
+        return [f.result() for f in futures]
+
+    def get_timings(self) -> Dict[str, List[float]]:
+        """
+        Return the recorded latency (in milliseconds) of each branch call since the last call to reset_timings.
+        """
+        if self._pending_timings:
+            torch.cuda.synchronize()
+            for name, start, end in self._pending_timings:
+                self._timings[name].append(start.elapsed_time(end))
+            self._pending_timings = []
+        return self._timings
+
+    def reset_timings(self):
+        self._pending_timings = []
+        self._timings = {name: [] for name in self.names}
+
+
+def find_branch_executors(model: torch.nn.Module) -> Dict[str, BranchExecutor]:
+    """
+    Find all branch executors of a model.
+
+    :param model: model
+    :return: Dictionary of module name and branch executor
+    """
+    executors = {}
+    for module_name, module in model.named_modules():
+        for attr_name, value in vars(module).items():
+            if isinstance(value, BranchExecutor):
+                executors[f"{module_name}.{attr_name}" if module_name else attr_name] = value
+    return executors
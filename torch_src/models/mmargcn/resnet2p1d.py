@@ -10,6 +10,8 @@ from functools import partial
 import torch
 import torch.nn as nn
 
+from models.mmargcn.checkpoint import run_segments, split_segments
+
 
 def get_inplanes():
     return [64, 128, 256, 512]
@@ -155,7 +157,8 @@ class ResNet(nn.Module):
                  widen_factor=1.0,
                  n_classes=700,
                  temporal_stride=None,
-                 no_avg=False):
+                 no_avg=False,
+                 checkpoint_segments=0):
         super().__init__()
 
         block_inplanes = [int(x * widen_factor) for x in block_inplanes]
@@ -205,6 +208,15 @@ class ResNet(nn.Module):
                                        stride=2,
                                        temporal_stride=temporal_stride)
 
+        # Activation checkpointing of the stem and groups of residual blocks while training (0: disabled)
+        # Modules in lists are not registered again, so the state dict is unchanged
+        stem = [self.conv1_s, self.bn1_s, self.relu, self.conv1_t, self.bn1_t, self.relu]
+        if not self.no_max_pool:
+            stem.append(self.maxpool)
+        self.checkpoint_segments = checkpoint_segments
+        self.segments = split_segments([nn.Sequential(*stem), *self.layer1, *self.layer2, *self.layer3, *self.layer4],
+                                       checkpoint_segments)
+
         if not no_avg:
             self.avgpool = nn.AdaptiveAvgPool3d((1, 1, 1))
         self.out_dim = block_inplanes[3] * block.expansion
@@ -223,9 +235,7 @@ class ResNet(nn.Module):
     def _downsample_basic_block(x, planes, stride):
         out = torch.nn.functional.avg_pool3d(x, kernel_size=1, stride=stride)
         zero_pads = torch.zeros(out.size(0), planes - out.size(1), out.size(2),
-                                out.size(3), out.size(4))
-        if isinstance(out.data, torch.FloatTensor):
-            zero_pads = zero_pads.cuda()
+                                out.size(3), out.size(4), dtype=out.dtype, device=out.device)
 
         out = torch.cat([out.data, zero_pads], dim=1)
 
@@ -254,21 +264,27 @@ class ResNet(nn.Module):
 
         return nn.Sequential(*layers)
 
-    def forward(self, x):
-        x = self.conv1_s(x)
-        x = self.bn1_s(x)
-        x = self.relu(x)
-        x = self.conv1_t(x)
-        x = self.bn1_t(x)
-        x = self.relu(x)
+    @torch.jit.unused
+    def _forward_checkpointed(self, x):
+        return run_segments(self.segments, x)
 
-        if not self.no_max_pool:
-            x = self.maxpool(x)
-
-        x = self.layer1(x)
-        x = self.layer2(x)
-        x = self.layer3(x)
-        x = self.layer4(x)
+    def forward(self, x):
+        if self.training and self.checkpoint_segments > 1:
+            x = self._forward_checkpointed(x)
+        else:
+            x = self.conv1_s(x)
+            x = self.bn1_s(x)
+            x = self.relu(x)
+            x = self.conv1_t(x)
+            x = self.bn1_t(x)
+            x = self.relu(x)
+            if not self.no_max_pool:
+                x = self.maxpool(x)
+
+            x = self.layer1(x)
+            x = self.layer2(x)
+            x = self.layer3(x)
+            x = self.layer4(x)
 
         if hasattr(self, "avgpool"):
             x = self.avgpool(x)
@@ -298,7 +314,7 @@ def generate_model(model_depth, **kwargs) -> ResNet:
         raise ValueError(f"Unsupported depth: {model_depth}")
 
     if pretrained_weights_path is not None:
-        state_dict = torch.load(pretrained_weights_path)["state_dict"]
+        state_dict = torch.load(pretrained_weights_path, map_location="cpu")["state_dict"]
         model.load_state_dict(state_dict)
 
     model.fc = None
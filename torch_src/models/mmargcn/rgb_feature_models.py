@@ -1,4 +1,5 @@
 import os
+from typing import List, Optional
 
 import torch
 import torch.nn as nn
@@ -8,6 +9,37 @@ import models.mmargcn.agcn as agcn
 import models.mmargcn.resnet2p1d as r2p1d
 from util.graph import Graph
 
+# Permutation of RGB input (N + layout of RGBVideoProcessor) to R(2+1)D input (N, C, T, H, W)
+r2p1d_input_permutations = {
+    "tchw": (0, 2, 1, 3, 4),
+    "cthw": (0, 1, 2, 3, 4),
+    "thwc": (0, 4, 1, 2, 3)
+}
+
+
+def get_r2p1d_memory_format(channels_last: bool) -> torch.memory_format:
+    if not channels_last:
+        return torch.contiguous_format
+    if not hasattr(torch, "channels_last_3d"):
+        raise ValueError("Channels last memory format for 3D convolutions requires PyTorch 1.7 or newer")
+    return torch.channels_last_3d
+
+
+def to_r2p1d_input(x: torch.Tensor, permutation: List[int], channels_last: bool) -> torch.Tensor:
+    """
+    Bring RGB input to the shape (N, C, T, H, W) in the memory format of the R(2+1)D network.
+    No copy is made if input layout and memory format match ('cthw' and contiguous or 'thwc' and channels last).
+
+    :param x: RGB input
+    :param permutation: Permutation of the input layout (see r2p1d_input_permutations)
+    :param channels_last: Channels last memory format (otherwise contiguous)
+    :return: R(2+1)D input
+    """
+    x = x.permute(permutation)
+    if channels_last:
+        return x.contiguous(memory_format=torch.channels_last_3d)
+    return x.contiguous()
+
 
 class RgbPatchFeaturesModel(nn.Module):
     """
@@ -20,7 +52,9 @@ class RgbPatchFeaturesModel(nn.Module):
         super().__init__()
         num_layers = kwargs.get("num_layers", 10)
         self.agcn = agcn.Model(data_shape["rgb"], num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
     def forward(self, x):
         return self.agcn(x)
@@ -41,35 +75,68 @@ class RgbPatchGroupsFeaturesModel(nn.Module):
         graph = Graph(edges)
 
         self.agcn = agcn.Model(data_shape["rgb"], num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
     def forward(self, x):
         return self.agcn(x)
 
 
 class RgbCnnEncoder(nn.Module):
-    def __init__(self, **kwargs):
+    """
+    Encode each RGB frame with a pretrained ResNet18 and map the output to the encoded graph nodes.
+    With 'rgb_frozen_backbone' the ResNet18 is not trained (and stays in evaluation mode).
+    If the input shape is (num_frames, feature_size), the input already contains the ResNet18 output of each frame
+    (see CnnFeatureCacheDatasetLoader) and only 'cnn_fc' is applied.
+    """
+
+    def __init__(self, input_shape: Optional[tuple] = None, **kwargs):
         super().__init__()
         self.num_bodies = kwargs.get("rgb_num_bodies", 1)
         self.num_vertices = kwargs.get("rgb_num_vertices", 20)
         self.num_encoded_channels = kwargs.get("rgb_node_encoding_feature_dim", 3)
+        self.frozen_backbone = kwargs.get("rgb_frozen_backbone", False)
+        rgb_node_encoding_feature_dim = self.num_bodies * self.num_vertices * self.num_encoded_channels
 
-        torch_hub = os.path.abspath(kwargs.get("torch_hub", "../torchhome/hub"))
-        torch.hub.set_dir(torch_hub)
-        cnn = models.resnet18(pretrained=True)
-        fc_input_size = 512
+        if input_shape is not None and len(input_shape) == 2:
+            # Precomputed features
+            self.cnn = None
+            fc_input_size = input_shape[-1]
+        else:
+            torch_hub = os.path.abspath(kwargs.get("torch_hub", "../torchhome/hub"))
+            torch.hub.set_dir(torch_hub)
+            cnn = models.resnet18(pretrained=True)
+            fc_input_size = 512
+
+            layers_without_fc = list(cnn.children())[:-1]
+            self.cnn = torch.nn.Sequential(*layers_without_fc)
+            if self.frozen_backbone:
+                self.cnn.requires_grad_(False)
+                self.cnn.eval()
 
-        layers_without_fc = list(cnn.children())[:-1]
-        rgb_node_encoding_feature_dim = self.num_bodies * self.num_vertices * self.num_encoded_channels
-        self.cnn = torch.nn.Sequential(*layers_without_fc)
         self.cnn_fc = torch.nn.Linear(fc_input_size, rgb_node_encoding_feature_dim)
 
+    def train(self, mode: bool = True):
+        super().train(mode)
+        if self.frozen_backbone and self.cnn is not None:
+            self.cnn.eval()
+        return self
+
     def forward(self, x):
-        n, num_frames, num_channels, h, w = x.size()
-        x = x.view(n * num_frames, num_channels, h, w)
+        n, num_frames = x.shape[:2]
+
+        if self.cnn is None:
+            y = x.reshape(n * num_frames, -1)
+        else:
+            x = x.flatten(0, 1)
+            if self.frozen_backbone:
+                with torch.no_grad():
+                    y = self.cnn(x)
+            else:
+                y = self.cnn(x)
+            y = torch.flatten(y, start_dim=1)
 
-        y = self.cnn(x)
-        y = torch.squeeze(y)
         y = self.cnn_fc(y)
         y = y.view(n, num_frames, self.num_bodies, self.num_vertices, self.num_encoded_channels)
         y = y.permute(0, 2, 1, 3, 4).contiguous()
@@ -82,12 +149,14 @@ class RgbCnnEncoderModel(nn.Module):
         super().__init__()
         num_layers = kwargs.get("num_layers", 10)
 
-        self.rgb_encoder = RgbCnnEncoder(rgb_num_vertices=graph.num_vertices, **kwargs)
+        self.rgb_encoder = RgbCnnEncoder(data_shape["rgb"], rgb_num_vertices=graph.num_vertices, **kwargs)
 
         agcn_input_shape = (self.rgb_encoder.num_bodies, data_shape["rgb"][0], self.rgb_encoder.num_vertices,
                             self.rgb_encoder.num_encoded_channels)
         self.agcn = agcn.Model(agcn_input_shape, num_classes, graph, num_layers=num_layers,
-                               without_fc=kwargs.get("without_fc", False))
+                               without_fc=kwargs.get("without_fc", False),
+                               fused_graph_conv=kwargs.get("fused_graph_conv", False),
+                               checkpoint_segments=kwargs.get("checkpoint_segments", 0))
 
     def forward(self, x):
         x = self.rgb_encoder(x)
@@ -101,14 +170,24 @@ class RgbR2p1DModel(nn.Module):
         super().__init__()
         model_depth = kwargs.get("model_depth", 18)
         pretrained_weights_path = kwargs.get("pretrained_weights_path", None)
-        self.r2p1d = r2p1d.generate_model(model_depth, pretrained_weights_path=pretrained_weights_path)
+        # Layout of RGB input (see RGBVideoProcessor) and memory format of 3D convolutions
+        self.input_layout = kwargs.get("rgb_input_layout", "tchw")
+        self.channels_last = kwargs.get("rgb_channels_last", False)
+        memory_format = get_r2p1d_memory_format(self.channels_last)
+        if self.input_layout not in r2p1d_input_permutations:
+            raise ValueError(f"Unsupported RGB input layout: {self.input_layout}")
+        self.input_permutation = list(r2p1d_input_permutations[self.input_layout])
+
+        self.r2p1d = r2p1d.generate_model(model_depth, pretrained_weights_path=pretrained_weights_path,
+                                          checkpoint_segments=kwargs.get("checkpoint_segments", 0))
+        self.r2p1d.to(memory_format=memory_format)
         if kwargs.get("without_fc", False):
-            self.fc = lambda x: x
+            self.fc = nn.Identity()
         else:
             self.fc = nn.Linear(self.r2p1d.out_dim, num_classes)
 
     def forward(self, x):
-        x = x.permute(0, 2, 1, 3, 4).contiguous()
+        x = to_r2p1d_input(x, self.input_permutation, self.channels_last)
         x = self.r2p1d(x)
         x = self.fc(x)
         return x
@@ -120,14 +199,23 @@ class RgbR2P1DEncoder(nn.Module):
         self.num_encoded_channels = kwargs.get("rgb_node_encoding_feature_dim", 3)
         self.num_additional_nodes = kwargs.get("num_additional_nodes", 3)
         model_depth = kwargs.get("model_depth", 10)
-        self.r2p1d = r2p1d.generate_model(model_depth, temporal_stride=1, no_avg=True)
+        self.input_layout = kwargs.get("rgb_input_layout", "tchw")
+        self.channels_last = kwargs.get("rgb_channels_last", False)
+        memory_format = get_r2p1d_memory_format(self.channels_last)
+        if self.input_layout not in r2p1d_input_permutations:
+            raise ValueError(f"Unsupported RGB input layout: {self.input_layout}")
+        self.input_permutation = list(r2p1d_input_permutations[self.input_layout])
+
+        self.r2p1d = r2p1d.generate_model(model_depth, temporal_stride=1, no_avg=True,
+                                          checkpoint_segments=kwargs.get("checkpoint_segments", 0))
+        self.r2p1d.to(memory_format=memory_format)
         self.cnn = nn.Conv2d(self.r2p1d.out_dim, self.num_encoded_channels, kernel_size=(5, 1), padding=(2, 0))
-        self.avgpool = nn.AdaptiveAvgPool2d((None, self.num_additional_nodes))
 
     def forward(self, x):
-        x = x.permute(0, 2, 1, 3, 4).contiguous()
+        x = to_r2p1d_input(x, self.input_permutation, self.channels_last)
         x = self.r2p1d(x)
         x = torch.flatten(x, start_dim=3)
         x = self.cnn(x)
-        x = self.avgpool(x)
+        # Pool to num_additional_nodes along the last dimension (AdaptiveAvgPool2d((None, n)) can't be scripted)
+        x = nn.functional.adaptive_avg_pool2d(x, [x.shape[2], self.num_additional_nodes])
         return x
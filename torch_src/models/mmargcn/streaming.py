@@ -0,0 +1,208 @@
+import collections
+import math
+from typing import List, Optional
+
+import torch
+import torch.nn.functional as F
+
+from models.mmargcn.agcn import Model, SpatialTemporalConv, TemporalConv, Zero
+
+
+class _WindowedSum:
+    """
+    Sum of the most recent values (all values if window_size is None).
+    """
+
+    def __init__(self, window_size: Optional[int] = None):
+        self.window_size = window_size
+        self._values = collections.deque()
+        self.sum = None
+        self.count = 0
+
+    def add(self, value: torch.Tensor):
+        self.sum = value.clone() if self.sum is None else self.sum + value
+        self.count += 1
+        if self.window_size is not None:
+            self._values.append(value)
+            if len(self._values) > self.window_size:
+                self.sum -= self._values.popleft()
+                self.count -= 1
+
+    def mean(self) -> Optional[torch.Tensor]:
+        return None if self.sum is None else self.sum / self.count
+
+
+class _StreamingLayer:
+    """
+    Evaluates a SpatialTemporalConv frame by frame.\n
+    Spatial graph convolution: Attention maps are computed from all frames the layer has received so far
+    (or the most recent frames if a window is given) instead of the whole sequence.\n
+    Temporal convolution: The outputs of the graph convolution are kept in a ring buffer sized to the
+    receptive field of the convolution. Like the zero padding of the offline model, the buffer starts with
+    zero frames, so an output frame is produced 'padding' frames after the input frame at its center.
+    """
+
+    def __init__(self, layer: SpatialTemporalConv, window_size: Optional[int] = None):
+        self.layer = layer
+        conv = layer.tcn1.conv
+        self.kernel_size = conv.kernel_size[0]
+        self.stride = conv.stride[0]
+        self.padding = conv.padding[0]
+        self._scores = _WindowedSum(window_size)
+        # Ring buffer of graph convolution outputs
+        self._tcn_buffer = collections.deque(maxlen=self.kernel_size)
+        # Inputs are delayed until the output frame they are added to (residual connection) is computed
+        self._residual_buffer = collections.deque(maxlen=self.padding + 1)
+        self._num_frames = 0
+
+    def _apply_temporal_conv(self, tcn: TemporalConv, x: torch.Tensor) -> torch.Tensor:
+        # Padding is replaced by the ring buffer
+        return tcn.bn(F.conv2d(x, tcn.conv.weight, tcn.conv.bias))
+
+    def _emit(self) -> List[torch.Tensor]:
+        self._num_frames += 1
+        center = self._num_frames - self.padding - 1
+        if center < 0 or center % self.stride != 0:
+            return []
+
+        x = self._apply_temporal_conv(self.layer.tcn1, torch.stack(tuple(self._tcn_buffer), 2))
+        residual_input = self._residual_buffer[0].unsqueeze(2)
+        if isinstance(self.layer.residual, TemporalConv):
+            x = x + self._apply_temporal_conv(self.layer.residual, residual_input)
+        elif not isinstance(self.layer.residual, Zero):
+            x = x + self.layer.residual(residual_input)
+        return [self.layer.relu(x).squeeze(2)]
+
+    def push(self, x: torch.Tensor) -> List[torch.Tensor]:
+        """
+        :param x: Input frame N C V
+        :return: Output frame N C V if one is completed by the input frame
+        """
+        gcn = self.layer.gcn1
+        self._scores.add(gcn.attention_scores(x.unsqueeze(2)))
+        attention = torch.softmax(self._scores.mean() / gcn.inter_channels, -2)
+        y = gcn.aggregate(x.unsqueeze(2), attention).squeeze(2)
+
+        if not self._tcn_buffer:
+            self._tcn_buffer.extend(torch.zeros_like(y) for _ in range(self.padding))
+        self._tcn_buffer.append(y)
+        self._residual_buffer.append(x)
+        return self._emit()
+
+    def flush(self) -> List[torch.Tensor]:
+        """
+        Complete the remaining output frames (zero padding at the end of the sequence).
+
+        :return: Output frames N C V
+        """
+        outputs = []
+        if self._num_frames == 0:
+            return outputs
+        zeros = torch.zeros_like(self._tcn_buffer[-1])
+        for _ in range(self.padding):
+            self._tcn_buffer.append(zeros)
+            self._residual_buffer.append(None)
+            outputs.extend(self._emit())
+        return outputs
+
+
+class StreamingRecognizer:
+    """
+    Frame-by-frame recognition with an AGCN model (agcn.Model) on live skeleton sequences.
+    Each new frame costs one evaluation of each layer for a single frame instead of a full re-run of the
+    sequence. Class scores (or features if the model has no fully connected layer) are emitted every
+    'emit_every' frames.\n
+    Differences to the offline model:\n
+    - Temporal convolutions are not causal. An output frame of a layer is available 'padding' frames after the
+      corresponding input frame, so the scores lag behind the input by the receptive field (see 'delay').
+      'flush' completes the sequence like the zero padding of the offline model.\n
+    - Adaptive attention maps of each layer are averaged over the frames received so far
+      (or the most recent 'window_size' frames) instead of the whole sequence.\n
+    - If 'window_size' is given, scores are computed from the most recent frames only (sliding window).
+    """
+
+    def __init__(self, model: Model, emit_every: int = 1, window_size: Optional[int] = None):
+        """
+        :param model: AGCN model (set to evaluation mode)
+        :param emit_every: Emit scores every K input frames
+        :param window_size: Number of most recent input frames that scores are computed from (default: all frames)
+        """
+        assert emit_every > 0, "emit_every must be positive"
+        self.model = model.eval()
+        self.emit_every = emit_every
+        self.window_size = window_size
+        self.layers = [layer for layer in model.layers if isinstance(layer, SpatialTemporalConv)]
+        self.reset()
+
+    @property
+    def delay(self) -> int:
+        """
+        Number of input frames between an input frame and the last layer output frame it belongs to.
+        """
+        delay = 0
+        stride = 1
+        for layer in self.layers:
+            conv = layer.tcn1.conv
+            delay += conv.padding[0] * stride
+            stride *= conv.stride[0]
+        return delay
+
+    def reset(self):
+        """
+        Start a new sequence.
+        """
+        self._num_frames = 0
+        self._num_persons = 1
+        stride = 1
+        self._layers = []
+        for layer in self.layers:
+            window_size = None if self.window_size is None else max(1, math.ceil(self.window_size / stride))
+            self._layers.append(_StreamingLayer(layer, window_size))
+            stride *= layer.tcn1.conv.stride[0]
+        self._pooled = _WindowedSum(None if self.window_size is None else max(1, math.ceil(self.window_size / stride)))
+
+    def _propagate(self, outputs: List[torch.Tensor], first_layer: int = 0):
+        for layer in self._layers[first_layer:]:
+            outputs = [y for x in outputs for y in layer.push(x)]
+        for x in outputs:
+            # N*M C V -> N C
+            self._pooled.add(x.view(-1, self._num_persons, *x.shape[1:]).mean(3).mean(1))
+
+    def _scores(self) -> Optional[torch.Tensor]:
+        features = self._pooled.mean()
+        if features is None or self.model.fc is None:
+            return features
+        return self.model.fc(features)
+
+    def push(self, frame: torch.Tensor) -> Optional[torch.Tensor]:
+        """
+        Add a frame of the sequence.
+
+        :param frame: Skeleton frame N M V C (or M V C)
+        :return: Scores N x num_classes every 'emit_every' frames
+            (None otherwise or if no output frame is available yet)
+        """
+        if frame.dim() == 3:
+            frame = frame.unsqueeze(0)
+        N, M, V, C = frame.size()
+        with torch.no_grad():
+            x = self.model.data_bn(frame.reshape(N, M * V * C))
+            x = x.view(N, M, V, C).permute(0, 1, 3, 2).reshape(N * M, C, V)
+            self._num_persons = M
+            self._propagate([x])
+
+            self._num_frames += 1
+            if self._num_frames % self.emit_every != 0:
+                return None
+            return self._scores()
+
+    def flush(self) -> Optional[torch.Tensor]:
+        """
+        End the sequence and compute the scores of all remaining frames. Call 'reset' to start a new sequence.
+
+        :return: Scores N x num_classes
+        """
+        with torch.no_grad():
+            for i, layer in enumerate(self._layers):
+                self._propagate(layer.flush(), i + 1)
+            return self._scores()
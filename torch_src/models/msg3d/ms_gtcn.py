@@ -18,8 +18,8 @@ from util.graph import get_k_adjacency
 def normalize_adjacency_matrix(A):
     node_degrees = A.sum(-1)
     degs_inv_sqrt = np.power(node_degrees, -0.5)
-    norm_degs_matrix = np.eye(len(node_degrees)) * degs_inv_sqrt
-    return (norm_degs_matrix @ A @ norm_degs_matrix).astype(np.float32)
+    # D^-1/2 A D^-1/2 (scaling of rows and columns instead of products with diagonal matrices)
+    return (degs_inv_sqrt[:, np.newaxis] * A * degs_inv_sqrt[np.newaxis, :]).astype(np.float32)
 
 
 class UnfoldTemporalWindows(nn.Module):
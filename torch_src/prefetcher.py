@@ -0,0 +1,128 @@
+import queue
+import threading
+from collections import deque
+from typing import Iterable, Optional, Union
+
+import torch
+
+default_prefetch_batches = 2
+
+
+def _to_device(batch, device: torch.device, non_blocking: bool):
+    """
+    Copy a (features, labels, indices) batch to device. Features are either a tensor or a dictionary of tensors
+    for each modality. Features are cast to float and labels to long after copying (on device).
+    Indices stay on the CPU.
+    """
+    features_batch, label_batch, indices = batch
+
+    def _copy(tensor: torch.Tensor) -> torch.Tensor:
+        if non_blocking and not tensor.is_pinned():
+            tensor = tensor.pin_memory()
+        return tensor.to(device, non_blocking=non_blocking)
+
+    if type(features_batch) is dict:
+        features = {k: _copy(v).float() for k, v in features_batch.items()}
+    else:
+        features = _copy(features_batch).float()
+    label = _copy(label_batch).long()
+    return features, label, indices
+
+
+class DevicePrefetcher:
+    """
+    Wraps a DataLoader and copies batches to a device while previous batches are processed.\n
+    CUDA: Batches are copied (from pinned memory) on a separate stream. The number of batches in flight is limited.\n
+    CPU: Batches are loaded and cast by a background thread.
+    """
+
+    def __init__(self, data_loader: Iterable, device: Union[str, torch.device, None] = None,
+                 num_batches: Optional[int] = None):
+        """
+        :param data_loader: DataLoader returning (features, labels, indices) batches
+        :param device: Target device (default: cuda if available else cpu)
+        :param num_batches: Number of batches loaded in advance. If 0, batches are copied synchronously.
+        """
+        self.data_loader = data_loader
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+        self.num_batches = default_prefetch_batches if num_batches is None else num_batches
+
+    def __len__(self):
+        return len(self.data_loader)
+
+    def __iter__(self):
+        if self.num_batches <= 0:
+            return (_to_device(batch, self.device, False) for batch in self.data_loader)
+        if self.device.type == "cuda":
+            return self._iter_cuda()
+        return self._iter_thread()
+
+    def _iter_cuda(self):
+        stream = torch.cuda.Stream(self.device)
+        pending = deque()
+        batch_iter = iter(self.data_loader)
+
+        def _enqueue():
+            batch = next(batch_iter, None)
+            if batch is None:
+                return False
+            with torch.cuda.stream(stream):
+                batch = _to_device(batch, self.device, True)
+                event = torch.cuda.Event()
+                event.record(stream)
+            pending.append((batch, event))
+            return True
+
+        while len(pending) < self.num_batches and _enqueue():
+            pass
+
+        while pending:
+            (features, label, indices), event = pending.popleft()
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_event(event)
+            # Memory allocated on the copy stream must not be reused before the current stream is done with it
+            for tensor in (features.values() if type(features) is dict else (features,)):
+                tensor.record_stream(current_stream)
+            label.record_stream(current_stream)
+            _enqueue()
+            yield features, label, indices
+
+    def _iter_thread(self):
+        batches = queue.Queue(self.num_batches)
+        stop = threading.Event()
+        end = object()
+
+        def _put(item) -> bool:
+            # Give up if the consumer stopped iterating (e.g. break or exception)
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def _load():
+            try:
+                for batch in self.data_loader:
+                    if not _put(_to_device(batch, self.device, False)):
+                        return
+                _put(end)
+            except BaseException as e:
+                _put(e)
+
+        thread = threading.Thread(target=_load, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is end:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
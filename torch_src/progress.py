@@ -235,7 +235,7 @@ class CheckpointManager:
         if file_name_prefix:
             file_name_prefix += "_"
         in_file = os.path.join(self.checkpoint_path, f"{file_name_prefix}weights.pt")
-        cp = torch.load(in_file)
+        cp = torch.load(in_file, map_location="cpu")
         model.load_state_dict(cp)
 
     def load_best(self, apply: bool = True) -> dict:
@@ -261,7 +261,8 @@ class CheckpointManager:
 
         if best_score_file is None:
             raise ValueError(f"No checkpoint found in '{self.checkpoint_path}'.")
-        cp = torch.load(os.path.join(self.checkpoint_path, best_score_file))
+        # Objects copy loaded states to their own device
+        cp = torch.load(os.path.join(self.checkpoint_path, best_score_file), map_location="cpu")
 
         if apply:
             self._apply_checkpoint(cp)
@@ -0,0 +1,99 @@
+import torch
+
+import benchmark
+from config import fill_model_config
+from models.mmargcn.parallel import find_branch_executors
+from progress import wrap_color, AnsiColors
+from session.procedures.batch_train import get_batch_processor_from_config
+from session.session import Session
+
+
+class BenchmarkSession(Session):
+    """
+    Measure inference and training step latency of a model on a batch of validation data.
+    Memory of parameters and buffers and (CUDA only) the peak memory of each measurement are reported as well.
+    If the model runs independent branches (see BranchExecutor), the latency of each branch is reported and
+    sequential and parallel execution of branches are compared.
+    """
+
+    def __init__(self, base_config, name: str = "benchmark"):
+        super().__init__(base_config, name)
+        self.disable_logging = True
+        self.disable_checkpointing = True
+
+    def start(self, config: dict = None, **kwargs):
+        config = fill_model_config(config, self._base_config)
+        batch_processor = get_batch_processor_from_config(self._base_config, config)
+        num_iterations = self._base_config.benchmark_iterations or benchmark.default_iterations
+        num_warmup_iterations = self._base_config.benchmark_warmup_iterations
+        if num_warmup_iterations is None:
+            num_warmup_iterations = benchmark.default_warmup_iterations
+
+        batch_size = config.get("batch_size", self._base_config.batch_size)
+        dataset, (features, label, indices) = self._load_example_batch(batch_size)
+        # Training steps need an optimizer, but no learning rate scheduler
+        model = self._create_model(dataset.get_input_shape(), dataset.get_num_classes())
+        loss_function = torch.nn.CrossEntropyLoss().to(self.device)
+        optimizer = self._create_optimizer(config, model)
+        self.print_summary(model, **kwargs)
+        executors = find_branch_executors(model)
+        parameter_memory = benchmark.get_tensor_memory(model.parameters())
+        buffer_memory = benchmark.get_tensor_memory(model.buffers())
+
+        def inference():
+            with torch.no_grad():
+                batch_processor.process_single_batch(model, loss_function, features, label, indices)
+
+        def training_step():
+            optimizer.zero_grad()
+            batch_processor.process_single_batch(model, loss_function, features, label, indices)
+            batch_processor.run_optimizer_step(optimizer)
+
+        # Peak memory of each measurement (CUDA only)
+        peak_memory = {}
+
+        def measure(fn, train: bool, name: str = None):
+            model.train(train)
+            if self.device.type == "cuda":
+                torch.cuda.reset_peak_memory_stats(self.device)
+            latency = benchmark.summarize_latency(
+                benchmark.measure_latency(fn, self.device, num_iterations, num_warmup_iterations))
+            if name is not None and self.device.type == "cuda":
+                peak_memory[name] = torch.cuda.max_memory_allocated(self.device)
+            return latency
+
+        print(wrap_color(f"Run benchmark ({num_iterations} iterations, batch size {len(label)})...", AnsiColors.RED))
+        results = {}
+        for parallel in ((False, True) if executors else (None,)):
+            suffix = ""
+            if parallel is not None:
+                suffix = " (parallel branches)" if parallel else " (sequential branches)"
+                for executor in executors.values():
+                    executor.parallel = parallel
+            results["inference" + suffix] = measure(inference, False, "inference" + suffix)
+            results["training step" + suffix] = measure(training_step, True, "training step" + suffix)
+
+        if executors:
+            # Latency of each branch if branches run sequentially
+            for executor in executors.values():
+                executor.parallel = False
+                executor.record_timings = True
+            measure(inference, False)
+            branch_means = []
+            for executor_name, executor in executors.items():
+                for branch_name, timings in executor.get_timings().items():
+                    results[f"{executor_name}.{branch_name}"] = benchmark.summarize_latency(
+                        timings[-num_iterations:])
+                    branch_means.append(results[f"{executor_name}.{branch_name}"]["mean"])
+                executor.record_timings = False
+                executor.reset_timings()
+
+        print(wrap_color(benchmark.format_latency_table(results), AnsiColors.RED))
+        print(wrap_color(f"Model memory: parameters {benchmark.format_memory(parameter_memory)} | "
+                         f"buffers {benchmark.format_memory(buffer_memory)}", AnsiColors.RED))
+        for name, memory in peak_memory.items():
+            print(wrap_color(f"Peak memory ({name}): {benchmark.format_memory(memory)}", AnsiColors.RED))
+        if executors:
+            print(wrap_color(f"Inference: sum of branches {sum(branch_means):.2f} ms | "
+                             f"slowest branch {max(branch_means):.2f} ms", AnsiColors.RED))
+        return results
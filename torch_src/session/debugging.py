@@ -3,7 +3,7 @@ from typing import Tuple
 from torch.utils.data import DataLoader
 
 import torch_util
-from dataset import MultiModalDataset
+from dataset import MultiModalDataset, create_data_loader
 from session.training import TrainingSession
 
 
@@ -13,11 +13,15 @@ class DebuggingSession(TrainingSession):
         self.disable_checkpointing = True
 
     def _load_data(self, batch_size, test_batch_size) -> Tuple[DataLoader, DataLoader]:
-        training_data = DataLoader(MultiModalDataset(self._base_config.input_data, "train", debug=True), batch_size,
-                                   shuffle=False, drop_last=True, worker_init_fn=torch_util.set_seed)
+        batched = bool(self._base_config.batched_loading)
+        data_loader_args = self._get_data_loader_args()
+        training_data = create_data_loader(
+            MultiModalDataset(self._base_config.input_data, "train", debug=True, batched=batched), batch_size,
+            shuffle=False, drop_last=True, worker_init_fn=torch_util.set_seed, **data_loader_args)
 
-        validation_data = DataLoader(MultiModalDataset(self._base_config.input_data, "val"), test_batch_size,
-                                     shuffle=False, drop_last=False, worker_init_fn=torch_util.set_seed)
+        validation_data = create_data_loader(
+            MultiModalDataset(self._base_config.input_data, "val", batched=batched), test_batch_size,
+            shuffle=False, drop_last=False, worker_init_fn=torch_util.set_seed, **data_loader_args)
         return training_data, validation_data
 
     def start(self, config: dict = None, **kwargs):
@@ -6,7 +6,7 @@ from torch.utils.data import DataLoader
 
 import torch_util
 from config import fill_model_config
-from dataset import MultiModalDataset
+from dataset import MultiModalDataset, create_data_loader
 from metrics import F1MeasureMetric
 from progress import ProgressLogger
 from session.procedures.batch_train import get_batch_processor_from_config
@@ -19,8 +19,10 @@ class EvaluationSession(Session):
 
     def _load_data(self, test_batch_size) -> DataLoader:
         worker_init_fn = torch_util.set_seed if self._base_config.fixed_seed is not None else None
-        validation_data = DataLoader(MultiModalDataset(self._base_config.input_data, "val"),
-                                     test_batch_size, shuffle=False, drop_last=False, worker_init_fn=worker_init_fn)
+        batched = bool(self._base_config.batched_loading)
+        validation_data = create_data_loader(MultiModalDataset(self._base_config.input_data, "val", batched=batched),
+                                             test_batch_size, shuffle=False, drop_last=False,
+                                             worker_init_fn=worker_init_fn, **self._get_data_loader_args())
         return validation_data
 
     def _build_logging(self, validation_data_size: int):
@@ -34,12 +36,7 @@ class EvaluationSession(Session):
         return None
 
     def start(self, config: dict = None, **kwargs):
-        eval_session_path = os.path.join(self._base_config.out_path, self._base_config.eval_session_id, "checkpoints",
-                                         f"{self._base_config.eval_session_id}_weights.pt")
-
-        if not os.path.exists(eval_session_path) or not self._base_config.eval_session_id.startswith("train"):
-            raise ValueError(f"Session path '{eval_session_path}' does not exist or is not a training session.")
-
+        eval_session_path = self._get_trained_weights_path()
         config = fill_model_config(config, self._base_config)
 
         batch_processor = config.get("batch_processor", None)
@@ -53,7 +50,7 @@ class EvaluationSession(Session):
         num_classes = validation_data.dataset.get_num_classes()
 
         model, loss_function, _, _ = self._build_model(config, data_shape, num_classes)
-        model.load_state_dict(torch.load(eval_session_path))
+        model.load_state_dict(torch.load(eval_session_path, map_location=self.device))
         progress = self._build_logging(len(validation_data))
 
         # skeleton_joints, = import_dataset_constants(self._base_config.dataset, ["skeleton_joints"])
@@ -83,7 +80,8 @@ class EvaluationSession(Session):
             progress.begin_epoch(0)
             progress.begin_epoch_mode(0)
 
-        Session.validate_epoch(batch_processor, model, loss_function, validation_data, progress, metrics, 0)
+        Session.validate_epoch(batch_processor, model, loss_function, validation_data, progress, metrics, 0,
+                               self._base_config.prefetch_batches, self.device)
 
         # Save confusion matrix
         np.save(os.path.join(self.out_path, "validation-confusion.npy"), metrics["validation_confusion"].value.numpy())
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+
+import torch
+
+import benchmark
+from config import fill_model_config
+from models.mmargcn.parallel import find_branch_executors
+from progress import wrap_color, AnsiColors
+from session.session import Session
+
+
+class ExportSession(Session):
+    """
+    Export a model as TorchScript (scripted if possible, otherwise traced using a batch of validation data)
+    and compare the latency of the eager, TorchScript and torch.compile forward pass for this input shape.
+    Weights of the training session given by 'eval_session_id' are exported if specified.
+    """
+
+    def __init__(self, base_config, name: str = "export"):
+        super().__init__(base_config, name)
+        self.disable_checkpointing = True
+
+    @staticmethod
+    def _to_torchscript(model: torch.nn.Module, features, check_features) -> tuple:
+        """
+        :param check_features: Additional input (with a different batch size) used to check a traced model
+        :return: tuple (TorchScript module, 'script' or 'trace')
+        """
+        try:
+            return torch.jit.script(model), "script"
+        except Exception as e:
+            print(wrap_color(f"Model can't be scripted ({type(e).__name__}: {e}), trace instead.", AnsiColors.RED))
+
+        with torch.no_grad():
+            return torch.jit.trace(model, (features,), check_inputs=[(features,), (check_features,)]), "trace"
+
+    @staticmethod
+    def _resize_batch(features, batch_size: int):
+        """
+        :return: Features with the given batch size (samples are repeated if the batch is too small)
+        """
+        if type(features) is dict:
+            return {k: ExportSession._resize_batch(v, batch_size) for k, v in features.items()}
+        indices = torch.arange(batch_size, device=features.device) % len(features)
+        return features[indices]
+
+    def start(self, config: dict = None, **kwargs):
+        config = fill_model_config(config, self._base_config)
+        num_iterations = self._base_config.benchmark_iterations or benchmark.default_iterations
+        num_warmup_iterations = self._base_config.benchmark_warmup_iterations
+        if num_warmup_iterations is None:
+            num_warmup_iterations = benchmark.default_warmup_iterations
+
+        batch_size = config.get("test_batch_size", self._base_config.test_batch_size)
+        dataset, (features, labels, _) = self._load_example_batch(batch_size)
+        model = self._create_model(dataset.get_input_shape(), dataset.get_num_classes())
+        if self._base_config.eval_session_id:
+            model.load_state_dict(torch.load(self._get_trained_weights_path(), map_location=self.device))
+        model.eval()
+        self.print_summary(model, **kwargs)
+
+        # Branches running on other threads can't be traced or compiled
+        for executor in find_branch_executors(model).values():
+            executor.parallel = False
+
+        with torch.no_grad():
+            y_eager = model(features)
+
+        # The exported model must not be specialized to the batch size of the example batch
+        check_batch_size = len(labels) - 1 if len(labels) > 1 else 2
+        check_features = self._resize_batch(features, check_batch_size)
+        scripted_model, method = self._to_torchscript(model, features, check_features)
+        with torch.no_grad():
+            max_diff = (scripted_model(features) - y_eager).abs().max().item()
+            check_max_diff = (scripted_model(check_features) - model(check_features)).abs().max().item()
+
+        report = {
+            "torchscript": method,
+            "torchscript_max_abs_diff": max_diff,
+            "torchscript_check_batch_size": check_batch_size,
+            "torchscript_check_max_abs_diff": check_max_diff,
+            "input_shape": {k: list(v.shape) for k, v in features.items()} if type(features) is dict else list(
+                features.shape)
+        }
+        models = {"eager": model, f"torchscript ({method})": scripted_model}
+
+        if self._base_config.disable_compile:
+            pass
+        elif not hasattr(torch, "compile"):
+            print(wrap_color("torch.compile requires PyTorch 2.0 or newer.", AnsiColors.RED))
+        else:
+            compiled_model = torch.compile(model, mode=self._base_config.compile_mode)
+            try:
+                start = time.perf_counter()
+                with torch.no_grad():
+                    y_compiled = compiled_model(features)
+                report["compile_time"] = time.perf_counter() - start
+                report["compiled_max_abs_diff"] = (y_compiled - y_eager).abs().max().item()
+                models["compiled"] = compiled_model
+            except Exception as e:
+                print(wrap_color(f"torch.compile failed: {e}", AnsiColors.RED))
+
+        print(wrap_color(f"Measure latency ({num_iterations} iterations)...", AnsiColors.RED))
+        latency = {}
+        for name, m in models.items():
+            def forward():
+                with torch.no_grad():
+                    m(features)
+
+            latency[name] = benchmark.summarize_latency(
+                benchmark.measure_latency(forward, self.device, num_iterations, num_warmup_iterations))
+        report["latency"] = latency
+
+        os.makedirs(self.out_path, exist_ok=True)
+        self.save_base_configuration()
+        model_path = os.path.join(self.out_path, "model_torchscript.pt")
+        torch.jit.save(scripted_model, model_path)
+        with open(os.path.join(self.out_path, "export_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+        print(wrap_color(benchmark.format_latency_table(latency), AnsiColors.RED))
+        print(wrap_color(f"TorchScript ({method}) model written to: {model_path}", AnsiColors.RED))
+        return report
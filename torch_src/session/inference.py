@@ -0,0 +1,273 @@
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+import types
+from importlib import import_module
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+import benchmark
+from config import fill_model_config
+from dataset import MultiModalDataset
+from progress import wrap_color, AnsiColors
+from session.session import Session
+from util.dynamic_import import import_class, import_names
+from util.merge import deep_merge_dictionary
+from util.preprocessing.data_loader import Loader
+from util.preprocessing.datagroup import DataGroup
+
+default_max_latency_ms = 10.
+
+
+class _Request:
+    def __init__(self, request_id, features: Dict[str, np.ndarray], respond: Callable[[dict], None],
+                 arrival_time: float):
+        self.request_id = request_id
+        self.features = features
+        self.respond = respond
+        # Time the request was received (before preprocessing)
+        self.arrival_time = arrival_time
+
+
+class _InferenceStatistics:
+    def __init__(self):
+        self.latencies = []
+        self.batch_sizes = []
+        self.start_time = None
+        self.end_time = None
+
+    def update(self, batch: List[_Request], end_time: float):
+        if self.start_time is None:
+            self.start_time = batch[0].arrival_time
+        self.end_time = end_time
+        self.batch_sizes.append(len(batch))
+        self.latencies.extend((end_time - r.arrival_time) * 1000 for r in batch)
+
+    def format(self) -> str:
+        if not self.latencies:
+            return "No requests processed."
+        elapsed = max(self.end_time - self.start_time, 1e-9)
+        summary = benchmark.summarize_latency(self.latencies)
+        return (f"Requests: {len(self.latencies)} | Batches: {len(self.batch_sizes)} "
+                f"(mean size {np.mean(self.batch_sizes):.1f}) | Throughput: {len(self.latencies) / elapsed:.1f} "
+                f"samples/s | Latency p50: {summary['p50']:.2f} ms, p99: {summary['p99']:.2f} ms")
+
+
+class InferenceSession(Session):
+    """
+    Serve a trained model (weights of the training session given by 'eval_session_id').\n
+    Requests are JSON lines read from stdin (responses are written to stdout) or from connections to a local
+    TCP port (see 'inference_port'):
+    {"id": ..., "samples": {modality: raw sample}, "features": {feature name: processed sample}}\n
+    Raw samples (as returned by the dataset loader of the modality, e.g. skeleton frames) are processed by the
+    processors of the preprocessing modes that produced the training data. Processed samples
+    (e.g. RGB patch features) are used as they are.
+    Concurrent requests are grouped into batches of up to 'max_batch_size' samples.
+    A batch is started at the latest 'max_latency_ms' after its first request arrived.
+    """
+
+    def __init__(self, base_config, name: str = "inference"):
+        super().__init__(base_config, name)
+        self.disable_checkpointing = True
+        self._process_sample = None
+        self._process_lock = threading.Lock()
+        self._loaders = {}
+        self._feature_shapes = {}
+
+    def _create_sample_processor(self):
+        dataset = self._base_config.dataset.lower().replace("-", "_")
+        modes = self._base_config.preprocessing_modes
+        if modes is None:
+            # Output directories of preprocessing are named after the modes (joined by '__')
+            modes = os.path.basename(self._base_config.input_data[0][0]).replace("__", ",")
+        get_preprocessing_setting = import_names(f"datasets.{dataset}.config", ["get_preprocessing_setting"])
+        if not get_preprocessing_setting:
+            raise ValueError(f"Dataset '{dataset}' does not define preprocessing settings.")
+        setting = deep_merge_dictionary(get_preprocessing_setting[0](mode) for mode in modes.split(","))
+
+        io = import_module(f"datasets.{dataset}.io")
+        self._loaders = {v.name: v for v in vars(io).values() if isinstance(v, Loader)}
+        processors = {k: import_class(f"util.preprocessing.processor.{v}") for k, v in setting["processors"].items()}
+        self._process_sample = DataGroup(None, self._loaders).create_sample_processor(
+            processors, self._base_config.target_modality, setting.get("modes", None),
+            temporal_stride=self._base_config.temporal_stride or 1, **setting.get("kwargs", {}))
+
+    def _parse_request(self, line: str, respond: Callable[[dict], None]) -> Optional[_Request]:
+        """
+        Parse and preprocess a request. Invalid requests are answered immediately.
+        """
+        arrival_time = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id", None)
+            features = {k: np.asarray(v, dtype=np.float32) for k, v in request.get("features", {}).items()}
+
+            samples = {k: np.asarray(v, dtype=self._loaders[k].structure.target_type) if k in self._loaders else v
+                       for k, v in request.get("samples", {}).items()}
+            if samples:
+                # Interpolators of processors hold per-sample state
+                with self._process_lock:
+                    processed_samples = self._process_sample(samples)
+                for k, v in processed_samples.items():
+                    if isinstance(v, types.GeneratorType):
+                        v = np.stack(list(v))
+                    features[k.lower()] = np.asarray(v, dtype=np.float32)
+
+            for k, shape in self._feature_shapes.items():
+                if k not in features:
+                    raise ValueError(f"Missing features '{k}'")
+                if features[k].shape != tuple(shape):
+                    raise ValueError(f"Features '{k}' have shape {features[k].shape}, expected {tuple(shape)}")
+            return _Request(request_id, features, respond, arrival_time)
+        except Exception as e:
+            respond({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+            return None
+
+    def _run_batch(self, model: torch.nn.Module, batch: List[_Request], statistics: _InferenceStatistics):
+        """
+        Run the model on a batch and answer its requests.
+        If the batch fails (e.g. out of memory), all requests of the batch are answered with the error.
+        """
+        try:
+            features = {k: torch.from_numpy(np.stack([r.features[k] for r in batch])).to(self.device)
+                        for k in self._feature_shapes}
+            if len(features) == 1:
+                features = next(iter(features.values()))
+
+            with torch.no_grad():
+                scores = torch.softmax(model(features).float(), 1).cpu().numpy()
+        except Exception as e:
+            for request in batch:
+                request.respond({"id": request.request_id, "error": f"{type(e).__name__}: {e}"})
+            return
+
+        statistics.update(batch, time.perf_counter())
+        class_labels = self._base_config.class_labels
+        for request, sample_scores in zip(batch, scores):
+            prediction = int(np.argmax(sample_scores))
+            request.respond({
+                "id": request.request_id,
+                "prediction": prediction,
+                "label": class_labels[prediction] if class_labels and prediction < len(class_labels) else None,
+                "scores": sample_scores.tolist()
+            })
+
+    def _serve(self, model: torch.nn.Module, requests: queue.Queue, max_batch_size: int, max_latency: float,
+               statistics: _InferenceStatistics):
+        """
+        Group requests into batches and run the model until None is received.
+        """
+        stop = False
+        while not stop:
+            request = requests.get()
+            if request is None:
+                break
+
+            batch = [request]
+            deadline = request.arrival_time + max_latency
+            while len(batch) < max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    # Requests that are already waiting are added even if the deadline has passed
+                    request = requests.get(timeout=timeout) if timeout > 0 else requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            self._run_batch(model, batch, statistics)
+
+    def _read_stdin(self, requests: queue.Queue):
+        write_lock = threading.Lock()
+
+        def respond(response: dict):
+            with write_lock:
+                sys.stdout.write(json.dumps(response) + "\n")
+                sys.stdout.flush()
+
+        for line in sys.stdin:
+            if line.strip():
+                request = self._parse_request(line, respond)
+                if request is not None:
+                    requests.put(request)
+        requests.put(None)
+
+    def _create_server(self, port: int, requests: queue.Queue) -> socketserver.ThreadingTCPServer:
+        session = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                write_lock = threading.Lock()
+
+                def respond(response: dict):
+                    with write_lock:
+                        try:
+                            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                            self.wfile.flush()
+                        except (OSError, ValueError):
+                            # Client disconnected (ValueError if the handler already closed the stream)
+                            pass
+
+                for line in self.rfile:
+                    if line.strip():
+                        request = session._parse_request(line.decode("utf-8"), respond)
+                        if request is not None:
+                            requests.put(request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", port), RequestHandler)
+        server.daemon_threads = True
+        return server
+
+    def start(self, config: dict = None, **kwargs):
+        config = fill_model_config(config, self._base_config)
+        port = self._base_config.inference_port
+        max_batch_size = self._base_config.max_batch_size or config.get("test_batch_size",
+                                                                        self._base_config.test_batch_size)
+        max_latency_ms = self._base_config.max_latency_ms
+        if max_latency_ms is None:
+            max_latency_ms = default_max_latency_ms
+        # stdout is used for responses if requests are read from stdin
+        log_file = sys.stdout if port else sys.stderr
+
+        # Shapes of input features and number of classes are taken from the training data (like the training session)
+        dataset = MultiModalDataset(self._base_config.input_data, "train")
+        self._feature_shapes = dataset.get_input_shape()
+        model = self._create_model(self._feature_shapes, dataset.get_num_classes())
+        model.load_state_dict(torch.load(self._get_trained_weights_path(), map_location=self.device))
+        model.eval()
+        self._create_sample_processor()
+
+        if port:
+            self.print_summary(model, **kwargs)
+
+        requests = queue.Queue()
+        statistics = _InferenceStatistics()
+        server = None
+        if port:
+            server = self._create_server(port, requests)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            print(wrap_color(f"Listening on 127.0.0.1:{port} (max batch size {max_batch_size}, "
+                             f"max latency {max_latency_ms} ms)", AnsiColors.RED), file=log_file)
+        else:
+            threading.Thread(target=self._read_stdin, args=(requests,), daemon=True).start()
+
+        try:
+            self._serve(model, requests, max_batch_size, max_latency_ms / 1000, statistics)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            print(wrap_color(statistics.format(), AnsiColors.RED), file=log_file)
+        return statistics
@@ -3,6 +3,7 @@ from typing import Dict, Union
 
 import torch
 
+import torch_util
 from session.procedures.step import Step, DefaultStep, MixedPrecisionStep
 
 
@@ -109,7 +110,7 @@ def get_batch_processor_from_config(base_args, config: dict):
     grad_accum_step = config.get("grad_accum_step", base_args.grad_accum_step)
     use_mixed_precision = base_args.mixed_precision
     use_gradient_accumulation = base_args.batch_size != base_args.grad_accum_step
-    step = MixedPrecisionStep() if use_mixed_precision else DefaultStep()
+    step = MixedPrecisionStep(torch_util.get_device(base_args.device)) if use_mixed_precision else DefaultStep()
     if use_gradient_accumulation:
         batch_processor = GradientAccumulationBatchProcessor(step, batch_size, grad_accum_step)
     else:
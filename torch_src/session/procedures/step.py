@@ -1,4 +1,5 @@
 import abc
+from typing import Optional
 
 import torch
 from torch.cuda.amp import autocast, GradScaler
@@ -53,13 +54,26 @@ class DefaultStep(Step):
 
 
 class MixedPrecisionStep(Step):
-    def __init__(self):
+    """
+    CUDA: float16 autocast with loss scaling. CPU: bfloat16 autocast (no loss scaling required).
+    """
+
+    def __init__(self, device: Optional[torch.device] = None):
+        self._is_cuda = device is None or device.type == "cuda"
+        if not self._is_cuda and not hasattr(torch, "autocast"):
+            raise ValueError("Mixed precision on CPU (bfloat16) requires PyTorch 1.10 or newer")
+
         self._inner = DefaultStep()
-        self._loss_scale = GradScaler()
+        self._loss_scale = GradScaler(enabled=self._is_cuda)
+
+    def _autocast(self):
+        if self._is_cuda:
+            return autocast()
+        return torch.autocast("cpu", dtype=torch.bfloat16)
 
     def forward(self, model: torch.nn.Module, loss_function: torch.nn.Module, features: torch.Tensor,
                 label: torch.Tensor, loss_quotient: int = 1):
-        with autocast():
+        with self._autocast():
             return self._inner.forward(model, loss_function, features, label, loss_quotient)
 
     def backward(self, loss: torch.Tensor):
@@ -72,7 +86,7 @@ class MixedPrecisionStep(Step):
 
     def reset(self):
         self._inner = DefaultStep()
-        self._loss_scale = GradScaler()
+        self._loss_scale = GradScaler(enabled=self._is_cuda)
 
     def get_state_dict_objects(self, object_container: dict):
         object_container["loss_scale"] = self._loss_scale
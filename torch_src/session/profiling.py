@@ -27,12 +27,13 @@ class ProfilingSession(Session):
 
         features_shape = (num_batches, batch_size, *data_shape)
         label_shape = (num_batches, batch_size)
-        features = torch.randn(features_shape).float().cuda()
-        labels = torch.zeros(label_shape, dtype=torch.long).random_(0, num_classes - 1).cuda()
+        features = torch.randn(features_shape).float().to(self.device)
+        labels = torch.zeros(label_shape, dtype=torch.long).random_(0, num_classes - 1).to(self.device)
+        use_cuda = self.device.type == "cuda"
 
         print(wrap_color(f"Run profiling {num_classes} batches...", AnsiColors.RED), end="")
         model.train()
-        with profile(use_cuda=True, record_shapes=True, profile_memory=True) as prof:
+        with profile(use_cuda=use_cuda, record_shapes=True, profile_memory=True) as prof:
             for x, y_true in zip(features, labels):
                 optimizer.zero_grad()
                 y_pred = model(x)
@@ -41,4 +42,5 @@ class ProfilingSession(Session):
                 optimizer.step()
 
         print(wrap_color(f"\rRun profiling {num_classes} batches... Done.", AnsiColors.RED))
-        print(wrap_color(prof.key_averages().table(sort_by="cuda_time_total"), AnsiColors.RED))
+        sort_by = "cuda_time_total" if use_cuda else "cpu_time_total"
+        print(wrap_color(prof.key_averages().table(sort_by=sort_by), AnsiColors.RED))
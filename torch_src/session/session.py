@@ -1,13 +1,17 @@
 import abc
 import os
 import time
+from typing import Optional
 
 import torch
 from torch.utils.data import DataLoader
 
 import session_helper
+import torch_util
 from config import copy_configuration_to_output
+from dataset import MultiModalDataset, create_data_loader
 from metrics import MultiClassAccuracy, TopKAccuracy, SimpleMetric, ConfusionMatrix, AccuracyBarChart, Mean
+from prefetcher import DevicePrefetcher
 from progress import ProgressLogger, MetricsContainer
 from session.procedures.batch_train import BatchProcessor
 from util.dynamic_import import import_model, import_dataset_constants
@@ -32,6 +36,7 @@ class Session:
 
         self.disable_logging = self._base_config.disable_logging
         self.disable_checkpointing = self._base_config.disable_checkpointing
+        self.device = torch_util.get_device(self._base_config.device)
 
     def _build_model(self, config: dict, data_shape: tuple, num_classes: int) -> tuple:
         """
@@ -41,6 +46,19 @@ class Session:
         :return: tuple (model, loss function, optimizer, learning rate scheduler)
         """
 
+        model = self._create_model(data_shape, num_classes)
+        loss_function = torch.nn.CrossEntropyLoss().to(self.device)
+        optimizer = self._create_optimizer(config, model)
+        lr_scheduler = session_helper.create_learning_rate_scheduler(config["lr_scheduler"], optimizer,
+                                                                     **config["lr_scheduler_args"])
+        return model, loss_function, optimizer, lr_scheduler
+
+    def _create_model(self, data_shape: tuple, num_classes: int) -> torch.nn.Module:
+        """
+        Build only the network model (on the session's device), e.g. for sessions that never train.
+
+        :return: model
+        """
         skeleton_edges, center_joint = import_dataset_constants(self._base_config.dataset,
                                                                 ["skeleton_edges", "center_joint"])
 
@@ -48,14 +66,55 @@ class Session:
         # https://pytorch.org/docs/stable/generated/torch.nn.Module.html
         # noinspection PyPep8Naming
         Model = import_model(self._base_config.model)
-        model = Model(data_shape, num_classes, graph, mode=self._base_config.mode,
-                      **self._base_config.model_args).cuda()
-        loss_function = torch.nn.CrossEntropyLoss().cuda()
-        optimizer = session_helper.create_optimizer(config["optimizer"], model, config["base_lr"],
-                                                    **config["optimizer_args"])
-        lr_scheduler = session_helper.create_learning_rate_scheduler(config["lr_scheduler"], optimizer,
-                                                                     **config["lr_scheduler_args"])
-        return model, loss_function, optimizer, lr_scheduler
+        return Model(data_shape, num_classes, graph, mode=self._base_config.mode,
+                     **self._base_config.model_args).to(self.device)
+
+    @staticmethod
+    def _create_optimizer(config: dict, model: torch.nn.Module) -> torch.optim.Optimizer:
+        return session_helper.create_optimizer(config["optimizer"], model, config["base_lr"],
+                                               **config["optimizer_args"])
+
+    def _get_data_loader_args(self) -> dict:
+        """
+        Collect DataLoader arguments (worker processes, prefetching, memory pinning) from the base configuration.
+
+        :return: Dictionary of keyword arguments for DataLoader
+        """
+        args = {}
+        num_workers = self._base_config.num_workers or 0
+        if num_workers > 0:
+            args["num_workers"] = num_workers
+            # Only supported by DataLoader if worker processes are used
+            if self._base_config.prefetch_factor is not None:
+                args["prefetch_factor"] = self._base_config.prefetch_factor
+            if self._base_config.persistent_workers:
+                args["persistent_workers"] = True
+        if self._base_config.pin_memory:
+            args["pin_memory"] = True
+        return args
+
+    def _load_example_batch(self, batch_size: int) -> tuple:
+        """
+        Load the first batch of validation data (on the session's device), e.g. for benchmarking or exporting a model.
+
+        :param batch_size: Batch size
+        :return: tuple (dataset, (features, labels, indices))
+        """
+        dataset = MultiModalDataset(self._base_config.input_data, "val",
+                                    batched=bool(self._base_config.batched_loading))
+        data_loader = create_data_loader(dataset, batch_size, shuffle=False, drop_last=False)
+        batch = next(iter(DevicePrefetcher(data_loader, self.device, 0)))
+        return dataset, batch
+
+    def _get_trained_weights_path(self) -> str:
+        """
+        Return the path of the model weights saved at the end of the training session given by 'eval_session_id'.
+        """
+        session_id = self._base_config.eval_session_id
+        weights_path = os.path.join(self._base_config.out_path, session_id, "checkpoints", f"{session_id}_weights.pt")
+        if not os.path.exists(weights_path) or not session_id.startswith("train"):
+            raise ValueError(f"Session path '{weights_path}' does not exist or is not a training session.")
+        return weights_path
 
     def _make_paths(self):
         """
@@ -92,7 +151,8 @@ class Session:
             print("Fixed seed:", self._base_config.fixed_seed)
         print("Model:", self._base_config.model.upper())
         print("Dataset:", self._base_config.dataset.replace("_", "-").upper())
-        print("Mixed precision:", self._base_config.mixed_precision)
+        print("Device:", self.device, "| CPU threads:", torch.get_num_threads())
+        print("Mixed precision:", bool(self._base_config.mixed_precision))
         print("Logs will be written to:", self.log_path)
         print("Model checkpoints will be written to:", self.checkpoint_path)
         if model:
@@ -159,20 +219,15 @@ class Session:
 
     @staticmethod
     def train_epoch(batch_processor: BatchProcessor, model: torch.nn.Module, loss_function: torch.nn.Module,
-                    dataset: DataLoader, optimizer, progress: ProgressLogger, metrics: MetricsContainer):
+                    dataset: DataLoader, optimizer, progress: ProgressLogger, metrics: MetricsContainer,
+                    prefetch_batches: Optional[int] = None, device: Optional[torch.device] = None):
         """
         Train a single epoch by running over all training batches.
+        Batches are copied to the device in advance (see DevicePrefetcher).
         """
         model.train()
 
-        for features_batch, label_batch, indices in dataset:
-            with torch.no_grad():
-                if type(features_batch) is dict:
-                    features = {k: v.float().cuda() for k, v in features_batch.items()}
-                else:
-                    features = features_batch.float().cuda()
-                label = label_batch.long().cuda()
-
+        for features, label, indices in DevicePrefetcher(dataset, device, prefetch_batches):
             # Clear gradients for each parameter
             optimizer.zero_grad()
             # Compute model and calculate loss
@@ -186,18 +241,15 @@ class Session:
 
     @staticmethod
     def validate_epoch(batch_processor: BatchProcessor, model: torch.nn.Module, loss_function: torch.nn.Module,
-                       dataset: DataLoader, progress: ProgressLogger, metrics: MetricsContainer, mode: int = 1):
+                       dataset: DataLoader, progress: ProgressLogger, metrics: MetricsContainer, mode: int = 1,
+                       prefetch_batches: Optional[int] = None, device: Optional[torch.device] = None):
         """
         Validate a single epoch by running over all validation batches.
+        Batches are copied to the device in advance (see DevicePrefetcher).
         """
         model.eval()
         with torch.no_grad():
-            for features_batch, label_batch, indices in dataset:
-                if type(features_batch) is dict:
-                    features = {k: v.float().cuda() for k, v in features_batch.items()}
-                else:
-                    features = features_batch.float().cuda()
-                label = label_batch.long().cuda()
+            for features, label, indices in DevicePrefetcher(dataset, device, prefetch_batches):
                 batch_processor.process_single_batch(model, loss_function, features, label, indices,
                                                      metrics.update_validation)
                 # Update progress bar
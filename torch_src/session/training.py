@@ -8,7 +8,7 @@ from config import fill_model_config
 from progress import ProgressLogger, CheckpointManager
 from session.procedures.batch_train import BatchProcessor, get_batch_processor_from_config
 from session.session import Session
-from dataset import MultiModalDataset
+from dataset import MultiModalDataset, create_data_loader
 
 
 class TrainingSession(Session):
@@ -18,11 +18,15 @@ class TrainingSession(Session):
     def _load_data(self, batch_size, test_batch_size) -> Tuple[DataLoader, DataLoader]:
         shuffle = not self._base_config.disable_shuffle
         worker_init_fn = torch_util.set_seed if self._base_config.fixed_seed is not None else None
-        training_data = DataLoader(MultiModalDataset(self._base_config.input_data, "train"), batch_size,
-                                   shuffle=shuffle, drop_last=True, worker_init_fn=worker_init_fn)
-
-        validation_data = DataLoader(MultiModalDataset(self._base_config.input_data, "val"),
-                                     test_batch_size, shuffle=False, drop_last=False, worker_init_fn=worker_init_fn)
+        batched = bool(self._base_config.batched_loading)
+        data_loader_args = self._get_data_loader_args()
+        training_data = create_data_loader(MultiModalDataset(self._base_config.input_data, "train", batched=batched),
+                                           batch_size, shuffle=shuffle, drop_last=True, worker_init_fn=worker_init_fn,
+                                           **data_loader_args)
+
+        validation_data = create_data_loader(MultiModalDataset(self._base_config.input_data, "val", batched=batched),
+                                             test_batch_size, shuffle=False, drop_last=False,
+                                             worker_init_fn=worker_init_fn, **data_loader_args)
         return training_data, validation_data
 
     def _build_logging(self, batch_processor: BatchProcessor, epochs: int, training_data_size: int,
@@ -100,12 +104,14 @@ class TrainingSession(Session):
             # Training for current epoch
             if progress:
                 progress.begin_epoch_mode(0)
-            Session.train_epoch(batch_processor, model, loss_function, training_data, optimizer, progress, metrics)
+            Session.train_epoch(batch_processor, model, loss_function, training_data, optimizer, progress, metrics,
+                                self._base_config.prefetch_batches, self.device)
 
             # Validation for current epoch
             if progress:
                 progress.begin_epoch_mode(1)
-            Session.validate_epoch(batch_processor, model, loss_function, validation_data, progress, metrics)
+            Session.validate_epoch(batch_processor, model, loss_function, validation_data, progress, metrics,
+                                   prefetch_batches=self._base_config.prefetch_batches, device=self.device)
 
             # Finalize epoch
             if progress:
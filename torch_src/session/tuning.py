@@ -8,6 +8,7 @@ from ray.tune.schedulers import ASHAScheduler
 import tune_config
 from progress import launch_tensorboard
 from session.training import TrainingSession
+from util import adjacency_cache
 
 
 class TuningSession(TrainingSession):
@@ -17,6 +18,8 @@ class TuningSession(TrainingSession):
         self.disable_checkpointing = True
 
     def _start(self, config: dict = None, reporter=None):
+        # Trials may run in other processes
+        adjacency_cache.set_cache_path(self._base_config.adjacency_cache_path)
         config = tune_config.prepare_tune_config(config)
         super().start(config, reporter=reporter)
 
@@ -42,6 +42,9 @@ session_types: Dict[str, SessionType] = {
     "evaluation": SessionType("session.evaluation.EvaluationSession", make_default_model_config),
     "debugging": SessionType("session.debugging.DebuggingSession", make_default_model_config),
     "profiling": SessionType("session.profiling.ProfilingSession", make_default_model_config),
+    "benchmark": SessionType("session.benchmark.BenchmarkSession", make_default_model_config),
+    "export": SessionType("session.export.ExportSession", make_default_model_config),
+    "inference": SessionType("session.inference.InferenceSession", make_default_model_config),
     "tuning": SessionType("session.tuning.TuningSession", make_tune_config)
 }
 
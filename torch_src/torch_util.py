@@ -1,4 +1,6 @@
+import os
 import random
+from typing import Optional, Sequence
 
 import numpy as np
 import torch
@@ -16,3 +18,38 @@ def set_seed(seed: int):
     random.seed(seed)
     cudnn.deterministic = True
     cudnn.benchmark = False
+
+
+def get_device(device: Optional[str] = None) -> torch.device:
+    """
+    Return the device to run models on.
+
+    :param device: Device name, e.g. 'cuda', 'cuda:1' or 'cpu' (default: 'cuda' if available else 'cpu')
+    :return: device
+    """
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    return torch.device(device)
+
+
+def configure_threads(num_threads: Optional[int] = None, num_interop_threads: Optional[int] = None,
+                      cpu_affinity: Optional[Sequence[int]] = None):
+    """
+    Configure CPU threads used by pytorch for predictable CPU throughput.
+
+    :param num_threads: Number of threads used for intra-op parallelism
+    :param num_interop_threads: Number of threads used for inter-op parallelism
+    (can only be set before any inter-op parallel work is started)
+    :param cpu_affinity: Restrict this process (and threads created afterwards) to the given CPU cores
+    """
+    if cpu_affinity:
+        if not hasattr(os, "sched_setaffinity"):
+            raise ValueError("Setting the CPU affinity is not supported on this platform")
+        os.sched_setaffinity(0, cpu_affinity)
+        if num_threads is None:
+            num_threads = len(cpu_affinity)
+
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads is not None:
+        torch.set_num_interop_threads(num_interop_threads)
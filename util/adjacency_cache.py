@@ -0,0 +1,67 @@
+import hashlib
+import os
+from typing import Callable, Optional
+
+import numpy as np
+
+_memory_cache = {}
+_cache_path = None
+
+
+def set_cache_path(path: Optional[str]):
+    """
+    Set the directory where adjacency matrices are stored across runs (e.g. trials of hyperparameter tuning).
+    If no directory is set, matrices are only cached in memory.
+
+    :param path: Directory or None
+    """
+    global _cache_path
+    _cache_path = path
+
+
+def clear_memory_cache():
+    _memory_cache.clear()
+
+
+def _hash_key(key: tuple) -> str:
+    h = hashlib.sha1()
+    for part in key:
+        if isinstance(part, np.ndarray):
+            h.update(repr((part.dtype.str, part.shape)).encode("utf-8"))
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(repr(part).encode("utf-8"))
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def get_cached(name: str, key: tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+    """
+    Return an adjacency matrix from the cache or compute and cache it.
+
+    :param name: Name of the kind of matrix (prefix of the file name)
+    :param key: Everything the matrix depends on (numpy arrays, numbers, strings)
+    :param compute: Function that computes the matrix
+    :return: Matrix (a copy that can be modified)
+    """
+    file_name = f"{name}_{_hash_key(key)}.npy"
+    matrix = _memory_cache.get(file_name, None)
+
+    if matrix is None and _cache_path is not None:
+        file_path = os.path.join(_cache_path, file_name)
+        if os.path.exists(file_path):
+            matrix = np.load(file_path)
+
+    if matrix is None:
+        matrix = np.asarray(compute())
+        if _cache_path is not None:
+            os.makedirs(_cache_path, exist_ok=True)
+            file_path = os.path.join(_cache_path, file_name)
+            # Write to a temporary file first so that concurrent runs never read incomplete files
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, file_path)
+
+    _memory_cache[file_name] = matrix
+    return matrix.copy()
@@ -0,0 +1,218 @@
+"""
+Indexed chunked array container.
+
+Layout of a file:\n
+- Fixed size header (64 bytes): magic, version, codec, ndim, number of samples, offset of index, dtype\n
+- Sample blocks (each block is either raw or compressed, aligned to 64 bytes)\n
+- Offset index at the end of the file: (offset, number of bytes, shape) for each sample
+
+Samples can be read independently by multiple processes (pread / memory map) without sharing a file handle.
+"""
+import mmap
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+import numpy as np
+
+_MAGIC = b"MMCHUNK\0"
+_VERSION = 1
+# magic, version, codec, ndim, num_samples, index_offset, dtype
+_HEADER_FORMAT = "<8sHHIQQ16s"
+_HEADER_SIZE = 64
+_ALIGNMENT = 64
+
+codecs = ("raw", "zlib", "lz4", "zstd")
+
+
+def _get_index_dtype(ndim: int) -> np.dtype:
+    return np.dtype([("offset", "<u8"), ("nbytes", "<u8"), ("shape", "<u4", (ndim,))])
+
+
+def _compress(codec: str, data: bytes, level: Optional[int]) -> bytes:
+    if codec == "raw":
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, 6 if level is None else level)
+    if codec == "lz4":
+        import lz4.block
+        return lz4.block.compress(data, compression=0 if level is None else level, store_size=False)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(3 if level is None else level).compress(data)
+    raise ValueError(f"Unsupported codec '{codec}'. Supported codecs: {', '.join(codecs)}")
+
+
+def _decompress(codec: str, data: bytes, raw_nbytes: int) -> bytes:
+    if codec == "raw":
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lz4":
+        import lz4.block
+        return lz4.block.decompress(data, uncompressed_size=raw_nbytes)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_nbytes)
+    raise ValueError(f"Unsupported codec '{codec}'. Supported codecs: {', '.join(codecs)}")
+
+
+class ChunkedArrayWriter:
+    def __init__(self, out_path: str, num_samples: int, codec: str = "zlib", level: Optional[int] = None):
+        """
+        :param out_path: Output file path
+        :param num_samples: Total number of samples
+        :param codec: Compression of each sample:
+         One of 'raw', 'zlib', 'lz4' (requires lz4) or 'zstd' (requires zstandard)
+        :param level: Compression level (codec default if None)
+        """
+        if codec not in codecs:
+            raise ValueError(f"Unsupported codec '{codec}'. Supported codecs: {', '.join(codecs)}")
+
+        self.out_path = out_path
+        self.num_samples = num_samples
+        self.codec = codec
+        self.level = level
+        self.dtype = None
+        self._index = None
+        self._file = None
+
+    def open(self):
+        self._file = open(self.out_path, "wb")
+        # header is written once all samples are collected
+        self._file.write(b"\0" * _HEADER_SIZE)
+
+    def write(self, sample: np.ndarray, sample_index: int):
+        sample = np.ascontiguousarray(sample)
+        if self.dtype is None:
+            self.dtype = sample.dtype
+            self._index = np.zeros(self.num_samples, dtype=_get_index_dtype(sample.ndim))
+        elif sample.dtype != self.dtype or sample.ndim != self._index["shape"].shape[1]:
+            raise ValueError(f"All samples must have dtype {self.dtype} and {self._index['shape'].shape[1]} dimensions")
+
+        data = _compress(self.codec, sample.tobytes(), self.level)
+        offset = self._file.tell()
+        padding = -offset % _ALIGNMENT
+        if padding:
+            self._file.write(b"\0" * padding)
+            offset += padding
+        self._file.write(data)
+        self._index[sample_index] = (offset, len(data), sample.shape)
+
+    def close(self):
+        if self._file is None:
+            return
+
+        if self._index is None:
+            self.dtype = np.dtype(np.float32)
+            self._index = np.zeros(self.num_samples, dtype=_get_index_dtype(0))
+
+        index_offset = self._file.tell()
+        self._file.write(self._index.tobytes())
+        self._file.seek(0)
+        self._file.write(struct.pack(_HEADER_FORMAT, _MAGIC, _VERSION, codecs.index(self.codec),
+                                     self._index["shape"].shape[1], self.num_samples, index_offset,
+                                     self.dtype.str.encode("ascii")))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ChunkedArrayReader:
+    def __init__(self, path: str, num_threads: int = 4):
+        """
+        :param path: Path to chunked array file
+        :param num_threads: Number of threads for decompressing multiple samples at once
+        """
+        self.path = path
+        self.num_threads = num_threads
+
+        with open(path, "rb") as file:
+            magic, version, codec, ndim, num_samples, index_offset, dtype = struct.unpack(
+                _HEADER_FORMAT, file.read(struct.calcsize(_HEADER_FORMAT)))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"'{path}' is not a chunked array file (version {_VERSION})")
+            self.codec = codecs[codec]
+            self.dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+            file.seek(index_offset)
+            index_dtype = _get_index_dtype(ndim)
+            self.index = np.frombuffer(file.read(num_samples * index_dtype.itemsize), dtype=index_dtype)
+
+        self._open()
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        # Uncompressed samples are returned as views of the memory mapped file
+        self._mmap = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ) if self.codec == "raw" else None
+        self._executor = None
+        self._executor_pid = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for k in ("_fd", "_mmap", "_executor", "_executor_pid"):
+            del state[k]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def get_sample_shape(self, index: int = 0) -> Sequence[int]:
+        return tuple(int(s) for s in self.index[index]["shape"])
+
+    def _read_block(self, offset: int, nbytes: int):
+        if self._mmap is not None:
+            return memoryview(self._mmap)[offset:offset + nbytes]
+        if hasattr(os, "pread"):
+            return os.pread(self._fd, nbytes, offset)
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            return file.read(nbytes)
+
+    def read(self, index: int) -> np.ndarray:
+        offset, nbytes, shape = self.index[index]
+        # Samples are written after the header: An offset of 0 is left in the index of samples that were never written
+        # (e.g. if writing was aborted)
+        if offset == 0:
+            raise IndexError(f"Sample {index} was never written to '{self.path}'")
+        raw_nbytes = int(np.prod(shape)) * self.dtype.itemsize
+        data = _decompress(self.codec, self._read_block(int(offset), int(nbytes)), raw_nbytes)
+        return np.frombuffer(data, dtype=self.dtype).reshape(shape)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Thread pools are not inherited by forked processes (e.g. DataLoader workers)
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.num_threads)
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def read_into(self, indices: Sequence[int], out: np.ndarray) -> np.ndarray:
+        """
+        Read multiple samples of equal shape and decompress them in parallel.
+
+        :param indices: Sample indices
+        :param out: Output array of shape (len(indices), *sample_shape)
+        :return: out
+        """
+
+        def _read(i):
+            out[i] = self.read(indices[i])
+
+        if self.num_threads <= 1 or len(indices) <= 1:
+            for i in range(len(indices)):
+                _read(i)
+        else:
+            # list() to raise exceptions of worker threads
+            list(self._get_executor().map(_read, range(len(indices))))
+        return out
@@ -1,8 +1,8 @@
-import matplotlib.pyplot as plt
-import networkx as nx
 import numpy as np
 import scipy.sparse as sp
 
+from util import adjacency_cache
+
 
 class Graph:
     """
@@ -10,20 +10,30 @@ class Graph:
     """
 
     def __init__(self, edges, num_vertices=None, is_directed=False, center_joint=0):
-        self.edges = np.unique(edges, axis=0)
-        assert np.issubdtype(self.edges.dtype, np.integer)
-        assert np.all(self.edges >= 0)
-        assert self.edges.shape[1] == 2
+        edges = np.array(edges)
+        assert np.issubdtype(edges.dtype, np.integer)
+        assert np.all(edges >= 0)
+        assert edges.shape[1] == 2
+        # Same as np.unique(edges, axis=0) (sorted by first, then second vertex) but faster for large graphs
+        key_base = int(np.max(edges)) + 1
+        self.edges = np.stack(np.divmod(np.unique(Graph._edge_keys(edges, key_base)), key_base), axis=1).astype(
+            edges.dtype)
         if num_vertices is None:
-            self.num_vertices = np.max(self.edges) + 1
+            self.num_vertices = int(np.max(self.edges)) + 1
         else:
             assert num_vertices >= (np.max(self.edges) + 1)
             self.num_vertices = num_vertices
-        self.__g = nx.Graph() if not is_directed else nx.DiGraph()
-        self.__g.add_edges_from(self.edges)
+        # networkx graph is only built for drawing
+        self.__g = None
         self.is_directed = is_directed
         self.center_joint = center_joint
 
+    def get_cache_key(self) -> tuple:
+        """
+        :return: Everything the adjacency matrices of the graph depend on (see util.adjacency_cache)
+        """
+        return self.edges, int(self.num_vertices), self.is_directed
+
     def as_directed(self):
         if self.is_directed:
             return self
@@ -38,24 +48,25 @@ class Graph:
         reversed_edges = [(j, i) for i, j in self.edges]
         return Graph(reversed_edges, self.num_vertices, self.is_directed, self.center_joint)
 
+    @staticmethod
+    def _edge_keys(edges: np.ndarray, num_vertices: int) -> np.ndarray:
+        # Unique integer for each (directed) edge so that edges can be compared with sorted array operations
+        return edges[:, 0].astype(np.int64) * num_vertices + edges[:, 1]
+
     def has_edge(self, edge):
         assert len(edge) == 2
-        return np.any(np.sum(self.edges == edge, axis=1) == 2)
+        return bool(self.has_edges([edge])[0])
 
     def has_edges(self, edges):
-        edges = np.array(edges)
+        edges = np.array(edges).reshape(-1, 2)
         assert np.issubdtype(edges.dtype, np.integer)
         assert np.all(edges >= 0)
-        o = np.zeros(len(edges), dtype=np.bool)
-        for idx, edge in enumerate(edges):
-            o[idx] = np.any(np.sum(self.edges == edge, axis=1) == 2)
-        return o
+        num_vertices = max(int(self.num_vertices), int(np.max(edges, initial=0)) + 1)
+        return np.isin(Graph._edge_keys(edges, num_vertices), Graph._edge_keys(self.edges, num_vertices))
 
     def __is_one_of(self, edges):
-        m = np.zeros(len(self.edges), dtype=np.bool)
-        for idx, edge in enumerate(self.edges):
-            m[idx] = np.any(np.sum(edges == edge, axis=1) == 2)
-        return m
+        num_vertices = max(int(self.num_vertices), int(np.max(edges, initial=0)) + 1)
+        return np.isin(Graph._edge_keys(self.edges, num_vertices), Graph._edge_keys(edges, num_vertices))
 
     def with_new_edges(self, edges):
         edges = np.array(edges)
@@ -79,49 +90,60 @@ class Graph:
         return a
 
     def get_sparse_adjacency_matrix(self):
-        data = np.ones(len(self.edges) * 2)
         e1 = self.edges[:, 0]
         e2 = self.edges[:, 1]
         if not self.is_directed:
             e1 = np.hstack((e1, self.edges[:, 1]))
             e2 = np.hstack((e2, self.edges[:, 0]))
+        data = np.ones(len(e1))
         a = sp.coo_matrix((data, (e1, e2)), shape=(self.num_vertices, self.num_vertices), dtype=np.int)
+        # Edges that are stored in both directions would be summed up (dense adjacency matrix is binary)
+        a.sum_duplicates()
+        a.data[:] = 1
         return a
 
     def get_degree_matrix(self, as_matrix=True):
-        d = np.sum(self.get_adjacency_matrix(), axis=0)
+        # noinspection PyUnresolvedReferences
+        d = self.get_sparse_adjacency_matrix().sum(axis=0).A1
         if as_matrix:
             return np.diag(d)
         return d
 
     @staticmethod
     def _reciprocal_degree(degree: np.ndarray, normalization: str) -> np.ndarray:
+        # Vertices without edges keep a degree of 0
         if normalization == "symmetric":
-            return np.reciprocal(np.sqrt(degree), where=degree > 0)
-        return np.reciprocal(degree, where=degree > 0)
+            return np.reciprocal(np.sqrt(degree), out=np.zeros_like(degree), where=degree > 0)
+        return np.reciprocal(degree, out=np.zeros_like(degree), where=degree > 0)
 
     @staticmethod
-    def _normalize(adj, d_mat_inv, normalization: str):
+    def _normalize(adj, d_inv: np.ndarray, normalization: str):
         # https://math.stackexchange.com/questions/3035968/interpretation-of-symmetric-normalised-graph-adjacency-matrix
+        if normalization not in ("row", "column", "row_column", "symmetric"):
+            raise ValueError("Unsupported normalization: " + normalization)
+
+        if sp.issparse(adj):
+            d_mat_inv = sp.diags(d_inv)
+            if normalization == "row":
+                return d_mat_inv.dot(adj)
+            elif normalization == "column":
+                return adj.dot(d_mat_inv)
+            return d_mat_inv.dot(adj).dot(d_mat_inv)
+
+        # Multiplication with a diagonal matrix is scaling of rows / columns
         if normalization == "row":
-            return d_mat_inv.dot(adj)
+            return d_inv[:, np.newaxis] * adj
         elif normalization == "column":
-            return adj.dot(d_mat_inv)
-        elif normalization == "row_column":
-            return d_mat_inv.dot(adj).dot(d_mat_inv)
-        elif normalization == "symmetric":
-            return d_mat_inv.dot(adj).dot(d_mat_inv)
-        raise ValueError("Unsupported normalization: " + normalization)
+            return adj * d_inv[np.newaxis, :]
+        return d_inv[:, np.newaxis] * adj * d_inv[np.newaxis, :]
 
     def get_normalized_adjacency_matrix(self, normalization="row", add_self_connections=False):
-        adj = self.get_adjacency_matrix().astype(np.float)
-        if add_self_connections:
-            adj += np.eye(self.num_vertices)
+        def compute():
+            # Normalize the sparse matrix: Only the result is dense (graphs may have thousands of vertices)
+            return self.get_normalized_sparse_adjacency_matrix(normalization, add_self_connections).toarray()
 
-        d = np.sum(adj, axis=0)
-        d_inv = Graph._reciprocal_degree(d, normalization)
-        d_mat_inv = np.diag(d_inv)
-        return Graph._normalize(adj, d_mat_inv, normalization)
+        return adjacency_cache.get_cached("normalized_adjacency",
+                                          self.get_cache_key() + (normalization, add_self_connections), compute)
 
     def get_normalized_sparse_adjacency_matrix(self, normalization="row", add_self_connections=False):
         adj = self.get_sparse_adjacency_matrix().astype(np.float)
@@ -131,8 +153,7 @@ class Graph:
         # noinspection PyUnresolvedReferences
         d = adj.sum(axis=0).A1
         d_inv = Graph._reciprocal_degree(d, normalization)
-        d_mat_inv = sp.diags(d_inv)
-        return Graph._normalize(adj, d_mat_inv, normalization)
+        return Graph._normalize(adj, d_inv, normalization)
 
     def get_laplacian_matrix(self):
         return self.get_degree_matrix() - self.get_adjacency_matrix()
@@ -141,10 +162,18 @@ class Graph:
         return np.linalg.eigh(self.get_laplacian_matrix())
 
     def draw(self):
+        import matplotlib.pyplot as plt
+        import networkx as nx
+
+        if self.__g is None:
+            self.__g = nx.Graph() if not self.is_directed else nx.DiGraph()
+            self.__g.add_edges_from(self.edges)
         nx.draw_networkx(self.__g, with_labels=True)
         plt.show()
 
     def plot_eigenvectors(self):
+        import matplotlib.pyplot as plt
+
         _, v = self.eig()
         fig, axs = plt.subplots(self.num_vertices, 1, sharex="all", sharey="all", figsize=(5, self.num_vertices * 2))
         for i in range(self.num_vertices):
@@ -154,6 +183,8 @@ class Graph:
         plt.show()
 
     def plot_eigenvalues(self):
+        import matplotlib.pyplot as plt
+
         l, _ = self.eig()
         fig = plt.figure()
         plt.scatter(range(self.num_vertices), l)
@@ -174,11 +205,14 @@ class Graph:
 
 
 def get_k_adjacency(adj: np.ndarray, k: int, with_self: bool = False, self_factor: int = 1) -> np.ndarray:
-    identity = np.eye(len(adj), dtype=adj.dtype)
-    if k == 0:
-        return identity
-    adj_k = np.minimum(np.linalg.matrix_power(adj + identity, k), 1) - np.minimum(
-        np.linalg.matrix_power(adj + identity, k - 1), 1)
-    if with_self:
-        adj_k += (self_factor * identity)
-    return adj_k
+    def compute():
+        identity = np.eye(len(adj), dtype=adj.dtype)
+        if k == 0:
+            return identity
+        adj_k = np.minimum(np.linalg.matrix_power(adj + identity, k), 1) - np.minimum(
+            np.linalg.matrix_power(adj + identity, k - 1), 1)
+        if with_self:
+            adj_k += (self_factor * identity)
+        return adj_k
+
+    return adjacency_cache.get_cached("k_adjacency", (adj, k, with_self, self_factor), compute)
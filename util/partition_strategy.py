@@ -1,5 +1,7 @@
 import numpy as np
+import scipy.sparse as sp
 
+import util.adjacency_cache
 import util.graph
 
 
@@ -22,6 +24,11 @@ class GraphPartitionStrategy:
         :return: A numpy array of shape (K, N, N)
         where K is the number of subsets and N the number of nodes in the graph.
         """
+        return util.adjacency_cache.get_cached(
+            "partition", graph.get_cache_key() + (self.strategy, normalization),
+            lambda: self._get_adjacency_matrix_array(graph, normalization))
+
+    def _get_adjacency_matrix_array(self, graph: util.graph.Graph, normalization: str):
         if self.strategy == "distance":
             # Distance strategy:
             # Neighbors are partitioned according to each nodes' distance to the root node.
@@ -49,3 +56,21 @@ class GraphPartitionStrategy:
         # Neighborhood of each node is treated as a single subset.
         # Therefore, this strategy only has a single adjacency matrix (since K = 1), so simply expand dimension.
         return np.expand_dims(graph.as_undirected().get_normalized_adjacency_matrix(True), axis=0)
+
+    def get_sparse_adjacency_matrices(self, graph: util.graph.Graph, normalization: str = "column"):
+        """
+        Same as get_adjacency_matrix_array but returns sparse matrices (for graphs with many nodes).
+        :param graph: Input graph
+        :param normalization: Normalization order for adjacency matrix
+        :return: A list of K sparse matrices of shape (N, N)
+        """
+        if self.strategy == "distance":
+            raise NotImplementedError("Distance strategy not implemented since 'spatial' seems to yield best results.")
+        elif self.strategy == "spatial":
+            return [
+                sp.eye(graph.num_vertices, format="coo"),
+                graph.as_directed().with_reversed_edges().get_normalized_sparse_adjacency_matrix(normalization),
+                graph.as_directed().get_normalized_sparse_adjacency_matrix(normalization)
+            ]
+
+        return [graph.as_undirected().get_normalized_sparse_adjacency_matrix(normalization)]
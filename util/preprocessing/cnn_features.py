@@ -1,17 +1,27 @@
-from typing import Optional
+import copy
+import hashlib
+import os
+from typing import Optional, Sequence, Union
 
 import cv2
 import numpy as np
 import torch
-import torchvision.models as models
+import torchvision.models
 from torch.nn.functional import softmax
 
-# set model download location
-# torch.hub.set_dir()
+# Location of pretrained weights. Weights are downloaded to this directory once and loaded from there afterwards.
+weights_dir = os.environ.get("MMARGCN_WEIGHTS_DIR", "../torchhome/hub")
 
-resnet18 = models.resnet18(pretrained=True)
-squeezenet = models.squeezenet1_0(pretrained=True)
-googlenet = models.googlenet(pretrained=True)
+# model name: (constructor, feature size, input function, output function)
+models = {
+    "resnet18": (torchvision.models.resnet18, 512, lambda x: prepare_image_resnet(x), lambda x: softmax(x, 1)),
+    "squeezenet": (torchvision.models.squeezenet1_0, 512, lambda x: x, lambda x: torch.mean(x, -1)),
+    "googlenet": (torchvision.models.googlenet, 1024, lambda x: x, lambda x: softmax(x, 1))
+}
+default_model = "resnet18"
+
+# Backbones are only created on first use and cached for each (model name, device, dtype)
+_backbones = {}
 
 
 def _prepare_model(model: torch.nn.Module) -> torch.nn.Module:
@@ -20,17 +30,60 @@ def _prepare_model(model: torch.nn.Module) -> torch.nn.Module:
     return torch.nn.Sequential(*layers_without_fc)
 
 
-resnet18 = _prepare_model(resnet18)
-squeezenet = _prepare_model(squeezenet)
-googlenet = _prepare_model(googlenet)
+def _load_pretrained_model(model_name: str) -> torch.nn.Module:
+    hub_dir = torch.hub.get_dir()
+    torch.hub.set_dir(os.path.abspath(weights_dir))
+    try:
+        model = models[model_name][0](pretrained=True)
+    finally:
+        torch.hub.set_dir(hub_dir)
+    return _prepare_model(model).eval()
 
 
-models = {
-    "resnet18": (resnet18, 512, lambda x: prepare_image_resnet(x), lambda x: softmax(x, 1)),
-    "squeezenet": (squeezenet, 512, lambda x: x, lambda x: torch.mean(x, -1)),
-    "googlenet": (googlenet, 1024, lambda x: x, lambda x: softmax(x, 1))
-}
-default_model = "resnet18"
+def get_default_device() -> torch.device:
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def get_backbone(model_name: Optional[str] = None,
+                 device: Union[str, torch.device, None] = None,
+                 dtype: torch.dtype = torch.float32) -> torch.nn.Module:
+    """
+    Return pretrained CNN (without last layer) in evaluation mode.
+    The model is loaded on first use and cached afterwards.
+
+    :param model_name: CNN model (default: resnet18)
+    :param device: Device of the model (default: cuda if available else cpu)
+    :param dtype: Data type of model parameters
+    :return: model
+    """
+    model_name = model_name or default_model
+    device = torch.device(device) if device is not None else get_default_device()
+    key = (model_name, str(device), dtype)
+
+    if key not in _backbones:
+        # Weights are only loaded once, other devices / data types use a copy
+        base_key = (model_name, "cpu", torch.float32)
+        if base_key not in _backbones:
+            _backbones[base_key] = _load_pretrained_model(model_name)
+        if key != base_key:
+            _backbones[key] = copy.deepcopy(_backbones[base_key]).to(device=device, dtype=dtype)
+
+    return _backbones[key]
+
+
+def get_backbone_hash(model_name: Optional[str] = None) -> str:
+    """
+    Hash of the pretrained weights of a backbone (e.g. to detect stale features computed with other weights).
+
+    :param model_name: CNN model (default: resnet18)
+    :return: SHA-1 hex digest
+    """
+    model_name = model_name or default_model
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    for name, tensor in get_backbone(model_name, "cpu").state_dict().items():
+        h.update(name.encode("utf-8"))
+        h.update(tensor.numpy().tobytes())
+    return h.hexdigest()
 
 
 def get_feature_size(model_name: Optional[str] = None) -> int:
@@ -51,30 +104,63 @@ def prepare_image_resnet(image: np.ndarray, dtype=np.float32):
     return image
 
 
-def encode_sample(sample: np.ndarray, model_name: str = None, cuda=True) -> np.ndarray:
+def encode_sample(sample: np.ndarray, model_name: str = None,
+                  device: Union[str, torch.device, None] = None, dtype: torch.dtype = torch.float32) -> np.ndarray:
     model_name = model_name or default_model
     input_fn = models[model_name][2]
     output_fn = models[model_name][3]
+    model = get_backbone(model_name, device, dtype)
 
     sample = input_fn(sample)
 
     if sample.ndim == 3:
         sample = np.expand_dims(sample, axis=0)
 
-    sample = torch.from_numpy(sample).float()
-    model = models[model_name][0]
-
-    if cuda:
-        sample = sample.cuda()
-        model = model.cuda()
+    sample = torch.from_numpy(sample).to(device=next(model.parameters()).device, dtype=dtype)
 
-    model.eval()
     with torch.no_grad():
         feature = model(sample)
         feature = output_fn(feature)
         feature = torch.flatten(feature)
 
-    if cuda:
-        feature = feature.cpu()
+    return feature.float().cpu().numpy()
 
-    return feature.numpy()
+
+def encode_samples(samples: Sequence[np.ndarray], model_name: str = None,
+                   device: Union[str, torch.device, None] = None, dtype: torch.dtype = torch.float32) -> np.ndarray:
+    """
+    Encode multiple samples (e.g. image patches) with a single forward pass for each sample shape.
+
+    :param samples: Samples
+    :param model_name: CNN model (default: resnet18)
+    :param device: Device to run the model on (default: cuda if available else cpu)
+    :param dtype: Data type of model parameters and inputs
+    :return: numpy array of shape (len(samples), feature_size)
+    """
+    model_name = model_name or default_model
+    input_fn = models[model_name][2]
+    output_fn = models[model_name][3]
+    model = get_backbone(model_name, device, dtype)
+    model_device = next(model.parameters()).device
+
+    # Samples (e.g. patches of joint groups) may have different shapes after applying input_fn:
+    # Run a forward pass for each group of samples with equal shape
+    samples = [input_fn(sample) for sample in samples]
+    shape_groups = {}
+    for idx, sample in enumerate(samples):
+        shape_groups.setdefault(sample.shape, []).append(idx)
+
+    out = None
+    for indices in shape_groups.values():
+        batch = torch.from_numpy(np.stack([samples[idx] for idx in indices])).to(device=model_device, dtype=dtype)
+
+        with torch.no_grad():
+            features = model(batch)
+            features = output_fn(features)
+            features = torch.flatten(features, 1)
+
+        if out is None:
+            out = np.zeros((len(samples), features.shape[1]), dtype=np.float32)
+        out[indices] = features.float().cpu().numpy()
+
+    return out
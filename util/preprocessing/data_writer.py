@@ -1,12 +1,14 @@
 import abc
 import os
 import zipfile
-from typing import Sequence
+from typing import Optional, Sequence
 
 import cv2
 import numpy as np
 import numpy.lib.format
 
+from util.chunked_array import ChunkedArrayWriter
+
 
 class MemoryMappedArray:
     def __init__(self, out_path: str, dtype: type, shape: Sequence[int]):
@@ -19,11 +21,21 @@ class MemoryMappedArray:
         if self.out_path:
             self.data = np.memmap(self.out_path, self.dtype, "w+", 128, self.shape)
 
+    def open_file(self):
+        if self.out_path:
+            self.data = np.memmap(self.out_path, self.dtype, "r+", 128, self.shape)
+
     def close_file(self):
         if self.data is not None:
             MemoryMappedArray._write_header(self.data, self.out_path)
         self.data = None
 
+    def __getstate__(self):
+        # never pickle the mapped data
+        state = self.__dict__.copy()
+        state["data"] = None
+        return state
+
     def __enter__(self):
         self.create_file()
         return self.data
@@ -39,6 +51,10 @@ class MemoryMappedArray:
 
 
 class FileWriter:
+    # If true, a writer that is already collecting can be attached to by other processes
+    # which then write samples at arbitrary indices. Otherwise samples must be collected by a single writer.
+    supports_parallel_write = False
+
     def __init__(self, out_path: str):
         self.out_path = out_path
         self.sample_index = 0
@@ -55,8 +71,15 @@ class FileWriter:
     def _collect_next(self, sequence, sample_index: int):
         pass
 
+    def attach(self):
+        """
+        Attach to the output of a writer that already started collecting (in a different process).
+        Only the writer that started collecting finalizes the output.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support parallel writing")
+
     def collect_next(self, sequence, sample_index: int = None):
-        sample_index = sample_index or self.sample_index
+        sample_index = self.sample_index if sample_index is None else sample_index
         self._collect_next(sequence, sample_index)
         self.sample_index += 1
 
@@ -69,6 +92,8 @@ class FileWriter:
 
 
 class NumpyWriter(FileWriter):
+    supports_parallel_write = True
+
     def __init__(self, out_path: str, dtype: type, shape: Sequence[int]):
         super().__init__(out_path)
         self._data_store = MemoryMappedArray(out_path, dtype, shape)
@@ -79,6 +104,9 @@ class NumpyWriter(FileWriter):
     def end_collect(self):
         self._data_store.close_file()
 
+    def attach(self):
+        self._data_store.open_file()
+
     def _collect_next(self, sequence: np.ndarray, sample_index: int):
         self._data_store.data[sample_index] = sequence
 
@@ -101,6 +129,31 @@ class ZipNumpyWriter(FileWriter):
             np.save(out_file, sequence)
 
 
+class ChunkedNumpyWriter(FileWriter):
+    """
+    Write each sample as a separately (optionally) compressed block of an indexed chunked array file
+    (see util/chunked_array.py).
+    """
+
+    def __init__(self, out_path: str, num_samples: int, codec: str = "zlib", level: Optional[int] = None):
+        super().__init__(out_path)
+        self._writer = ChunkedArrayWriter(out_path, num_samples, codec, level)
+        self._is_open = False
+
+    def start_collect(self):
+        if not self._is_open:
+            self._writer.open()
+            self._is_open = True
+
+    def end_collect(self):
+        if self._is_open:
+            self._writer.close()
+            self._is_open = False
+
+    def _collect_next(self, sequence: np.ndarray, sample_index: int):
+        self._writer.write(sequence, sample_index)
+
+
 class VideoWriter(FileWriter):
     def __init__(self, out_path: str, fps: int, frame_width: int, frame_height: int, create_subdir=True):
         super().__init__(out_path)
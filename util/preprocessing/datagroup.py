@@ -1,10 +1,14 @@
 import contextlib
 import copy
 import itertools
+import math
+import multiprocessing
 import os
 import pickle
+import shutil
+import types
 from sys import stdout
-from typing import Tuple, Dict, Union, Iterable, Optional, Sequence, Type
+from typing import Any, Callable, Tuple, Dict, Union, Iterable, Optional, Sequence, Type
 
 import numpy as np
 import pandas as pd
@@ -12,11 +16,56 @@ from tqdm import tqdm
 
 from util.preprocessing.data_loader import Loader
 from util.preprocessing.data_writer import FileWriter
+from util.preprocessing.feature_cache import FeatureCache, remove_outputs
 from util.preprocessing.file_meta_data import FileMetaData
 from util.preprocessing.interpolator import SampleInterpolator, NearestNeighborInterpolator
 from util.preprocessing.processor.base import Processor
 
 
+# State of a worker process for parallel processing (see DataGroup.produce_features)
+_worker_state = None
+
+
+def _init_worker(data_group, main_modality: Optional[str], processors: Dict[str, Processor],
+                 required_loaders: Dict[str, Loader], interpolators: Dict[str, SampleInterpolator],
+                 writers: Dict[str, Optional[FileWriter]], kwargs: dict):
+    global _worker_state
+    for writer in writers.values():
+        if writer is not None:
+            writer.attach()
+    _worker_state = (data_group, main_modality, processors, required_loaders, interpolators, writers, kwargs)
+
+
+def _process_chunk(chunk: Tuple[int, Dict[str, Sequence[str]]]) -> Tuple[int, Dict[str, list]]:
+    """
+    Process a contiguous range of samples in a worker process.
+
+    :param chunk: Index of first sample and files for each modality
+    :return: Number of processed samples and processed samples for each writer not supporting parallel writing
+    """
+    start_index, files = chunk
+    data_group, main_modality, processors, required_loaders, interpolators, writers, kwargs = _worker_state
+
+    for writer in writers.values():
+        if writer is not None:
+            writer.sample_index = start_index
+
+    input_sample_iter = {k: required_loaders[k].load_samples(files[k]) for k in required_loaders}
+    input_samples = (dict(zip(input_sample_iter.keys(), tp)) for tp in zip(*input_sample_iter.values()))
+    transformed_sample_iter = data_group._process_input_samples(input_samples, main_modality, processors,
+                                                                interpolators, writers, **kwargs)
+    results = {k: [] for k, w in writers.items() if w is None}
+    num_samples = 0
+    for _, transformed_sample in transformed_sample_iter:
+        for k in results:
+            res = transformed_sample[k]
+            # generators (e.g. video frames) can't be sent to the main process
+            results[k].append(list(res) if isinstance(res, types.GeneratorType) else res)
+        num_samples += 1
+
+    return num_samples, results
+
+
 class DataGroup:
     def __init__(self, data: pd.DataFrame, loaders: Dict[str, Loader]):
         self.data = data
@@ -81,7 +130,8 @@ class DataGroup:
                           main_modality: Optional[str],
                           processors: Dict[str, Type[Processor]],
                           modes: Optional[Dict[str, str]],
-                          interpolators: Optional[Dict[str, SampleInterpolator]]) \
+                          interpolators: Optional[Dict[str, SampleInterpolator]],
+                          temporal_stride: int = 1) \
             -> Tuple[Dict[str, Optional[str]],
                      Optional[int],
                      Dict[str, Processor],
@@ -109,7 +159,7 @@ class DataGroup:
                     raise ValueError(f"The loader '{loader}' does not exist for this DataGroup.")
 
             input_structure = {loader: self._loaders[loader].structure for loader in loaders}
-            proc.set_input_structure(input_structure, max_sequence_length)
+            proc.set_input_structure(input_structure, max_sequence_length, temporal_stride)
             requested_loaders.extend(loaders)
 
         # Only load samples of modalities that are requested by processors
@@ -118,6 +168,8 @@ class DataGroup:
 
         # Interpolators for each split and modality to be used for sampling to max_sequence_length
         interpolators = self._get_interpolators(required_loaders, interpolators)
+        for interpolator in interpolators.values():
+            interpolator.temporal_stride = temporal_stride
         return modes, max_sequence_length, processors, required_loaders, interpolators
 
     def _process_input_samples(self,
@@ -149,6 +201,38 @@ class DataGroup:
 
             yield unprocessed_sample, transformed_sample
 
+    def create_sample_processor(self,
+                                processors: Dict[str, Type[Processor]],
+                                main_modality: Optional[str] = None,
+                                modes: Optional[Dict[str, str]] = None,
+                                temporal_stride: int = 1,
+                                **kwargs) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Create a function that processes a single raw sample (e.g. received for inference) exactly like
+        produce_features processes samples loaded from files. Processors are only instantiated once.
+
+        :param processors: Types of processors that should be used to transform input samples
+        :param main_modality: All other modalities are interpolated to the maximum sequence length of this modality.
+        :param modes: A dictionary of modes for each modality
+        :param temporal_stride: Only keep every n-th element of each (interpolated) sequence
+        :param kwargs: Additional arguments for processors
+        :return: Function that takes a dictionary of raw samples (as returned by the loader of each modality)
+        and returns a dictionary of processed samples for each processor
+        """
+        modes, max_sequence_length, processors, required_loaders, interpolators = \
+            self._setup_processing(main_modality, processors, modes, kwargs.get("interpolators", None),
+                                   temporal_stride)
+
+        def process(sample: Dict[str, Any]) -> Dict[str, Any]:
+            missing = [k for k in required_loaders if k not in sample]
+            if missing:
+                raise ValueError("Missing modalities: " + ", ".join(missing))
+            _, transformed_sample = next(self._process_input_samples([sample], main_modality, processors,
+                                                                     interpolators, None, **kwargs))
+            return transformed_sample
+
+        return process
+
     def produce_features(self,
                          splits: Dict[str, tuple],
                          processors: Dict[str, Type[Processor]],
@@ -156,6 +240,9 @@ class DataGroup:
                          modes: Optional[Dict[str, str]] = None,
                          out_path: Optional[str] = None,
                          split_type: str = "subject",
+                         num_workers: int = 0,
+                         cache_path: Optional[str] = None,
+                         temporal_stride: int = 1,
                          **kwargs):
         """
         Produces features for each modality and stores them under the specified path. If main_modality is None,
@@ -169,9 +256,18 @@ class DataGroup:
         :param out_path: Path where results will be stored. If None, return a generator for processed samples.
         :param split_type: Split subset (e.g. "subject" or "scene")
         that defines the way features of that modality are processed.
+        :param num_workers: If greater than 0 and out_path is given, process samples in this many worker processes.
+        :param cache_path: If given (and out_path is given), features of each processor are stored in this directory
+        and reused (hard linked to out_path) as long as processor, mode, relevant kwargs (Processor.output_kwargs),
+        input files and split are unchanged. Only processors without cached features are run.
+        :param temporal_stride: Only keep every n-th element of each (interpolated) sequence, e.g. 3 to reduce
+        30 FPS to 10 FPS. Skipped elements are not processed (and video frames are not decoded).
         """
         modes, max_sequence_length, processors, required_loaders, interpolators = \
-            self._setup_processing(main_modality, processors, modes, kwargs.get("interpolators", None))
+            self._setup_processing(main_modality, processors, modes, kwargs.get("interpolators", None),
+                                   temporal_stride)
+
+        cache = FeatureCache(cache_path) if out_path and cache_path else None
 
         print("START PREPROCESSING")
         if len(modes) > 0:
@@ -193,27 +289,115 @@ class DataGroup:
                     sample_files = [tuple(map(lambda x: x[len(common_prefix):], p)) for p in sample_files]
                     pickle.dump(sample_files, meta_data_file)
 
+            split_processors = processors
+            split_loaders = required_loaders
+            out_dirs = {k: out_path for k in processors}
+            cache_keys = {}
+            if cache is not None:
+                # Reuse cached features and only run processors whose features are not cached yet
+                cache_keys = {k: cache.get_key(p, files, interpolators, split_name, main_modality, kwargs)
+                              for k, p in processors.items()}
+                split_processors = {k: p for k, p in processors.items() if not cache.contains(cache_keys[k])}
+                for k in processors:
+                    if k not in split_processors:
+                        print(f"Using cached features for '{k}' ({cache_keys[k]})")
+                        cache.link(cache_keys[k], out_path)
+                if len(split_processors) == 0:
+                    continue
+
+                split_loaders = {k: v for k, v in required_loaders.items() if k == main_modality or any(
+                    k in p.get_required_loaders() for p in split_processors.values())}
+                out_dirs = {k: cache.begin(cache_keys[k]) for k in split_processors}
+
             # Map modality to a generator that loads samples from files
-            input_sample_iter = {k: required_loaders[k].load_samples(files[k]) for k in required_loaders}
+            input_sample_iter = {k: split_loaders[k].load_samples(files[k]) for k in split_loaders}
             input_samples = (dict(zip(input_sample_iter.keys(), tp)) for tp in zip(*input_sample_iter.values()))
 
             writers = None
-            with contextlib.ExitStack() as stack:
-                if out_path:
-                    out_paths = {k: os.path.join(out_path, f"{k.lower()}_{split_name}_features") for k in processors}
-                    writers = {
-                        k: stack.enter_context(p.collect(out_paths[k], num_samples, **kwargs))
-                        for k, p in processors.items()
-                    }
-
-                transformed_sample_iter = self._process_input_samples(input_samples, main_modality, processors,
-                                                                      interpolators, writers, **kwargs)
-                if out_path:
-                    for _ in tqdm(transformed_sample_iter, "Processing samples", total=num_samples, file=stdout):
-                        # Do nothing, 'writers' take care of writing to file
-                        pass
-                else:
-                    return transformed_sample_iter
+            try:
+                with contextlib.ExitStack() as stack:
+                    if out_path:
+                        out_names = {k: f"{k.lower()}_{split_name}_features" for k in split_processors}
+                        if cache is None:
+                            for name in out_names.values():
+                                remove_outputs(out_path, name)
+                        writers = {
+                            k: stack.enter_context(p.collect(os.path.join(out_dirs[k], out_names[k]), num_samples,
+                                                             **kwargs))
+                            for k, p in split_processors.items()
+                        }
+
+                    if not out_path:
+                        return self._process_input_samples(input_samples, main_modality, split_processors,
+                                                           interpolators, writers, **kwargs)
+
+                    if num_workers > 0:
+                        self._process_parallel({k: files[k] for k in split_loaders}, main_modality,
+                                               split_processors, split_loaders, interpolators, writers, num_workers,
+                                               **kwargs)
+                    else:
+                        transformed_sample_iter = self._process_input_samples(input_samples, main_modality,
+                                                                              split_processors, interpolators,
+                                                                              writers, **kwargs)
+                        for _ in tqdm(transformed_sample_iter, "Processing samples", total=num_samples,
+                                      file=stdout):
+                            # Do nothing, 'writers' take care of writing to file
+                            pass
+            except BaseException:
+                for k in cache_keys:
+                    if k in split_processors:
+                        shutil.rmtree(out_dirs[k], ignore_errors=True)
+                raise
+
+            for k in split_processors:
+                if k in cache_keys:
+                    cache.commit(cache_keys[k], out_dirs[k])
+                    cache.link(cache_keys[k], out_path)
+
+    def _process_parallel(self,
+                          files: Dict[str, pd.Series],
+                          main_modality: Optional[str],
+                          processors: Dict[str, Processor],
+                          required_loaders: Dict[str, Loader],
+                          interpolators: Dict[str, SampleInterpolator],
+                          writers: Dict[str, FileWriter],
+                          num_workers: int,
+                          **kwargs):
+        """
+        Shard the samples of a split into contiguous chunks which are processed by a pool of worker processes.
+        Each worker has its own copy of loaders and processors.
+
+        :param files: Files of each modality for all samples of the split
+        :param main_modality: Main modality
+        :param processors: Processors
+        :param required_loaders: Loaders required by processors
+        :param interpolators: Interpolators
+        :param writers: Writers that already started collecting
+        :param num_workers: Number of worker processes
+        :param kwargs: Additional arguments for processors
+        """
+        num_samples = len(next(iter(files.values())))
+        # Small chunks for regular progress updates and load balancing
+        chunk_size = max(1, min(32, math.ceil(num_samples / (num_workers * 4))))
+        chunks = [
+            (start, {k: list(f.iloc[start:start + chunk_size]) for k, f in files.items()})
+            for start in range(0, num_samples, chunk_size)
+        ]
+
+        # 'spawn' because processors may use CUDA, which can't be used in forked processes
+        context = multiprocessing.get_context(kwargs.get("mp_start_method", "spawn"))
+        # Writers that support parallel writing are used directly by worker processes,
+        # all other processed samples are sent back to the main process which writes them in order.
+        parallel_writers = {k: w if w.supports_parallel_write else None for k, w in writers.items()}
+        init_args = (self, main_modality, processors, required_loaders, interpolators, parallel_writers, kwargs)
+        with context.Pool(num_workers, _init_worker, init_args) as pool, \
+                tqdm(desc="Processing samples", total=num_samples, file=stdout) as progress:
+            # Results are returned in order, so writers not supporting parallel writing collect samples in order
+            for num_processed, results in pool.imap(_process_chunk, chunks):
+                for k, samples in results.items():
+                    for sample in samples:
+                        writers[k].collect_next(sample)
+                progress.update(num_processed)
 
     def produce_labels(self, splits: Dict[str, tuple] = None, split_type: str = "subject") \
             -> Union[np.ndarray, Dict[str, np.ndarray]]:
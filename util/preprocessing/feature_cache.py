@@ -0,0 +1,160 @@
+import hashlib
+import os
+import shutil
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from util.preprocessing.interpolator import SampleInterpolator
+from util.preprocessing.processor.base import Processor
+
+# Increase if the way features are produced changes so previously cached features are not used anymore
+_cache_version = 1
+
+
+def _stable_repr(value) -> str:
+    """
+    Return a representation of the given value that does not depend on memory addresses or dict ordering.
+    """
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_stable_repr(k)}: {_stable_repr(v)}" for k, v in
+                               sorted(value.items(), key=lambda x: repr(x[0]))) + "}"
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__ + "(" + ", ".join(_stable_repr(v) for v in value) + ")"
+    if isinstance(value, np.ndarray):
+        return f"ndarray({value.dtype.str}, {value.shape}, {hashlib.sha1(value.tobytes()).hexdigest()})"
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    if value is None or isinstance(value, (bool, int, float, str, bytes, np.generic)):
+        return repr(value)
+    if callable(value) and hasattr(value, "__qualname__"):
+        return f"{value.__module__}.{value.__qualname__}"
+    if hasattr(value, "__dict__"):
+        return _stable_repr(type(value)) + _stable_repr(vars(value))
+    return repr(value)
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def remove_outputs(out_path: str, name: str):
+    """
+    Remove previous outputs (files or directories) named 'name' with any extension.
+    Outputs may be hard links to cached features, so they must never be overwritten in place.
+
+    :param out_path: Output directory
+    :param name: Output name without extension
+    """
+    if not os.path.isdir(out_path):
+        return
+
+    for entry in os.scandir(out_path):
+        if entry.name == name or entry.name.startswith(name + "."):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+
+class FeatureCache:
+    """
+    Content-addressed cache for features produced by a single processor.
+    Each entry is a directory <cache_path>/<key>/ that contains the processor output of one split.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+
+    def get_key(self,
+                processor: Processor,
+                files: Dict[str, Sequence[str]],
+                interpolators: Dict[str, SampleInterpolator],
+                split_name: str,
+                main_modality: Optional[str],
+                kwargs: dict) -> str:
+        """
+        Compute the key of a processor output from everything that influences the output:
+        processor class and mode, kwargs listed in processor.output_kwargs, input structures, interpolators,
+        temporal stride, input files (and their modification times and sizes) and split.
+
+        :param processor: Processor (after set_input_structure was called)
+        :param files: Input files of the split for each modality
+        :param interpolators: Interpolators for each modality
+        :param split_name: Name of the split
+        :param main_modality: Main modality
+        :param kwargs: Additional arguments of processors
+        :return: key
+        """
+        loaders = processor.get_required_loaders()
+        key = [
+            _cache_version,
+            type(processor),
+            processor.mode,
+            {k: kwargs[k] for k in processor.output_kwargs if k in kwargs},
+            processor.structure,
+            processor.max_sequence_length,
+            {k: type(interpolators[k]) for k in loaders},
+            split_name,
+            main_modality
+        ]
+        # Keys of features without temporal downsampling are unchanged
+        if processor.temporal_stride != 1:
+            key.append(("temporal_stride", processor.temporal_stride))
+        h = hashlib.sha1()
+        h.update(_stable_repr(key).encode())
+
+        for modality in loaders:
+            h.update(modality.encode())
+            for file_name in files[modality]:
+                stat = os.stat(file_name)
+                h.update(f"{file_name}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+
+        return h.hexdigest()
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, key)
+
+    def contains(self, key: str) -> bool:
+        return os.path.isdir(self.get_entry_path(key))
+
+    def begin(self, key: str) -> str:
+        """
+        Create a temporary directory for a new cache entry. Outputs should be written to this directory.
+
+        :param key: key
+        :return: temporary directory
+        """
+        tmp_path = self.get_entry_path(key) + f".tmp{os.getpid()}"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        return tmp_path
+
+    def commit(self, key: str, tmp_path: str):
+        """
+        Turn the temporary directory created by 'begin' into a cache entry once all outputs are written.
+        """
+        try:
+            os.rename(tmp_path, self.get_entry_path(key))
+        except OSError:
+            # Entry was created by another process in the meantime
+            shutil.rmtree(tmp_path)
+
+    def link(self, key: str, out_path: str):
+        """
+        Hard link (or copy if not supported) all outputs of a cache entry to the output directory.
+        """
+        entry_path = self.get_entry_path(key)
+        for name in os.listdir(entry_path):
+            src = os.path.join(entry_path, name)
+            dst = os.path.join(out_path, name)
+            remove_outputs(out_path, name)
+
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, copy_function=_link_or_copy)
+            else:
+                _link_or_copy(src, dst)
@@ -1,20 +1,44 @@
 import abc
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
 
 import numpy as np
 
 
+def skip_elements(sequence: Iterator[Any], num_elements: int):
+    """
+    Advance an iterator without using the skipped elements.
+    Iterators with a method 'skip' (e.g. video.FrameIterator) may skip elements without decoding them.
+
+    :param sequence: Iterator
+    :param num_elements: Number of elements to skip
+    """
+    if num_elements <= 0:
+        return
+    if hasattr(sequence, "skip"):
+        sequence.skip(num_elements)
+    else:
+        for _ in range(num_elements):
+            next(sequence)
+
+
 class SampleInterpolator:
     def __init__(self, numpy_special=True):
         self._numpy_special = numpy_special
         self.global_target_sequence_length = 0
+        # Only keep every n-th element of the interpolated sequence (temporal downsampling)
+        self.temporal_stride = 1
 
     def interpolate(self, sequence: Iterable[Any], sequence_length: int, target_sequence_length: int) -> Iterable[Any]:
+        """
+        Interpolate a sequence to the target sequence length (or global_target_sequence_length if set)
+        and keep every 'temporal_stride'-th element of the interpolated sequence.
+        The result has ceil(target_sequence_length / temporal_stride) elements.
+        """
         target_sequence_length = self.global_target_sequence_length or target_sequence_length
         if not target_sequence_length:
             raise ValueError("Invalid target sequence length " + str(target_sequence_length))
 
-        if sequence_length == target_sequence_length:
+        if sequence_length == target_sequence_length and self.temporal_stride == 1:
             return sequence
 
         if self._numpy_special and (type(sequence) is np.ndarray):
@@ -33,21 +57,32 @@ class SampleInterpolator:
 
 class NearestNeighborInterpolator(SampleInterpolator):
     @staticmethod
-    def _compute_indices(sequence_length: int, target_sequence_length: int):
+    def _compute_indices(sequence_length: int, target_sequence_length: int, temporal_stride: int = 1):
+        if sequence_length == target_sequence_length:
+            return np.arange(0, target_sequence_length, temporal_stride)
         factor = (sequence_length - 1) / (target_sequence_length - 1)
-        indices = np.arange(target_sequence_length) * factor
-        indices = np.rint(indices).astype(np.int)
+        indices = np.arange(0, target_sequence_length, temporal_stride) * factor
+        indices = np.rint(indices).astype(np.int64)
         return indices
 
     def _interpolate_numpy(self, sequence, sequence_length: int, target_sequence_length: int) -> np.ndarray:
-        return sequence[NearestNeighborInterpolator._compute_indices(sequence_length, target_sequence_length)]
+        return sequence[NearestNeighborInterpolator._compute_indices(sequence_length, target_sequence_length,
+                                                                     self.temporal_stride)]
 
     def _interpolate_sequence(self, sequence, sequence_length: int, target_sequence_length: int) -> Iterable[Any]:
-        indices = NearestNeighborInterpolator._compute_indices(sequence_length, target_sequence_length)
+        indices = NearestNeighborInterpolator._compute_indices(sequence_length, target_sequence_length,
+                                                               self.temporal_stride)
+        sequence = iter(sequence)
         idx = -1
         item = None
         for index in indices:
-            while idx != index:
-                item = next(sequence)
-                idx += 1
+            if idx != index:
+                try:
+                    # Elements between the selected ones are skipped (e.g. video frames are not decoded)
+                    skip_elements(sequence, index - idx - 1)
+                    item = next(sequence)
+                except StopIteration:
+                    # Sequence is shorter than expected, remaining elements are padded
+                    return
+                idx = index
             yield item
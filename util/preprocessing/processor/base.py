@@ -1,5 +1,6 @@
 import abc
 import copy
+import math
 from typing import Dict, Optional, Sequence
 
 import numpy as np
@@ -11,6 +12,10 @@ from util.preprocessing.interpolator import SampleInterpolator
 
 
 class Processor:
+    # Names of kwargs that change the output of this processor.
+    # Used to decide whether previously produced features can be reused (see DataGroup.produce_features)
+    output_kwargs = ()
+
     def __init__(self, mode: Optional[str]):
         """
         :param mode: Optional mode that describes how to process the data.
@@ -18,6 +23,7 @@ class Processor:
         self.structure = None
         self.mode = mode
         self.max_sequence_length = 0
+        self.temporal_stride = 1
 
     @property
     def main_modality(self):
@@ -29,20 +35,25 @@ class Processor:
 
     def set_input_structure(self,
                             structure: Dict[str, SequenceStructure],
-                            max_sequence_length: Optional[int]):
+                            max_sequence_length: Optional[int],
+                            temporal_stride: int = 1):
         """
         Sets the input structure for this processor
 
         :param structure: Dictionary of structures for each return value of 'get_required_loaders'
          that describes input/output data shape and type
         :param max_sequence_length: Maximum length that a sequence passed to a processor has or should have (sampling)
+        :param temporal_stride: Only every n-th element of a sequence is processed (see SampleInterpolator),
+         the maximum sequence length of the output is ceil(max_sequence_length / temporal_stride)
         """
         self.structure = copy.deepcopy(structure)
         self.max_sequence_length = max_sequence_length
+        self.temporal_stride = temporal_stride
 
         # If sequence length is None, take max sequence length from first structure
         if self.max_sequence_length is None:
             self.max_sequence_length = self.main_structure.max_sequence_length
+        self.max_sequence_length = math.ceil(self.max_sequence_length / temporal_stride)
 
     @abc.abstractmethod
     def get_required_loaders(self) -> Sequence[str]:
@@ -8,6 +8,8 @@ from util.preprocessing.processor.base import MatlabInputProcessor
 
 
 class InertialProcessor(MatlabInputProcessor):
+    output_kwargs = ("signal_image_cutoff", "signal_feature_model")
+
     def __init__(self, mode: Optional[str]):
         super().__init__(mode)
 
@@ -2,16 +2,38 @@ from typing import Dict, Optional, Sequence
 
 import cv2
 import numpy as np
+import torch
 
 import util.preprocessing.cnn_features as feature_util
 import util.preprocessing.skeleton as skeleton_util
 import util.preprocessing.video as video_util
-from util.preprocessing.data_writer import FileWriter, NumpyWriter, VideoWriter, ZipNumpyWriter
+from util.preprocessing.data_writer import FileWriter, NumpyWriter, VideoWriter, ChunkedNumpyWriter
 from util.preprocessing.interpolator import SampleInterpolator
 from util.preprocessing.processor.base import Processor
 from util.preprocessing.skeleton_patch_extractor import get_skeleton_rgb_patch_groups, get_skeleton_rgb_patches
 
 
+rgb_layouts = ("tchw", "cthw", "thwc")
+
+
+def get_frames_shape(layout: Optional[str], num_frames: int, height: int, width: int, num_channels: int = 3) -> tuple:
+    """
+    Shape of a video sample in the given layout.
+
+    :param layout: One of rgb_layouts ('tchw' if None)
+    :param num_frames: Number of frames
+    :param height: Frame height
+    :param width: Frame width
+    :param num_channels: Number of channels
+    :return: Shape
+    """
+    layout = layout or "tchw"
+    if layout not in rgb_layouts:
+        raise ValueError(f"Unsupported RGB layout: {layout}")
+    sizes = {"t": num_frames, "c": num_channels, "h": height, "w": width}
+    return tuple(sizes[d] for d in layout)
+
+
 class RGBVideoProcessor(Processor):
     """
     Class for processing RGB video (cv2.VideoCapture)\n
@@ -23,11 +45,32 @@ class RGBVideoProcessor(Processor):
 
     ARGUMENTS:\n
     **rgb_feature_model**:
-    CNN model for computing feature vectors from images (see cnn_features.py for supported models)\n
+    CNN model for computing feature vectors from images (see cnn_features.py for supported models).
+    Pretrained weights are stored in the directory given by environment variable MMARGCN_WEIGHTS_DIR\n
     **patch_radius**:
-    Radius of each cropped patch for modes *_skeleton_patches: Total size of each patch will be 2*R x 2*R
+    Radius of each cropped patch for modes *_skeleton_patches: Total size of each patch will be 2*R x 2*R\n
+    **rgb_feature_batch_size**:
+    Number of patches encoded by the CNN at once (default: 256)\n
+    **rgb_feature_device**:
+    Device of the CNN, e.g. 'cuda' or 'cpu' (default: 'cuda' if available)\n
+    **rgb_feature_num_threads**:
+    Number of threads used by pytorch (e.g. if rgb_feature_device is 'cpu')\n
+    **rgb_compress_patches**:
+    Write patches of modes *_skeleton_patches to a compressed chunked array file (see util/chunked_array.py)\n
+    **rgb_compression_codec**:
+    Compression codec for rgb_compress_patches: 'raw', 'zlib', 'lz4' or 'zstd'\n
+    **rgb_output_layout**:
+    Layout of each sample if rgb_output_numpy is set: 'tchw' (default), 'cthw' (layout of R(2+1)D input) or
+    'thwc' (channels last layout of R(2+1)D input, no transposing of frames required)
     """
 
+    output_kwargs = (
+        "rgb_feature_model", "patch_radius", "num_bodies", "joint_groups", "joint_groups_box_margin",
+        "skeleton_to_rgb_coordinate_transformer", "rgb_compress_patches", "rgb_compression_codec",
+        "rgb_compression_level", "rgb_crop_square", "rgb_output_size", "rgb_output_fps", "rgb_output_numpy",
+        "rgb_resize_interpolation", "rgb_normalize_image", "rgb_output_layout"
+    )
+
     def __init__(self, mode: Optional[str]):
         super().__init__(mode)
 
@@ -63,8 +106,9 @@ class RGBVideoProcessor(Processor):
         # Write patches themselves to file (should only be used for very small patch radii)
         if self.mode in ("rgb_skeleton_patches", "rgb_openpose_skeleton_patches"):
             if kwargs.get("rgb_compress_patches", True):
-                out_path += ".zip"
-                return ZipNumpyWriter(out_path)
+                out_path += ".npc"
+                return ChunkedNumpyWriter(out_path, num_samples, kwargs.get("rgb_compression_codec", "zlib"),
+                                          kwargs.get("rgb_compression_level", None))
             else:
                 out_path += ".npy"
                 # (num_samples, num_bodies[=1], num_frames, num_joints[=20], frame_height, frame_width, channels)
@@ -87,7 +131,8 @@ class RGBVideoProcessor(Processor):
         if as_numpy:
             out_path += ".npy"
             target_type = np.float32 if kwargs.get("rgb_normalize_image", False) else self.main_structure.target_type
-            shape = [num_samples, self.max_sequence_length, 3, h, w]
+            frames_shape = get_frames_shape(kwargs.get("rgb_output_layout", None), self.max_sequence_length, h, w)
+            shape = [num_samples, *frames_shape]
             writer = NumpyWriter(out_path, target_type, shape)
             return writer
 
@@ -190,6 +235,22 @@ class RGBVideoProcessor(Processor):
             patch_offset = kwargs.get("joint_groups_box_margin", 0)
             patch_extractor = get_skeleton_rgb_patch_groups
 
+        # Patches are encoded in batches: list of output positions (body, frame, patch) and patches
+        batch_size = kwargs.get("rgb_feature_batch_size", 256)
+        device = kwargs.get("rgb_feature_device", None)
+        if kwargs.get("rgb_feature_num_threads", None):
+            torch.set_num_threads(kwargs["rgb_feature_num_threads"])
+        pending_positions = []
+        pending_patches = []
+
+        def encode_pending_patches():
+            if pending_patches:
+                features = feature_util.encode_samples(pending_patches, feature_model, device)
+                for position, feature in zip(pending_positions, features):
+                    out_sample[position] = feature.astype(out_sample.dtype)
+                pending_positions.clear()
+                pending_patches.clear()
+
         debug = kwargs.get("debug", False)
         for frame_idx, frame in enumerate(sample["rgb"]):
             for body_idx, sequence in enumerate(rgb_coords):
@@ -211,14 +272,17 @@ class RGBVideoProcessor(Processor):
                     out_sample[body_idx, frame_idx] = patches
                     continue
 
-                # Encode patches using CNN and write to output array
+                # Collect patches to encode them using CNN and write to output array
                 for patch_idx, patch in enumerate(patches):
                     # Check if any element is greater than zero (all zero patch comes from invalid coordinates)
                     if np.any(patch):
-                        feature = feature_util.encode_sample(patch, feature_model)
-                        out_sample[body_idx, frame_idx, patch_idx] = feature.astype(out_sample.dtype)
+                        pending_positions.append((body_idx, frame_idx, patch_idx))
+                        pending_patches.append(patch)
+                        if len(pending_patches) >= batch_size:
+                            encode_pending_patches()
 
                 if debug and joint_groups is None and frame_idx > 0:
+                    encode_pending_patches()
                     joint_labels = kwargs["skeleton_joint_labels"]
                     # print euclidean distance to previous features
                     diff = out_sample[body_idx, frame_idx] - out_sample[body_idx, frame_idx - 1]
@@ -237,6 +301,7 @@ class RGBVideoProcessor(Processor):
                         f" MAX {joint_labels[mx]} ({norm_all[i, mx]})"
                         for i, (label, d, mn, mx) in enumerate(zip(joint_labels, norm, min_dist, max_dist))))
 
+        encode_pending_patches()
         return out_sample
 
     def _process_default(self, sample, **kwargs):
@@ -245,6 +310,7 @@ class RGBVideoProcessor(Processor):
         rgb_crop_square = kwargs.get("rgb_crop_square", None)
         rgb_resize_interpolation = kwargs.get("rgb_resize_interpolation", None)
         rgb_normalize_image = kwargs.get("rgb_normalize_image", False)
+        rgb_output_layout = kwargs.get("rgb_output_layout", None) or "tchw"
 
         if rgb_crop_square is None or len(rgb_crop_square) < 4:
             rgb_crop_square = (0, w, 0, h)
@@ -259,7 +325,8 @@ class RGBVideoProcessor(Processor):
 
         if as_numpy:
             target_type = np.float32 if rgb_normalize_image else self.main_structure.target_type
-            output_array = np.zeros((self.max_sequence_length, 3, h, w), dtype=target_type)
+            frames_shape = get_frames_shape(rgb_output_layout, self.max_sequence_length, h, w)
+            output_array = np.zeros(frames_shape, dtype=target_type)
 
             for frame_idx, frame in enumerate(sample):
                 # frame is shape (h, w, c)
@@ -270,9 +337,13 @@ class RGBVideoProcessor(Processor):
                     std = np.std(frame, axis=(0, 1))
                     frame = ((frame - mean) / std).astype(np.float32)
 
-                # (h, w, c) to (c, h, w)
-                frame = np.moveaxis(frame, -1, 0)
-                output_array[frame_idx] = frame
+                if rgb_output_layout == "thwc":
+                    output_array[frame_idx] = frame
+                elif rgb_output_layout == "cthw":
+                    output_array[:, frame_idx] = np.moveaxis(frame, -1, 0)
+                else:
+                    # (h, w, c) to (c, h, w)
+                    output_array[frame_idx] = np.moveaxis(frame, -1, 0)
 
             return output_array
 
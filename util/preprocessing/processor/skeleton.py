@@ -8,6 +8,8 @@ from util.preprocessing.processor.base import MatlabInputProcessor
 
 
 class SkeletonProcessor(MatlabInputProcessor):
+    output_kwargs = ("skeleton_center_joint", "skeleton_x_joints", "skeleton_z_joints", "imu_num_signals")
+
     def __init__(self, mode: Optional[str]):
         super().__init__(mode)
 
@@ -74,16 +74,11 @@ def multi_move_skeleton_origin(skeleton_data: np.ndarray, origin_joint: int):
         skeleton_data[skeleton_idx] = move_skeleton_origin(skeleton, origin_joint)
 
 
-def parallelize_joints_to_axis(skeleton: np.ndarray, joint_axis_indices: Tuple[int, int],
-                               axis: Tuple[int, int, int], epsilon: float = 1e-6) -> np.ndarray:
+def _get_rotation_vector(bone: np.ndarray, axis: Tuple[int, int, int], epsilon: float) -> np.ndarray:
     def vector_angle(v0, ax):
         n0 = np.linalg.norm(v0)
         return np.arccos(np.dot(v0 / n0, ax))
 
-    # take joints and bones of first body in first frame
-    joints = skeleton[0, 0, joint_axis_indices]
-    bone = joints[1] - joints[0]
-
     if np.abs(bone).sum() < epsilon:
         raise InvalidSkeletonException()
 
@@ -95,7 +90,16 @@ def parallelize_joints_to_axis(skeleton: np.ndarray, joint_axis_indices: Tuple[i
         raise InvalidSkeletonException()
 
     rotation_axis /= np.linalg.norm(rotation_axis)
-    rotation = Rotation.from_rotvec(rotation_axis * rotation_angle)
+    return rotation_axis * rotation_angle
+
+
+def parallelize_joints_to_axis(skeleton: np.ndarray, joint_axis_indices: Tuple[int, int],
+                               axis: Tuple[int, int, int], epsilon: float = 1e-6) -> np.ndarray:
+    # take joints and bones of first body in first frame
+    joints = skeleton[0, 0, joint_axis_indices]
+    bone = joints[1] - joints[0]
+
+    rotation = Rotation.from_rotvec(_get_rotation_vector(bone, axis, epsilon))
     # Iterate over all bodies and frames that store a skeleton and rotate each individual joint
     for body in filter(lambda x: is_valid(x), skeleton):
         for frame in filter(lambda x: is_valid(x), body):
@@ -146,24 +150,120 @@ def normalize_skeleton(skeleton: np.ndarray, origin_joint: int, z_axis_joints: T
     return skeleton
 
 
+def _pad_null_frames_chunk(skeleton_data: np.ndarray):
+    """
+    Vectorized version of pad_null_frames for multiple skeletons (modified in place).
+
+    :param skeleton_data: Skeleton data of shape (N, num_bodies, num_frames, num_joints, num_channels)
+    """
+    n, num_bodies, num_frames = skeleton_data.shape[:3]
+    bodies = skeleton_data.reshape(n * num_bodies, num_frames, -1)
+    valid_bodies = bodies.reshape(n * num_bodies, -1).sum(-1) != 0
+
+    # If the first frame has no skeleton in it: Move all frames that have a skeleton to the front
+    compact = valid_bodies & (bodies[:, 0].sum(-1) == 0)
+    if np.any(compact):
+        compact_bodies = skeleton_data.reshape(n * num_bodies, *skeleton_data.shape[2:])[compact]
+        valid_frame_mask = compact_bodies.sum(-1).sum(-1) != 0
+        # stable sort keeps the order of valid frames
+        order = np.argsort(~valid_frame_mask, axis=1, kind="stable")
+        compact_bodies = np.take_along_axis(compact_bodies, order[..., None, None], axis=1)
+        compact_bodies[~np.take_along_axis(valid_frame_mask, order, axis=1)] = 0
+        bodies[compact] = compact_bodies.reshape(len(compact_bodies), num_frames, -1)
+
+    # Find first frame after which all frames have no skeleton
+    null_frames = bodies.sum(-1) == 0
+    num_right_zero_frames = np.argmin(null_frames[:, ::-1], axis=1)
+    num_right_zero_frames[np.all(null_frames, axis=1)] = num_frames
+    frame_idx = num_frames - num_right_zero_frames
+    pad = valid_bodies & (num_right_zero_frames > 0) & (frame_idx > 0)
+
+    # Repeat sequence body[:frame_idx] as a padding for 'null' frames
+    source_frames = np.arange(num_frames)[None].repeat(pad.sum(), 0)
+    padding = source_frames >= frame_idx[pad, None]
+    source_frames[padding] = ((source_frames - frame_idx[pad, None]) % frame_idx[pad, None])[padding]
+    bodies[pad] = np.take_along_axis(bodies[pad], source_frames[..., None], axis=1)
+
+
+def _move_skeleton_origin_chunk(skeleton_data: np.ndarray, origin_joint: int):
+    """
+    Vectorized version of move_skeleton_origin for multiple skeletons (modified in place).
+
+    :param skeleton_data: Skeleton data of shape (N, num_bodies, num_frames, num_joints, num_channels)
+    :param origin_joint: Which joint is the origin
+    """
+    main_body_center = skeleton_data[:, 0:1, :, origin_joint:origin_joint + 1, :].copy()
+    valid_bodies = skeleton_data.reshape(*skeleton_data.shape[:2], -1).sum(-1) != 0
+    joint_mask = skeleton_data.sum(-1, keepdims=True) != 0
+    moved = (skeleton_data - main_body_center) * joint_mask
+    skeleton_data[valid_bodies] = moved[valid_bodies]
+
+
+def _parallelize_joints_to_axis_chunk(skeleton_data: np.ndarray, joint_axis_indices: Tuple[int, int],
+                                      axis: Tuple[int, int, int], epsilon: float = 1e-6):
+    """
+    Vectorized version of parallelize_joints_to_axis for multiple skeletons (modified in place).
+    Skeletons for which parallelize_joints_to_axis raises InvalidSkeletonException are left unchanged.
+
+    :param skeleton_data: Skeleton data of shape (N, num_bodies, num_frames, num_joints, num_channels)
+    :param joint_axis_indices: joints to parallelize with axis
+    :param axis: axis
+    :param epsilon: epsilon
+    """
+    # take joints and bones of first body in first frame
+    joints = skeleton_data[:, 0, 0, joint_axis_indices]
+    bones = joints[:, 1] - joints[:, 0]
+
+    # Rotation parameters are computed per skeleton (cheap) so they are identical to parallelize_joints_to_axis
+    valid = np.zeros(len(skeleton_data), dtype=bool)
+    rotation_vectors = []
+    for skeleton_idx, bone in enumerate(bones):
+        try:
+            rotation_vectors.append(_get_rotation_vector(bone, axis, epsilon))
+            valid[skeleton_idx] = True
+        except InvalidSkeletonException:
+            pass
+
+    if not rotation_vectors:
+        return
+
+    rotation_matrices = Rotation.from_rotvec(np.stack(rotation_vectors)).as_matrix()
+
+    # Rotate each individual joint of all bodies and frames that store a skeleton
+    skeletons = skeleton_data[valid]
+    valid_bodies = skeletons.reshape(*skeletons.shape[:2], -1).sum(-1) != 0
+    valid_frames = skeletons.reshape(*skeletons.shape[:3], -1).sum(-1) != 0
+    rotated = np.einsum("nij,nkj->nki", rotation_matrices,
+                        skeletons.reshape(len(skeletons), -1, 3).astype(np.float64)).reshape(skeletons.shape)
+    mask = (valid_bodies[..., None] & valid_frames)[..., None, None]
+    skeleton_data[valid] = np.where(mask, rotated.astype(skeleton_data.dtype), skeletons)
+
+
 def normalize_skeleton_data(skeleton_data: np.ndarray, origin_joint: int, z_axis_joints: Tuple[int, int],
-                            x_axis_joints: Tuple[int, int]):
+                            x_axis_joints: Tuple[int, int], chunk_size: int = 256):
     """
     Normalize skeleton data: 1. Pad null frames, 2. move skeleton origin, 3. parallelize z_axis_joints and z-axis,
     4. parallelize x_axis_joints and x-axis.
+    Equivalent to calling normalize_skeleton for each skeleton but vectorized over chunks of skeletons.
     :param skeleton_data: Skeleton data of shape (N, num_bodies, num_frames, num_joints, num_channels)
     :param origin_joint: Which joint is the origin
     :param z_axis_joints: joints will be parallelized with z-axis (should be hip and spine joints)
     :param x_axis_joints: joints will be parallelized with x-axis (should be left and right shoulder joints)
+    :param chunk_size: Number of skeletons that are normalized at once (bounds memory usage)
     """
-    multi_pad_null_frames(skeleton_data)
-    multi_move_skeleton_origin(skeleton_data, origin_joint)
+    assert len(z_axis_joints) == 2 and len(x_axis_joints) == 2
+
+    for start in tqdm(range(0, len(skeleton_data), chunk_size), desc="Normalize skeletons", leave=False):
+        chunk = np.array(skeleton_data[start:start + chunk_size])
+        _pad_null_frames_chunk(chunk)
+        _move_skeleton_origin_chunk(chunk, origin_joint)
 
-    # parallelize hip (0) and spine (1) joints of first person with z-axis
-    multi_parallelize_joints_to_axis(skeleton_data, z_axis_joints, (0, 0, 1))
+        # parallelize hip (0) and spine (1) joints of first person with z-axis
+        _parallelize_joints_to_axis_chunk(chunk, z_axis_joints, (0, 0, 1))
 
-    # parallelize left (4) and right (8) shoulder joints of first person with x-axis
-    multi_parallelize_joints_to_axis(skeleton_data, x_axis_joints, (1, 0, 0))
+        # parallelize left (4) and right (8) shoulder joints of first person with x-axis
+        _parallelize_joints_to_axis_chunk(chunk, x_axis_joints, (1, 0, 0))
+        skeleton_data[start:start + chunk_size] = chunk
 
 
 def body_score(body_data: np.ndarray) -> float:
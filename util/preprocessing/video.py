@@ -8,12 +8,37 @@ def load_video(file_name: str) -> cv2.VideoCapture:
     return cv2.VideoCapture(file_name)
 
 
+class FrameIterator:
+    """
+    Iterator over the frames of a video. Frames can be skipped without decoding them (see SampleInterpolator).
+    """
+
+    def __init__(self, video: cv2.VideoCapture):
+        self._video = video
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> np.ndarray:
+        if self._video.isOpened():
+            ok, frame = self._video.read()
+            if ok:
+                return frame
+        raise StopIteration
+
+    def skip(self, num_frames: int = 1):
+        """
+        Skip frames: They are only grabbed, not decoded.
+
+        :param num_frames: Number of frames to skip
+        """
+        for _ in range(num_frames):
+            if not self._video.isOpened() or not self._video.grab():
+                raise StopIteration
+
+
 def frame_iterator(video: cv2.VideoCapture) -> Iterable[np.ndarray]:
-    while video.isOpened():
-        ok, frame = video.read()
-        if not ok:
-            break
-        yield frame
+    return FrameIterator(video)
 
 
 def to_numpy(video: cv2.VideoCapture, input_shape: Sequence[int], dtype: type) -> np.ndarray:
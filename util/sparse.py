@@ -10,3 +10,26 @@ def scipy_to_torch(mat: sp.spmatrix) -> torch.sparse.Tensor:
     values = torch.FloatTensor(mat.data)
     tensor = torch.sparse_coo_tensor(indices, values, torch.Size(mat.shape))
     return tensor
+
+
+def scipy_to_block_banded(mat: sp.spmatrix, block_size: int) -> torch.Tensor:
+    """
+    Convert a matrix whose non-zero entries are close to the diagonal (e.g. the adjacency matrix of a graph with
+    'block_size' vertices per time step and only temporally local edges) to the blocks of its band.
+
+    :param mat: Matrix (V, V) with V = T * block_size
+    :param block_size: Size S of the blocks
+    :return: Blocks (2K + 1, T, S, S) where K is the number of non-zero block diagonals above/below the diagonal.
+    Block [K + d, t] contains the entries of mat for block row t and block column t + d.
+    """
+    mat: sp.coo_matrix = mat.tocoo()
+    assert mat.shape[0] == mat.shape[1] and mat.shape[0] % block_size == 0
+    num_blocks = mat.shape[0] // block_size
+    block_row, row = np.divmod(mat.row, block_size)
+    block_col, col = np.divmod(mat.col, block_size)
+    offset = block_col - block_row
+    bandwidth = int(np.max(np.abs(offset))) if mat.nnz > 0 else 0
+
+    blocks = np.zeros((2 * bandwidth + 1, num_blocks, block_size, block_size), dtype=np.float32)
+    np.add.at(blocks, (offset + bandwidth, block_row, row, col), mat.data)
+    return torch.from_numpy(blocks)